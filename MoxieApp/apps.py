@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class MoxieAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'MoxieApp'
+
+    def ready(self):
+        from . import receivers  # noqa: F401
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MoxieApp.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the stream needs models and settings
+from .streams import application as stream_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Serve live event streams directly; everything else goes to Django."""
+    if scope['type'] == 'http' and scope['path'].startswith('/events/'):
+        await stream_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from MoxieApp.utils.rollups import find_daily_revenue_drift, rebuild_daily_revenue
+
+
+class Command(BaseCommand):
+    help = "Backfill the daily revenue rollups from the appointments, or verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare the rollups with the appointments; exit non-zero on drift.'
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            revenue_rows, category_rows = find_daily_revenue_drift()
+            for date, medspa_id, expected_count, expected_revenue, count, revenue in revenue_rows:
+                self.stdout.write(
+                    f"{date} medspa {medspa_id}: expected {expected_count or 0} appointment(s) / "
+                    f"{expected_revenue or 0} revenue, stored {count or 0} / {revenue or 0}"
+                )
+            for date, medspa_id, category_id, expected_count, count in category_rows:
+                self.stdout.write(
+                    f"{date} medspa {medspa_id} category {category_id}: "
+                    f"expected {expected_count or 0} appointment(s), stored {count or 0}"
+                )
+            if revenue_rows or category_rows:
+                raise CommandError(
+                    f"Daily revenue rollups drifted on {len(revenue_rows) + len(category_rows)} row(s); "
+                    f"run without --verify to rebuild"
+                )
+            self.stdout.write(self.style.SUCCESS("Daily revenue rollups match the appointments"))
+            return
+
+        written = rebuild_daily_revenue()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt daily revenue for {written} medspa day(s)"))
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from MoxieApp.utils import leaderboard
+from MoxieApp.utils.constants import LEADERBOARD_SETTINGS
+from MoxieApp.utils.occupancy import get_connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Redis popular-services leaderboards from the database. "
+        "Bookings made while it runs may be counted twice or missed; run it "
+        "again to settle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            help='First day to rebuild (YYYY-MM-DD). Defaults to the start of the retention window.'
+        )
+
+    def handle(self, *args, **options):
+        if get_connection() is None:
+            raise CommandError("The default cache is not backed by Redis")
+
+        if options['start_date']:
+            try:
+                start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Invalid --start-date. Use YYYY-MM-DD")
+        else:
+            start_date = timezone.localdate() - timedelta(days=LEADERBOARD_SETTINGS['retention_days'])
+
+        written = leaderboard.rebuild(start_date)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} leaderboard bucket(s) from {start_date} on"
+        ))
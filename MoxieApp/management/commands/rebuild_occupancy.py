@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from MoxieApp.models import Medspa
+from MoxieApp.utils import occupancy
+from MoxieApp.utils.availability import iter_dates, load_appointment_intervals
+
+
+class Command(BaseCommand):
+    help = "Rebuild Redis occupancy maps from the database to repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--medspa', type=int, action='append', dest='medspa_ids',
+            help='Medspa id to rebuild (repeatable). Defaults to all medspas.'
+        )
+        parser.add_argument(
+            '--start-date',
+            help='First day to rebuild (YYYY-MM-DD). Defaults to today.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Number of days to rebuild. Defaults to 30.'
+        )
+
+    def handle(self, *args, **options):
+        if occupancy.get_connection() is None:
+            raise CommandError("The default cache is not backed by Redis")
+
+        if options['start_date']:
+            try:
+                start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Invalid --start-date. Use YYYY-MM-DD")
+        else:
+            start_date = timezone.localdate()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        dates = list(iter_dates(start_date, end_date))
+
+        medspas = Medspa.objects.all()
+        if options['medspa_ids']:
+            medspas = medspas.filter(id__in=options['medspa_ids'])
+
+        rebuilt = 0
+        for medspa in medspas.iterator():
+            generations = occupancy.get_generations(medspa.pk, dates)
+            intervals_by_day = load_appointment_intervals(medspa, start_date, end_date)
+            skipped = occupancy.store_days(medspa.pk, intervals_by_day, generations)
+            # Days booked during the rebuild are rebuilt again on their next read
+            occupancy.drop_days(medspa.pk, skipped)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt occupancy for {rebuilt} medspa(s) "
+            f"from {start_date} to {end_date}"
+        ))
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+
+from MoxieApp.models import Medspa
+from MoxieApp.utils import statistics
+from MoxieApp.utils.constants import STATISTICS_REFRESH
+
+
+class Command(BaseCommand):
+    help = "Refresh precomputed medspa statistics queued by appointment writes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Refresh everything currently due, then exit.'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Refresh every medspa now, queued or not, then exit.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = STATISTICS_REFRESH['batch_size']
+
+        if options['all']:
+            medspa_ids = list(Medspa.objects.values_list('id', flat=True))
+            for offset in range(0, len(medspa_ids), batch_size):
+                statistics.refresh_statistics(medspa_ids[offset:offset + batch_size])
+            self.stdout.write(self.style.SUCCESS(f"Refreshed statistics for {len(medspa_ids)} medspa(s)"))
+            return
+
+        refreshed = 0
+        while True:
+            count = statistics.run_due_refreshes(batch_size)
+            refreshed += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(STATISTICS_REFRESH['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed statistics for {refreshed} medspa(s)"))
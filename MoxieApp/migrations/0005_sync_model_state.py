@@ -0,0 +1,69 @@
+# Generated by Django 3.2 on 2026-10-17 01:27
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0004_insert_initial_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='appointmentservice',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='medspa',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='medspa',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='medspa',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='services', to='MoxieApp.medspa'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='services',
+            field=models.ManyToManyField(related_name='appointments', through='MoxieApp.AppointmentService', to='MoxieApp.Service'),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('canceled', 'Canceled'), ('no_show', 'No Show')], default='scheduled', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-17 01:30
+
+import MoxieApp.models
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0005_sync_model_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_time',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE appointment a
+            SET end_time = a.start_time + COALESCE((
+                SELECT SUM(s.duration)
+                FROM appointment_service as_j
+                JOIN service s ON s.id = as_j.service_id
+                WHERE as_j.appointment_id = a.id
+            ), 0) * INTERVAL '1 minute';
+            """,
+            migrations.RunSQL.noop
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='end_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['medspa', 'start_time'], name='appointment_medspa_start_idx'),
+        ),
+        BtreeGistExtension(),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(_negated=True, status__in=['canceled', 'no_show']), expressions=[(MoxieApp.models.TsTzRange('start_time', 'end_time', django.contrib.postgres.fields.ranges.RangeBoundary()), '&&'), ('medspa', '=')], name='appointment_no_overlap'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-17 01:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0006_appointment_end_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Closure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=255, null=True)),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closures', to='MoxieApp.medspa')),
+            ],
+            options={
+                'db_table': 'closure',
+                'unique_together': {('medspa', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BusinessHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('opens_at', models.TimeField()),
+                ('closes_at', models.TimeField()),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='business_hours', to='MoxieApp.medspa')),
+            ],
+            options={
+                'db_table': 'business_hours',
+                'unique_together': {('medspa', 'weekday')},
+            },
+        ),
+    ]
@@ -0,0 +1,282 @@
+# Generated by Django 3.2 on 2026-10-17 01:42
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The rollup tables are adjusted row by row from triggers instead of
+# refreshing the whole materialized view on every write. Decrements only
+# ever update existing rows, so cascading deletes of a medspa never
+# re-create rows for it. `mv_daily_revenue` keeps its name and columns as a
+# plain view over the rollup.
+ROLLUP_SQL = """
+DROP TRIGGER IF EXISTS refresh_daily_revenue_trigger ON appointment;
+DROP FUNCTION IF EXISTS refresh_daily_revenue();
+DROP MATERIALIZED VIEW IF EXISTS mv_daily_revenue;
+
+CREATE OR REPLACE FUNCTION daily_revenue_adjust(
+    p_date date, p_medspa_id bigint, p_appointments integer, p_revenue numeric
+) RETURNS void AS $$
+BEGIN
+    IF p_appointments > 0 THEN
+        INSERT INTO daily_revenue (date, medspa_id, total_appointments, daily_revenue)
+        VALUES (p_date, p_medspa_id, p_appointments, p_revenue)
+        ON CONFLICT (date, medspa_id) DO UPDATE SET
+            total_appointments = daily_revenue.total_appointments + EXCLUDED.total_appointments,
+            daily_revenue = daily_revenue.daily_revenue + EXCLUDED.daily_revenue;
+    ELSE
+        UPDATE daily_revenue SET
+            total_appointments = total_appointments + p_appointments,
+            daily_revenue = daily_revenue + p_revenue
+        WHERE date = p_date AND medspa_id = p_medspa_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Count the appointment once for every category among its current services
+CREATE OR REPLACE FUNCTION daily_revenue_adjust_categories(
+    p_date date, p_medspa_id bigint, p_appointment_id bigint, p_delta integer
+) RETURNS void AS $$
+BEGIN
+    IF p_delta > 0 THEN
+        INSERT INTO daily_revenue_category (date, medspa_id, category_id, total_appointments)
+        SELECT DISTINCT p_date, p_medspa_id, s.category_id, p_delta
+        FROM appointment_service as_j
+        JOIN service s ON s.id = as_j.service_id
+        WHERE as_j.appointment_id = p_appointment_id
+        ON CONFLICT (date, medspa_id, category_id) DO UPDATE SET
+            total_appointments = daily_revenue_category.total_appointments + EXCLUDED.total_appointments;
+    ELSE
+        UPDATE daily_revenue_category c SET
+            total_appointments = c.total_appointments + p_delta
+        FROM (
+            SELECT DISTINCT s.category_id
+            FROM appointment_service as_j
+            JOIN service s ON s.id = as_j.service_id
+            WHERE as_j.appointment_id = p_appointment_id
+        ) used
+        WHERE c.date = p_date AND c.medspa_id = p_medspa_id
+          AND c.category_id = used.category_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION daily_revenue_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.total_price IS NOT DISTINCT FROM NEW.total_price
+       AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(OLD.created_at), OLD.medspa_id, -1, -OLD.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(OLD.created_at), OLD.medspa_id, OLD.id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(NEW.created_at), NEW.medspa_id, 1, NEW.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(NEW.created_at), NEW.medspa_id, NEW.id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER daily_revenue_appointment_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON appointment
+    FOR EACH ROW
+    EXECUTE FUNCTION daily_revenue_appointment_changed();
+
+-- Service links are handled per statement so that several links of one
+-- appointment in the same category count once: a category is added by
+-- the statement inserting its first link and removed by the one deleting
+-- its last link.
+CREATE OR REPLACE FUNCTION daily_revenue_services_added()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO daily_revenue_category (date, medspa_id, category_id, total_appointments)
+    SELECT DATE(a.created_at), a.medspa_id, linked.category_id, COUNT(*)
+    FROM (
+        SELECT DISTINCT n.appointment_id, s.category_id
+        FROM new_links n
+        JOIN service s ON s.id = n.service_id
+    ) linked
+    JOIN appointment a ON a.id = linked.appointment_id
+    WHERE a.status = 'completed'
+      AND NOT EXISTS (
+          SELECT 1
+          FROM appointment_service as_j
+          JOIN service s ON s.id = as_j.service_id
+          WHERE as_j.appointment_id = linked.appointment_id
+            AND s.category_id = linked.category_id
+            AND as_j.id NOT IN (SELECT id FROM new_links)
+      )
+    GROUP BY DATE(a.created_at), a.medspa_id, linked.category_id
+    ON CONFLICT (date, medspa_id, category_id) DO UPDATE SET
+        total_appointments = daily_revenue_category.total_appointments + EXCLUDED.total_appointments;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION daily_revenue_services_removed()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE daily_revenue_category c SET
+        total_appointments = c.total_appointments - removed.appointments
+    FROM (
+        SELECT DATE(a.created_at) AS date, a.medspa_id, unlinked.category_id,
+               COUNT(*) AS appointments
+        FROM (
+            SELECT DISTINCT o.appointment_id, s.category_id
+            FROM old_links o
+            JOIN service s ON s.id = o.service_id
+        ) unlinked
+        JOIN appointment a ON a.id = unlinked.appointment_id
+        WHERE a.status = 'completed'
+          AND NOT EXISTS (
+              SELECT 1
+              FROM appointment_service as_j
+              JOIN service s ON s.id = as_j.service_id
+              WHERE as_j.appointment_id = unlinked.appointment_id
+                AND s.category_id = unlinked.category_id
+          )
+        GROUP BY DATE(a.created_at), a.medspa_id, unlinked.category_id
+    ) removed
+    WHERE c.date = removed.date AND c.medspa_id = removed.medspa_id
+      AND c.category_id = removed.category_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER daily_revenue_services_added_trigger
+    AFTER INSERT ON appointment_service
+    REFERENCING NEW TABLE AS new_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION daily_revenue_services_added();
+
+CREATE TRIGGER daily_revenue_services_removed_trigger
+    AFTER DELETE ON appointment_service
+    REFERENCING OLD TABLE AS old_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION daily_revenue_services_removed();
+
+-- Backfill from the existing appointments
+INSERT INTO daily_revenue (date, medspa_id, total_appointments, daily_revenue)
+SELECT DATE(created_at), medspa_id, COUNT(*), SUM(total_price)
+FROM appointment
+WHERE status = 'completed'
+GROUP BY DATE(created_at), medspa_id;
+
+INSERT INTO daily_revenue_category (date, medspa_id, category_id, total_appointments)
+SELECT DATE(a.created_at), a.medspa_id, used.category_id, COUNT(*)
+FROM (
+    SELECT DISTINCT as_j.appointment_id, s.category_id
+    FROM appointment_service as_j
+    JOIN service s ON s.id = as_j.service_id
+) used
+JOIN appointment a ON a.id = used.appointment_id
+WHERE a.status = 'completed'
+GROUP BY DATE(a.created_at), a.medspa_id, used.category_id;
+
+CREATE VIEW mv_daily_revenue AS
+SELECT
+    r.date,
+    r.medspa_id,
+    m.name AS medspa_name,
+    r.total_appointments,
+    r.daily_revenue,
+    ARRAY(
+        SELECT c.category_id
+        FROM daily_revenue_category c
+        WHERE c.date = r.date AND c.medspa_id = r.medspa_id
+          AND c.total_appointments > 0
+        ORDER BY c.category_id
+    ) AS service_categories_used
+FROM daily_revenue r
+JOIN medspa m ON m.id = r.medspa_id
+WHERE r.total_appointments > 0;
+"""
+
+# Back to the materialized view of 0003
+REVERSE_ROLLUP_SQL = """
+DROP VIEW IF EXISTS mv_daily_revenue;
+DROP TRIGGER IF EXISTS daily_revenue_services_removed_trigger ON appointment_service;
+DROP TRIGGER IF EXISTS daily_revenue_services_added_trigger ON appointment_service;
+DROP TRIGGER IF EXISTS daily_revenue_appointment_trigger ON appointment;
+DROP FUNCTION IF EXISTS daily_revenue_services_removed();
+DROP FUNCTION IF EXISTS daily_revenue_services_added();
+DROP FUNCTION IF EXISTS daily_revenue_appointment_changed();
+DROP FUNCTION IF EXISTS daily_revenue_adjust_categories(date, bigint, bigint, integer);
+DROP FUNCTION IF EXISTS daily_revenue_adjust(date, bigint, integer, numeric);
+
+CREATE MATERIALIZED VIEW mv_daily_revenue AS
+SELECT
+    DATE(a.created_at) AS date,
+    m.id AS medspa_id,
+    m.name AS medspa_name,
+    COUNT(DISTINCT a.id) AS total_appointments,
+    SUM(a.total_price) AS daily_revenue,
+    array_agg(DISTINCT s.category_id) AS service_categories_used
+FROM appointment a
+JOIN medspa m ON m.id = a.medspa_id
+JOIN appointment_service as_j ON as_j.appointment_id = a.id
+JOIN service s ON s.id = as_j.service_id
+WHERE a.status = 'completed'
+GROUP BY DATE(a.created_at), m.id, m.name
+WITH DATA;
+
+CREATE UNIQUE INDEX ON mv_daily_revenue (date, medspa_id);
+
+CREATE OR REPLACE FUNCTION refresh_daily_revenue()
+RETURNS trigger AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_daily_revenue;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER refresh_daily_revenue_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON appointment
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION refresh_daily_revenue();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0007_business_hours_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenueCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_appointments', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='MoxieApp.servicecategory')),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue_categories', to='MoxieApp.medspa')),
+            ],
+            options={
+                'db_table': 'daily_revenue_category',
+                'unique_together': {('date', 'medspa', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_appointments', models.IntegerField(default=0)),
+                ('daily_revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='MoxieApp.medspa')),
+            ],
+            options={
+                'db_table': 'daily_revenue',
+                'unique_together': {('date', 'medspa')},
+            },
+        ),
+        migrations.RunSQL(ROLLUP_SQL, reverse_sql=REVERSE_ROLLUP_SQL),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2 on 2026-10-17 01:45
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0008_daily_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedspaStatistics',
+            fields=[
+                ('medspa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='MoxieApp.medspa')),
+                ('total_services', models.IntegerField(default=0)),
+                ('active_categories', models.IntegerField(default=0)),
+                ('total_appointments', models.IntegerField(default=0)),
+                ('completed_appointments', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'medspa_statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='StatisticsRefresh',
+            fields=[
+                ('medspa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics_refresh', serialize=False, to='MoxieApp.medspa')),
+                ('due_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'statistics_refresh',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceUtilization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_bookings', models.IntegerField(default=0)),
+                ('completed_bookings', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('refreshed_at', models.DateTimeField()),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_utilization', to='MoxieApp.medspa')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='utilization', to='MoxieApp.service')),
+            ],
+            options={
+                'db_table': 'service_utilization',
+                'unique_together': {('service', 'medspa')},
+            },
+        ),
+        # Queue every existing medspa so the worker fills the tables
+        migrations.RunSQL(
+            "INSERT INTO statistics_refresh (medspa_id, due_at) SELECT id, now() FROM medspa",
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
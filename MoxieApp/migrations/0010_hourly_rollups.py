@@ -0,0 +1,298 @@
+# Generated by Django 3.2 on 2026-10-17 01:46
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Hourly rollups adjusted per changed row, in the same way as the daily
+# revenue rollup of 0008: increments upsert, decrements only update
+# existing rows. A change of an appointment moves its row and the rows of
+# its services from the old (status, hour) key to the new one; a change of
+# a service's price, duration or category re-prices all of its bookings.
+HOURLY_SQL = """
+CREATE OR REPLACE FUNCTION appointment_hourly_adjust(
+    p_medspa_id bigint, p_status varchar, p_hour timestamptz,
+    p_appointments integer, p_revenue numeric, p_minutes integer
+) RETURNS void AS $$
+BEGIN
+    IF p_appointments > 0 THEN
+        INSERT INTO appointment_hourly (medspa_id, status, hour, appointments, revenue, minutes)
+        VALUES (p_medspa_id, p_status, p_hour, p_appointments, p_revenue, p_minutes)
+        ON CONFLICT (medspa_id, hour, status) DO UPDATE SET
+            appointments = appointment_hourly.appointments + EXCLUDED.appointments,
+            revenue = appointment_hourly.revenue + EXCLUDED.revenue,
+            minutes = appointment_hourly.minutes + EXCLUDED.minutes;
+    ELSE
+        UPDATE appointment_hourly SET
+            appointments = appointments + p_appointments,
+            revenue = revenue + p_revenue,
+            minutes = minutes + p_minutes
+        WHERE medspa_id = p_medspa_id AND hour = p_hour AND status = p_status;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Move the current services of an appointment into (p_sign = 1) or out of
+-- (p_sign = -1) a (medspa, status, hour) key
+CREATE OR REPLACE FUNCTION service_hourly_adjust(
+    p_appointment_id bigint, p_medspa_id bigint, p_status varchar,
+    p_hour timestamptz, p_sign integer
+) RETURNS void AS $$
+BEGIN
+    IF p_sign > 0 THEN
+        INSERT INTO service_hourly (
+            medspa_id, service_id, category_id, status, hour, bookings, revenue, minutes
+        )
+        SELECT p_medspa_id, s.id, s.category_id, p_status, p_hour,
+               COUNT(*), SUM(s.price), SUM(s.duration)
+        FROM appointment_service as_j
+        JOIN service s ON s.id = as_j.service_id
+        WHERE as_j.appointment_id = p_appointment_id
+        GROUP BY s.id, s.category_id
+        ON CONFLICT (medspa_id, hour, service_id, category_id, status) DO UPDATE SET
+            bookings = service_hourly.bookings + EXCLUDED.bookings,
+            revenue = service_hourly.revenue + EXCLUDED.revenue,
+            minutes = service_hourly.minutes + EXCLUDED.minutes;
+    ELSE
+        UPDATE service_hourly h SET
+            bookings = h.bookings - used.bookings,
+            revenue = h.revenue - used.revenue,
+            minutes = h.minutes - used.minutes
+        FROM (
+            SELECT s.id AS service_id, s.category_id, COUNT(*) AS bookings,
+                   SUM(s.price) AS revenue, SUM(s.duration) AS minutes
+            FROM appointment_service as_j
+            JOIN service s ON s.id = as_j.service_id
+            WHERE as_j.appointment_id = p_appointment_id
+            GROUP BY s.id, s.category_id
+        ) used
+        WHERE h.medspa_id = p_medspa_id AND h.hour = p_hour AND h.status = p_status
+          AND h.service_id = used.service_id AND h.category_id = used.category_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION hourly_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.start_time IS NOT DISTINCT FROM NEW.start_time
+       AND OLD.end_time IS NOT DISTINCT FROM NEW.end_time
+       AND OLD.total_price IS NOT DISTINCT FROM NEW.total_price
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM appointment_hourly_adjust(
+            OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1, -OLD.total_price,
+            -(EXTRACT(EPOCH FROM OLD.end_time - OLD.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            OLD.id, OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM appointment_hourly_adjust(
+            NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1, NEW.total_price,
+            (EXTRACT(EPOCH FROM NEW.end_time - NEW.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            NEW.id, NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hourly_appointment_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON appointment
+    FOR EACH ROW
+    EXECUTE FUNCTION hourly_appointment_changed();
+
+CREATE OR REPLACE FUNCTION hourly_services_added()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO service_hourly (
+        medspa_id, service_id, category_id, status, hour, bookings, revenue, minutes
+    )
+    SELECT a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time),
+           COUNT(*), SUM(s.price), SUM(s.duration)
+    FROM new_links n
+    JOIN appointment a ON a.id = n.appointment_id
+    JOIN service s ON s.id = n.service_id
+    GROUP BY a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time)
+    ON CONFLICT (medspa_id, hour, service_id, category_id, status) DO UPDATE SET
+        bookings = service_hourly.bookings + EXCLUDED.bookings,
+        revenue = service_hourly.revenue + EXCLUDED.revenue,
+        minutes = service_hourly.minutes + EXCLUDED.minutes;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION hourly_services_removed()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE service_hourly h SET
+        bookings = h.bookings - removed.bookings,
+        revenue = h.revenue - removed.revenue,
+        minutes = h.minutes - removed.minutes
+    FROM (
+        SELECT a.medspa_id, s.id AS service_id, s.category_id, a.status,
+               date_trunc('hour', a.start_time) AS hour, COUNT(*) AS bookings,
+               SUM(s.price) AS revenue, SUM(s.duration) AS minutes
+        FROM old_links o
+        JOIN appointment a ON a.id = o.appointment_id
+        JOIN service s ON s.id = o.service_id
+        GROUP BY a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time)
+    ) removed
+    WHERE h.medspa_id = removed.medspa_id AND h.hour = removed.hour
+      AND h.service_id = removed.service_id AND h.category_id = removed.category_id
+      AND h.status = removed.status;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hourly_services_added_trigger
+    AFTER INSERT ON appointment_service
+    REFERENCING NEW TABLE AS new_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION hourly_services_added();
+
+CREATE TRIGGER hourly_services_removed_trigger
+    AFTER DELETE ON appointment_service
+    REFERENCING OLD TABLE AS old_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION hourly_services_removed();
+
+CREATE OR REPLACE FUNCTION hourly_service_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF OLD.price IS NOT DISTINCT FROM NEW.price
+       AND OLD.duration IS NOT DISTINCT FROM NEW.duration
+       AND OLD.category_id IS NOT DISTINCT FROM NEW.category_id THEN
+        RETURN NULL;
+    END IF;
+    UPDATE service_hourly h SET
+        bookings = h.bookings - booked.bookings,
+        revenue = h.revenue - booked.bookings * OLD.price,
+        minutes = h.minutes - booked.bookings * OLD.duration
+    FROM (
+        SELECT a.medspa_id, a.status, date_trunc('hour', a.start_time) AS hour,
+               COUNT(*) AS bookings
+        FROM appointment_service as_j
+        JOIN appointment a ON a.id = as_j.appointment_id
+        WHERE as_j.service_id = OLD.id
+        GROUP BY a.medspa_id, a.status, date_trunc('hour', a.start_time)
+    ) booked
+    WHERE h.medspa_id = booked.medspa_id AND h.hour = booked.hour
+      AND h.service_id = OLD.id AND h.category_id = OLD.category_id
+      AND h.status = booked.status;
+
+    INSERT INTO service_hourly (
+        medspa_id, service_id, category_id, status, hour, bookings, revenue, minutes
+    )
+    SELECT a.medspa_id, NEW.id, NEW.category_id, a.status, date_trunc('hour', a.start_time),
+           COUNT(*), COUNT(*) * NEW.price, COUNT(*) * NEW.duration
+    FROM appointment_service as_j
+    JOIN appointment a ON a.id = as_j.appointment_id
+    WHERE as_j.service_id = NEW.id
+    GROUP BY a.medspa_id, a.status, date_trunc('hour', a.start_time)
+    ON CONFLICT (medspa_id, hour, service_id, category_id, status) DO UPDATE SET
+        bookings = service_hourly.bookings + EXCLUDED.bookings,
+        revenue = service_hourly.revenue + EXCLUDED.revenue,
+        minutes = service_hourly.minutes + EXCLUDED.minutes;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hourly_service_trigger
+    AFTER UPDATE ON service
+    FOR EACH ROW
+    EXECUTE FUNCTION hourly_service_changed();
+
+-- Backfill from the existing appointments
+INSERT INTO appointment_hourly (medspa_id, status, hour, appointments, revenue, minutes)
+SELECT medspa_id, status, date_trunc('hour', start_time), COUNT(*), SUM(total_price),
+       SUM((EXTRACT(EPOCH FROM end_time - start_time) / 60)::integer)
+FROM appointment
+GROUP BY medspa_id, status, date_trunc('hour', start_time);
+
+INSERT INTO service_hourly (
+    medspa_id, service_id, category_id, status, hour, bookings, revenue, minutes
+)
+SELECT a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time),
+       COUNT(*), SUM(s.price), SUM(s.duration)
+FROM appointment_service as_j
+JOIN appointment a ON a.id = as_j.appointment_id
+JOIN service s ON s.id = as_j.service_id
+GROUP BY a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time);
+"""
+
+REVERSE_HOURLY_SQL = """
+DROP TRIGGER IF EXISTS hourly_service_trigger ON service;
+DROP TRIGGER IF EXISTS hourly_services_removed_trigger ON appointment_service;
+DROP TRIGGER IF EXISTS hourly_services_added_trigger ON appointment_service;
+DROP TRIGGER IF EXISTS hourly_appointment_trigger ON appointment;
+DROP FUNCTION IF EXISTS hourly_service_changed();
+DROP FUNCTION IF EXISTS hourly_services_removed();
+DROP FUNCTION IF EXISTS hourly_services_added();
+DROP FUNCTION IF EXISTS hourly_appointment_changed();
+DROP FUNCTION IF EXISTS service_hourly_adjust(bigint, bigint, varchar, timestamptz, integer);
+DROP FUNCTION IF EXISTS appointment_hourly_adjust(bigint, varchar, timestamptz, integer, numeric, integer);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0009_precomputed_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('canceled', 'Canceled'), ('no_show', 'No Show')], max_length=20)),
+                ('hour', models.DateTimeField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('minutes', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_bookings', to='MoxieApp.servicecategory')),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_services', to='MoxieApp.medspa')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_bookings', to='MoxieApp.service')),
+            ],
+            options={
+                'db_table': 'service_hourly',
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('canceled', 'Canceled'), ('no_show', 'No Show')], max_length=20)),
+                ('hour', models.DateTimeField()),
+                ('appointments', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('minutes', models.IntegerField(default=0)),
+                ('medspa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_appointments', to='MoxieApp.medspa')),
+            ],
+            options={
+                'db_table': 'appointment_hourly',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='servicehourly',
+            index=models.Index(fields=['service', 'hour'], name='service_hourly_service_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='servicehourly',
+            unique_together={('medspa', 'hour', 'service', 'category', 'status')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='appointmenthourly',
+            unique_together={('medspa', 'hour', 'status')},
+        ),
+        migrations.RunSQL(HOURLY_SQL, reverse_sql=REVERSE_HOURLY_SQL),
+    ]
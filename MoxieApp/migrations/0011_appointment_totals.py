@@ -0,0 +1,84 @@
+# Generated by Django 3.2 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+# An appointment's total_price and total_duration are the sums over its
+# linked services. Every statement that adds or removes links recomputes
+# the totals of the appointments it touched, however the links were
+# written, so reads never need the appointment/service join. Prices are
+# taken when the set of services changes; later catalog price changes do
+# not re-price existing appointments.
+APPOINTMENT_TOTALS_SQL = """
+CREATE OR REPLACE FUNCTION refresh_appointment_totals(appointment_ids bigint[])
+RETURNS void AS $$
+    UPDATE appointment a SET
+        total_price = t.total_price,
+        total_duration = t.total_duration
+    FROM (
+        SELECT linked.id, COALESCE(SUM(s.price), 0) AS total_price,
+               COALESCE(SUM(s.duration), 0) AS total_duration
+        FROM appointment linked
+        LEFT JOIN appointment_service as_j ON as_j.appointment_id = linked.id
+        LEFT JOIN service s ON s.id = as_j.service_id
+        WHERE linked.id = ANY(appointment_ids)
+        GROUP BY linked.id
+    ) t
+    WHERE a.id = t.id
+      AND (a.total_price, a.total_duration) IS DISTINCT FROM (t.total_price, t.total_duration);
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION appointment_totals_services_added()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_appointment_totals(ARRAY(SELECT DISTINCT appointment_id FROM new_links));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION appointment_totals_services_removed()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_appointment_totals(ARRAY(SELECT DISTINCT appointment_id FROM old_links));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER appointment_totals_added_trigger
+    AFTER INSERT ON appointment_service
+    REFERENCING NEW TABLE AS new_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION appointment_totals_services_added();
+
+CREATE TRIGGER appointment_totals_removed_trigger
+    AFTER DELETE ON appointment_service
+    REFERENCING OLD TABLE AS old_links
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION appointment_totals_services_removed();
+
+-- Backfill the appointments that have services
+SELECT refresh_appointment_totals(ARRAY(SELECT DISTINCT appointment_id FROM appointment_service));
+"""
+
+REVERSE_APPOINTMENT_TOTALS_SQL = """
+DROP TRIGGER IF EXISTS appointment_totals_removed_trigger ON appointment_service;
+DROP TRIGGER IF EXISTS appointment_totals_added_trigger ON appointment_service;
+DROP FUNCTION IF EXISTS appointment_totals_services_removed();
+DROP FUNCTION IF EXISTS appointment_totals_services_added();
+DROP FUNCTION IF EXISTS refresh_appointment_totals(bigint[]);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0010_hourly_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='total_duration',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(APPOINTMENT_TOTALS_SQL, reverse_sql=REVERSE_APPOINTMENT_TOTALS_SQL),
+    ]
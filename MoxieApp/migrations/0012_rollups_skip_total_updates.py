@@ -0,0 +1,145 @@
+# Generated by Django 3.2 on 2026-10-17 12:30
+
+from django.db import migrations
+
+# Since 0011 the service link triggers recompute an appointment's totals
+# with a nested UPDATE of the appointment, which fires before the link
+# triggers of the rollups. Moving the appointment's services and categories
+# out of and back into their keys there double counted the first booking of
+# a key: the decrement found no row, then the increment and the link
+# trigger both added one. An update that keeps the keys now only moves the
+# appointment's revenue and leaves its services to the link triggers.
+ROLLUP_SQL = """
+CREATE OR REPLACE FUNCTION daily_revenue_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        IF NEW.status = 'completed' AND OLD.total_price IS DISTINCT FROM NEW.total_price THEN
+            PERFORM daily_revenue_adjust(
+                DATE(NEW.created_at), NEW.medspa_id, 0, NEW.total_price - OLD.total_price
+            );
+        END IF;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(OLD.created_at), OLD.medspa_id, -1, -OLD.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(OLD.created_at), OLD.medspa_id, OLD.id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(NEW.created_at), NEW.medspa_id, 1, NEW.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(NEW.created_at), NEW.medspa_id, NEW.id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION hourly_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.start_time IS NOT DISTINCT FROM NEW.start_time
+       AND OLD.end_time IS NOT DISTINCT FROM NEW.end_time
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        IF OLD.total_price IS DISTINCT FROM NEW.total_price THEN
+            PERFORM appointment_hourly_adjust(
+                NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time),
+                0, NEW.total_price - OLD.total_price, 0
+            );
+        END IF;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM appointment_hourly_adjust(
+            OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1, -OLD.total_price,
+            -(EXTRACT(EPOCH FROM OLD.end_time - OLD.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            OLD.id, OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM appointment_hourly_adjust(
+            NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1, NEW.total_price,
+            (EXTRACT(EPOCH FROM NEW.end_time - NEW.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            NEW.id, NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# The functions as created by 0008 and 0010
+REVERSE_ROLLUP_SQL = """
+CREATE OR REPLACE FUNCTION daily_revenue_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.total_price IS NOT DISTINCT FROM NEW.total_price
+       AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(OLD.created_at), OLD.medspa_id, -1, -OLD.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(OLD.created_at), OLD.medspa_id, OLD.id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'completed' THEN
+        PERFORM daily_revenue_adjust(DATE(NEW.created_at), NEW.medspa_id, 1, NEW.total_price);
+        PERFORM daily_revenue_adjust_categories(DATE(NEW.created_at), NEW.medspa_id, NEW.id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION hourly_appointment_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.start_time IS NOT DISTINCT FROM NEW.start_time
+       AND OLD.end_time IS NOT DISTINCT FROM NEW.end_time
+       AND OLD.total_price IS NOT DISTINCT FROM NEW.total_price
+       AND OLD.medspa_id IS NOT DISTINCT FROM NEW.medspa_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM appointment_hourly_adjust(
+            OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1, -OLD.total_price,
+            -(EXTRACT(EPOCH FROM OLD.end_time - OLD.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            OLD.id, OLD.medspa_id, OLD.status, date_trunc('hour', OLD.start_time), -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM appointment_hourly_adjust(
+            NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1, NEW.total_price,
+            (EXTRACT(EPOCH FROM NEW.end_time - NEW.start_time) / 60)::integer
+        );
+        PERFORM service_hourly_adjust(
+            NEW.id, NEW.medspa_id, NEW.status, date_trunc('hour', NEW.start_time), 1
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('MoxieApp', '0011_appointment_totals'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ROLLUP_SQL, reverse_sql=REVERSE_ROLLUP_SQL),
+    ]
@@ -1,387 +1,440 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import action
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import (
+    DateTimeRangeField,
+    RangeBoundary,
+    RangeOperators
+)
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
 from django.utils import timezone
-from django.db.models import Sum, Count, Q, Avg, F
-from django.shortcuts import get_object_or_404
-from datetime import datetime, timedelta
 from decimal import Decimal
 
-from .models import (
-    Medspa,
-    Service,
-    Appointment,
-    ServiceCategory,
-    ServiceType
-)
-from .serializers import (
-    MedspaSerializer,
-    ServiceSerializer,
-    AppointmentSerializer,
-    ServiceCategorySerializer,
-    ServiceTypeSerializer
-)
-from .utils.constants import (
-    BUSINESS_HOURS,
-    SERVICE_CATEGORIES,
-    APPOINTMENT_STATUS_CHOICES
-)
-from .utils.helpers import (
-    calculate_appointment_metrics,
-    get_available_slots,
-    generate_medspa_report,
-    calculate_service_utilization
-)
-from .utils.decorators import (
-    log_action,
-    measure_execution_time,
-    cache_response,
-    atomic_transaction,
-    validate_request_data,
-    require_permissions,
-    rate_limit,
-    handle_exceptions
-)
-from .utils.custom_exceptions import (
-    ServiceValidationError,
-    AppointmentValidationError
-)
+from .utils.constants import APPOINTMENT_STATUS_CHOICES, NON_BLOCKING_STATUSES
 
-import logging
 
-logger = logging.getLogger(__name__)
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
 
 
-class ServiceCategoryViewSet(viewsets.ModelViewSet):
-    """
-    ViewSet for managing service categories.
-    """
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    serializer_class = ServiceCategorySerializer
-    queryset = ServiceCategory.objects.all()
+class Medspa(models.Model):
+    name = models.CharField(max_length=100)
+    address = models.CharField(max_length=255, blank=True, null=True)
+    phone_number = models.CharField(max_length=20, blank=True, null=True)
+    email_address = models.EmailField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    @cache_response(timeout=3600)
-    @measure_execution_time
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+    class Meta:
+        db_table = 'medspa'
 
+    def __str__(self):
+        return self.name
 
-class ServiceTypeViewSet(viewsets.ModelViewSet):
-    """
-    ViewSet for managing service types.
-    """
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    serializer_class = ServiceTypeSerializer
-    queryset = ServiceType.objects.all()
-
-    @handle_exceptions
-    @measure_execution_time
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        category_id = self.request.query_params.get('category_id')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        return queryset
-
-
-class MedspaViewSet(viewsets.ModelViewSet):
-    """
-    ViewSet for managing medspa operations.
-    """
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    serializer_class = MedspaSerializer
-    queryset = Medspa.objects.all()
-
-    @handle_exceptions
-    @atomic_transaction
-    @validate_request_data('name', 'email_address')
-    @require_permissions('can_create_medspa')
-    def create(self, request, *args, **kwargs):
-        return super().create(request, *args, **kwargs)
-
-    @handle_exceptions
-    @atomic_transaction
-    @require_permissions('can_update_medspa')
-    def update(self, request, *args, **kwargs):
-        return super().update(request, *args, **kwargs)
-
-    @handle_exceptions
-    @cache_response(timeout=300)
-    @measure_execution_time
-    @log_action("medspa_statistics")
-    @action(detail=True)
-    def statistics(self, request, pk=None):
-        """Get statistics for a specific medspa."""
-        medspa = self.get_object()
-        report = generate_medspa_report(medspa)
-        return Response(report)
-
-    @handle_exceptions
-    @rate_limit(calls=100, period=3600)
-    @log_action("medspa_availability")
-    @action(detail=True)
-    def availability(self, request, pk=None):
-        """Get availability slots for a specific medspa."""
-        medspa = self.get_object()
-        date_str = request.query_params.get('date')
-
-        try:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            available_slots = get_available_slots(medspa, date)
-
-            return Response({
-                'date': date_str,
-                'available_slots': [
-                    slot.strftime('%Y-%m-%d %H:%M')
-                    for slot in available_slots
-                ]
+    def clean(self):
+        if self.phone_number:
+            self.phone_number = ''.join(filter(str.isdigit, self.phone_number))
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+
+class BusinessHours(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='business_hours'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    opens_at = models.TimeField()
+    closes_at = models.TimeField()
+
+    class Meta:
+        db_table = 'business_hours'
+        unique_together = ('medspa', 'weekday')
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.get_weekday_display()} {self.opens_at:%H:%M}-{self.closes_at:%H:%M}"
+
+    def clean(self):
+        if self.opens_at and self.closes_at and self.closes_at <= self.opens_at:
+            raise ValidationError({'closes_at': 'Closing time must be after opening time'})
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+
+class Closure(models.Model):
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='closures'
+    )
+    date = models.DateField()
+    reason = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        db_table = 'closure'
+        unique_together = ('medspa', 'date')
+
+    def __str__(self):
+        return f"{self.medspa.name} - closed {self.date}"
+
+
+class ServiceCategory(models.Model):
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'service_category'
+
+    def __str__(self):
+        return self.name
+
+
+class ServiceType(models.Model):
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name='service_types'
+    )
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'service_type'
+
+    def __str__(self):
+        return f"{self.category.name} - {self.name}"
+
+
+class Service(models.Model):
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='services',
+        blank=True,
+        null=True
+    )
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name='services'
+    )
+    service_type = models.ForeignKey(
+        ServiceType,
+        on_delete=models.CASCADE,
+        related_name='services'
+    )
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    product = models.CharField(max_length=255, blank=True, null=True)
+    supplier = models.CharField(max_length=255, blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    duration = models.IntegerField(default=0)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'service'
+
+    def __str__(self):
+        if self.medspa_id:
+            return f"{self.medspa.name} - {self.name}"
+        return self.name
+
+    def clean(self):
+        if self.price is not None and Decimal(str(self.price)) < 0:
+            raise ValidationError({'price': 'Price cannot be negative'})
+        if self.service_type_id and self.category_id \
+                and self.service_type.category_id != self.category_id:
+            raise ValidationError({
+                'service_type': 'Selected service type does not belong to the selected category'
             })
-        except ValueError:
-            return Response(
-                {'error': 'Invalid date format. Use YYYY-MM-DD'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+
+class Appointment(models.Model):
+    STATUS_CHOICES = APPOINTMENT_STATUS_CHOICES
+
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='appointments'
+    )
+    services = models.ManyToManyField(
+        Service,
+        through='AppointmentService',
+        related_name='appointments'
+    )
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='scheduled'
+    )
+    # Sums over the linked services, recomputed by database triggers
+    # whenever the set of services changes (see migration 0011)
+    total_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    total_duration = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'appointment'
+        indexes = [
+            models.Index(fields=['medspa', 'start_time'], name='appointment_medspa_start_idx'),
+        ]
+        constraints = [
+            # No two blocking appointments of a medspa may overlap in time
+            ExclusionConstraint(
+                name='appointment_no_overlap',
+                expressions=[
+                    (TsTzRange('start_time', 'end_time', RangeBoundary()), RangeOperators.OVERLAPS),
+                    ('medspa', RangeOperators.EQUAL),
+                ],
+                condition=~Q(status__in=NON_BLOCKING_STATUSES),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.start_time:%Y-%m-%d %H:%M}"
+
+    def clean(self):
+        start_time = self.start_time
+        if start_time and timezone.is_naive(start_time):
+            start_time = timezone.make_aware(start_time)
+        if self._state.adding and start_time and start_time < timezone.now():
+            raise ValidationError({
+                'start_time': 'Appointment cannot be scheduled in the past'
+            })
+
+    def save(self, *args, **kwargs):
+        if self.end_time is None:
+            self.end_time = self.start_time
+        self.full_clean()
+        super().save(*args, **kwargs)
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class AppointmentService(models.Model):
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'appointment_service'
+        unique_together = ('appointment', 'service')
+
+
+class DailyRevenue(models.Model):
+    """
+    Completed appointments and their revenue per medspa and creation date.
+    Rows are adjusted by database triggers as appointments change (see
+    migration 0008); read them through the `mv_daily_revenue` view.
+    """
+    date = models.DateField()
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='daily_revenue'
+    )
+    total_appointments = models.IntegerField(default=0)
+    daily_revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    class Meta:
+        db_table = 'daily_revenue'
+        unique_together = ('date', 'medspa')
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.date} revenue"
+
+
+class DailyRevenueCategory(models.Model):
+    """Completed appointments using each service category, per medspa and date."""
+    date = models.DateField()
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='daily_revenue_categories'
+    )
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name='daily_revenue'
+    )
+    total_appointments = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_revenue_category'
+        unique_together = ('date', 'medspa', 'category')
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.date} {self.category.name}"
+
+
+class MedspaStatistics(models.Model):
+    """Precomputed all-time statistics of a medspa, refreshed in the background."""
+    medspa = models.OneToOneField(
+        Medspa,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='statistics'
+    )
+    total_services = models.IntegerField(default=0)
+    active_categories = models.IntegerField(default=0)
+    total_appointments = models.IntegerField(default=0)
+    completed_appointments = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'medspa_statistics'
+
+    def __str__(self):
+        return f"{self.medspa.name} - statistics"
+
+
+class ServiceUtilization(models.Model):
+    """Precomputed all-time bookings of a service, refreshed in the background."""
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='utilization'
+    )
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='service_utilization'
+    )
+    total_bookings = models.IntegerField(default=0)
+    completed_bookings = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'service_utilization'
+        unique_together = ('service', 'medspa')
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.service.name} utilization"
+
+
+class StatisticsRefresh(models.Model):
+    """A pending refresh of a medspa's precomputed statistics."""
+    medspa = models.OneToOneField(
+        Medspa,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='statistics_refresh'
+    )
+    due_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'statistics_refresh'
+
+    def __str__(self):
+        return f"{self.medspa.name} - refresh due {self.due_at:%Y-%m-%d %H:%M:%S}"
+
+
+class AppointmentHourly(models.Model):
     """
-    ViewSet for managing services.
+    Appointments per medspa, status and starting hour, with their booked
+    price and minutes. Adjusted by database triggers (see migration 0010).
     """
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    serializer_class = ServiceSerializer
-
-    @handle_exceptions
-    @measure_execution_time
-    def get_queryset(self):
-        queryset = Service.objects.select_related(
-            'medspa', 'category', 'service_type'
-        ).prefetch_related('appointments')
-
-        filters = {}
-
-        # Apply filters
-        medspa_id = self.request.query_params.get('medspa_id')
-        if medspa_id:
-            filters['medspa_id'] = medspa_id
-
-        category_id = self.request.query_params.get('category_id')
-        if category_id:
-            filters['category_id'] = category_id
-
-        service_type_id = self.request.query_params.get('service_type_id')
-        if service_type_id:
-            filters['service_type_id'] = service_type_id
-
-        active = self.request.query_params.get('active')
-        if active is not None:
-            filters['active'] = active.lower() == 'true'
-
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
-        if min_price:
-            filters['price__gte'] = Decimal(min_price)
-        if max_price:
-            filters['price__lte'] = Decimal(max_price)
-
-        return queryset.filter(**filters).annotate(
-            appointment_count=Count('appointments')
-        )
-
-    @handle_exceptions
-    @atomic_transaction
-    @validate_request_data('name', 'price', 'duration', 'medspa', 'category', 'service_type')
-    @require_permissions('can_create_service')
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return Response(
-            serializer.data,
-            status=status.HTTP_201_CREATED,
-            headers=headers
-        )
-
-    @handle_exceptions
-    @cache_response(timeout=300)
-    @measure_execution_time
-    @log_action("service_usage_statistics")
-    @action(detail=True)
-    def usage_statistics(self, request, pk=None):
-        """Get usage statistics for a specific service."""
-        service = self.get_object()
-        period_days = int(request.query_params.get('days', 30))
-        stats = calculate_service_utilization(service, period_days)
-        return Response(stats)
-
-
-class AppointmentViewSet(viewsets.ModelViewSet):
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='hourly_appointments'
+    )
+    status = models.CharField(max_length=20, choices=APPOINTMENT_STATUS_CHOICES)
+    hour = models.DateTimeField()
+    appointments = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    minutes = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'appointment_hourly'
+        unique_together = ('medspa', 'hour', 'status')
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.hour:%Y-%m-%d %H:00} {self.status}"
+
+
+class ServiceHourly(models.Model):
     """
-    ViewSet for managing appointments.
+    Booked services per medspa, service, category, appointment status and
+    starting hour, with their price and minutes. Adjusted by database
+    triggers (see migration 0010).
     """
-    authentication_classes = [JWTAuthentication]
-    permission_classes = [IsAuthenticated]
-    serializer_class = AppointmentSerializer
-
-    @handle_exceptions
-    @measure_execution_time
-    def get_queryset(self):
-        queryset = Appointment.objects.select_related(
-            'medspa'
-        ).prefetch_related(
-            'services',
-            'services__category',
-            'services__service_type'
-        )
-
-        filters = {}
-
-        status_filter = self.request.query_params.get('status')
-        if status_filter:
-            filters['status'] = status_filter
-
-        date_filter = self.request.query_params.get('date')
-        if date_filter:
-            try:
-                filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-                filters['start_time__date'] = filter_date
-            except ValueError:
-                pass
-
-        medspa_id = self.request.query_params.get('medspa_id')
-        if medspa_id:
-            filters['medspa_id'] = medspa_id
-
-        return queryset.filter(**filters)
-
-    @handle_exceptions
-    @atomic_transaction
-    @validate_request_data('start_time', 'medspa', 'services')
-    @require_permissions('can_create_appointment')
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-
-        try:
-            with transaction.atomic():
-                appointment = serializer.save()
-                metrics = calculate_appointment_metrics(appointment)
-
-                # Update response data with calculated metrics
-                response_data = serializer.data
-                response_data.update({
-                    'total_duration': metrics['total_duration'],
-                    'total_price': str(metrics['total_price'])
-                })
-
-                return Response(
-                    response_data,
-                    status=status.HTTP_201_CREATED
-                )
-        except Exception as e:
-            logger.error(f"Error creating appointment: {str(e)}")
-            raise AppointmentValidationError(str(e))
-
-    @handle_exceptions
-    @atomic_transaction
-    @validate_request_data('status')
-    @log_action("appointment_status_update")
-    @action(detail=True, methods=['patch'])
-    def update_status(self, request, pk=None):
-        """Update the status of an appointment."""
-        appointment = self.get_object()
-        new_status = request.data.get('status')
-
-        if new_status not in dict(APPOINTMENT_STATUS_CHOICES):
-            raise AppointmentValidationError("Invalid status value")
-
-        appointment.status = new_status
-        appointment.save()
-
-        serializer = self.get_serializer(appointment)
-        return Response(serializer.data)
-
-    @handle_exceptions
-    @cache_response(timeout=300)
-    @measure_execution_time
-    @log_action("appointment_calendar")
-    @action(detail=False)
-    def calendar(self, request):
-        """Get calendar view of appointments."""
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        medspa_id = request.query_params.get('medspa_id')
-
-        queryset = self.get_queryset()
-
-        if medspa_id:
-            queryset = queryset.filter(medspa_id=medspa_id)
-
-        if start_date:
-            queryset = queryset.filter(start_time__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(start_time__date__lte=end_date)
-
-        appointments = queryset.values(
-            'id', 'start_time', 'status', 'medspa__name'
-        ).annotate(
-            service_count=Count('services'),
-            total_duration=Sum('services__duration'),
-            total_price=Sum('services__price')
-        ).order_by('start_time')
-
-        return Response(list(appointments))
-
-    @handle_exceptions
-    @cache_response(timeout=300)
-    @measure_execution_time
-    @log_action("appointment_analytics")
-    @action(detail=False)
-    def analytics(self, request):
-        """Get appointment analytics."""
-        days = int(request.query_params.get('days', 30))
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
-
-        queryset = self.get_queryset().filter(
-            start_time__date__range=[start_date.date(), end_date.date()]
-        )
-
-        completed_appointments = queryset.filter(status='completed')
-
-        analytics = {
-            'period': {
-                'start_date': start_date.date(),
-                'end_date': end_date.date(),
-                'days': days
-            },
-            'appointments': {
-                'total': queryset.count(),
-                'completed': completed_appointments.count(),
-                'canceled': queryset.filter(status='canceled').count(),
-                'scheduled': queryset.filter(status='scheduled').count()
-            },
-            'revenue': completed_appointments.aggregate(
-                total=Sum('services__price')
-            )['total'] or Decimal('0.00'),
-            'services': {
-                'average_per_appointment': queryset.annotate(
-                    service_count=Count('services')
-                ).aggregate(
-                    avg=Avg('service_count')
-                )['avg'] or 0,
-                'most_popular': queryset.values(
-                    'services__name'
-                ).annotate(
-                    count=Count('services__name')
-                ).order_by('-count')[:5]
-            }
-        }
-
-        return Response(analytics)
+    medspa = models.ForeignKey(
+        Medspa,
+        on_delete=models.CASCADE,
+        related_name='hourly_services'
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        related_name='hourly_bookings'
+    )
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name='hourly_bookings'
+    )
+    status = models.CharField(max_length=20, choices=APPOINTMENT_STATUS_CHOICES)
+    hour = models.DateTimeField()
+    bookings = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    minutes = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'service_hourly'
+        unique_together = ('medspa', 'hour', 'service', 'category', 'status')
+        indexes = [
+            models.Index(fields=['service', 'hour'], name='service_hourly_service_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.medspa.name} - {self.service.name} {self.hour:%Y-%m-%d %H:00} {self.status}"
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BusinessHours, Closure
+from .signals import appointment_changed
+from .utils import (
+    availability, events, leaderboard, occupancy, response_cache, schedule, statistics
+)
+
+
+@receiver(appointment_changed)
+def update_occupancy(sender, before, after, **kwargs):
+    """Move the appointment's footprint in the Redis occupancy maps."""
+    transaction.on_commit(lambda: occupancy.apply_change(before, after))
+
+
+@receiver(appointment_changed)
+def invalidate_availability(sender, before, after, **kwargs):
+    """
+    Retire cached availability of the days the change touches. Registered
+    after update_occupancy so recomputed days read the updated maps.
+    """
+    transaction.on_commit(lambda: availability.invalidate_appointment_change(before, after))
+
+
+@receiver(appointment_changed)
+def push_appointment_event(sender, before, after, **kwargs):
+    """Stream the change to live availability subscribers once it commits."""
+    transaction.on_commit(lambda: events.publish_appointment_change(before, after))
+
+
+@receiver(appointment_changed)
+def update_leaderboards(sender, before, after, **kwargs):
+    """Move the appointment's services between popular-services buckets."""
+    transaction.on_commit(lambda: leaderboard.apply_change(before, after))
+
+
+@receiver(appointment_changed)
+def schedule_statistics_refresh(sender, before, after, **kwargs):
+    """Queue the affected medspas' precomputed statistics for a refresh."""
+    statistics.request_refresh(
+        snapshot.medspa_id for snapshot in (before, after) if snapshot is not None
+    )
+
+
+@receiver(appointment_changed)
+def invalidate_cached_responses(sender, before, after, **kwargs):
+    """Retire cached responses tagged with the touched medspas and services."""
+    transaction.on_commit(lambda: response_cache.invalidate_appointment_change(before, after))
+
+
+@receiver(post_save, sender=BusinessHours)
+@receiver(post_delete, sender=BusinessHours)
+@receiver(post_save, sender=Closure)
+@receiver(post_delete, sender=Closure)
+def invalidate_schedule(sender, instance, **kwargs):
+    """Make every process recompile the medspa's opening hours."""
+    transaction.on_commit(lambda: schedule.bump_version(instance.medspa_id))
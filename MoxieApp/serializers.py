@@ -1,14 +1,20 @@
 from rest_framework import serializers
 from .models import (
     Medspa,
+    BusinessHours,
+    Closure,
     Service,
     Appointment,
     AppointmentService,
     ServiceCategory,
     ServiceType
 )
-from django.db.models import Sum
+from django.core.exceptions import ValidationError as DjangoValidationError
+from datetime import timedelta
 from decimal import Decimal
+from .signals import notify_appointment_changed
+from .utils.helpers import booking_conflict_guard, snapshot_appointment
+from .utils.validators import validate_business_hours
 
 
 class ServiceCategorySerializer(serializers.ModelSerializer):
@@ -54,6 +60,29 @@ class MedspaSerializer(serializers.ModelSerializer):
         return value
 
 
+class BusinessHoursSerializer(serializers.ModelSerializer):
+    weekday_name = serializers.CharField(source='get_weekday_display', read_only=True)
+
+    class Meta:
+        model = BusinessHours
+        fields = ['id', 'medspa', 'weekday', 'weekday_name', 'opens_at', 'closes_at']
+
+    def validate(self, data):
+        opens_at = data.get('opens_at', getattr(self.instance, 'opens_at', None))
+        closes_at = data.get('closes_at', getattr(self.instance, 'closes_at', None))
+        if opens_at and closes_at and closes_at <= opens_at:
+            raise serializers.ValidationError({
+                'closes_at': 'Closing time must be after opening time'
+            })
+        return data
+
+
+class ClosureSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Closure
+        fields = ['id', 'medspa', 'date', 'reason']
+
+
 class ServiceSerializer(serializers.ModelSerializer):
     medspa_name = serializers.CharField(source='medspa.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -123,10 +152,11 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = [
-            'id', 'start_time', 'status', 'medspa', 'medspa_name',
+            'id', 'start_time', 'end_time', 'status', 'medspa', 'medspa_name',
             'services', 'total_duration', 'total_price',
             'created_at', 'updated_at'
         ]
+        read_only_fields = ['end_time']
 
     def validate_start_time(self, value):
         """Validate that appointment start time is not in the past"""
@@ -148,51 +178,87 @@ class AppointmentSerializer(serializers.ModelSerializer):
         medspa_id = self.initial_data.get('medspa')
         if medspa_id:
             for service_data in services:
-                service_id = service_data.get('service')
-                try:
-                    service = Service.objects.get(id=service_id)
-                    if not service.active:
-                        raise serializers.ValidationError(
-                            f"Service {service.name} is not currently active"
-                        )
-                    if service.medspa_id != int(medspa_id):
-                        raise serializers.ValidationError(
-                            f"Service {service.name} does not belong to the selected medspa"
-                        )
-                except Service.DoesNotExist:
+                # Already resolved to a Service by the nested serializer,
+                # which rejects unknown ids
+                service = service_data['service']
+                if not service.active:
+                    raise serializers.ValidationError(
+                        f"Service {service.name} is not currently active"
+                    )
+                if service.medspa_id != int(medspa_id):
                     raise serializers.ValidationError(
-                        f"Service with id {service_id} does not exist"
+                        f"Service {service.name} does not belong to the selected medspa"
                     )
 
         return services
 
+    def validate(self, data):
+        """Validate that the appointment fits the medspa's opening hours"""
+        # Updates that leave the time range and medspa alone, such as a status
+        # change, must not be rejected because the hours changed since booking
+        scheduling_fields = ('start_time', 'medspa', 'appointmentservice_set')
+        if self.instance is not None and not any(name in data for name in scheduling_fields):
+            return data
+
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        medspa = data.get('medspa', getattr(self.instance, 'medspa', None))
+        if start_time is None or medspa is None:
+            return data
+
+        if 'appointmentservice_set' in data:
+            total_duration = timedelta(minutes=sum(
+                service_data['service'].duration
+                for service_data in data['appointmentservice_set']
+            ))
+        elif self.instance is not None:
+            total_duration = self.instance.end_time - self.instance.start_time
+        else:
+            total_duration = timedelta()
+
+        try:
+            validate_business_hours(medspa.pk, start_time, start_time + total_duration)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'start_time': e.messages})
+
+        return data
+
     def create(self, validated_data):
         """Create appointment with services"""
         services_data = validated_data.pop('appointmentservice_set', [])
-        appointment = Appointment.objects.create(**validated_data)
+        services = [service_data['service'] for service_data in services_data]
 
         # Calculate total price and duration
-        total_price = Decimal('0')
-        total_duration = 0
-
-        # Add services and calculate totals
-        for service_data in services_data:
-            service = service_data['service']
-            AppointmentService.objects.create(
-                appointment=appointment,
-                service=service
+        total_price = sum((service.price for service in services), Decimal('0'))
+        total_duration = sum(service.duration for service in services)
+
+        # The appointment row is inserted with its final time range so the
+        # overlap constraint sees the real booking
+        with booking_conflict_guard():
+            appointment = Appointment.objects.create(
+                end_time=validated_data['start_time'] + timedelta(minutes=total_duration),
+                total_price=total_price,
+                total_duration=total_duration,
+                **validated_data
             )
-            total_price += service.price
-            total_duration += service.duration
 
-        appointment.total_price = total_price
-        appointment.save()
+        AppointmentService.objects.bulk_create([
+            AppointmentService(appointment=appointment, service=service)
+            for service in services
+        ])
+
+        notify_appointment_changed(
+            sender=Appointment,
+            before=None,
+            after=snapshot_appointment(appointment)
+        )
 
         return appointment
 
     def update(self, instance, validated_data):
         """Update appointment and its services"""
         services_data = validated_data.pop('appointmentservice_set', None)
+        before = snapshot_appointment(instance)
+        total_duration = before.end_time - before.start_time
 
         # Update appointment fields
         for attr, value in validated_data.items():
@@ -204,34 +270,28 @@ class AppointmentSerializer(serializers.ModelSerializer):
             instance.appointmentservice_set.all().delete()
 
             # Add new services
-            total_price = Decimal('0')
-            total_duration = 0
-
-            for service_data in services_data:
-                service = service_data['service']
-                AppointmentService.objects.create(
-                    appointment=instance,
-                    service=service
-                )
-                total_price += service.price
-                total_duration += service.duration
-
-            instance.total_price = total_price
+            services = [service_data['service'] for service_data in services_data]
+            AppointmentService.objects.bulk_create([
+                AppointmentService(appointment=instance, service=service)
+                for service in services
+            ])
+
+            # The database recomputes the totals as the links change; keep
+            # the instance in step so save() writes the same values
+            instance.total_price = sum(
+                (service.price for service in services), Decimal('0')
+            )
+            instance.total_duration = sum(service.duration for service in services)
+            total_duration = timedelta(minutes=instance.total_duration)
 
-        instance.save()
-        return instance
+        instance.end_time = instance.start_time + total_duration
+        with booking_conflict_guard():
+            instance.save()
 
-    def to_representation(self, instance):
-        """Add calculated fields to the representation"""
-        data = super().to_representation(instance)
-
-        # Calculate totals from related services
-        services = data.get('services', [])
-        data['total_duration'] = sum(
-            service['duration'] for service in services
+        notify_appointment_changed(
+            sender=Appointment,
+            before=before,
+            after=snapshot_appointment(instance)
         )
-        data['total_price'] = str(sum(
-            Decimal(str(service['price'])) for service in services
-        ))
 
-        return data
+        return instance
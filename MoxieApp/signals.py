@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+# Sent whenever an appointment is created, rescheduled, has its services or
+# status changed, or is deleted through the API. Receivers get `before` and
+# `after` AppointmentSnapshot values (either may be None) and run inside the
+# writing transaction; anything that talks to an external store should defer
+# itself with transaction.on_commit.
+appointment_changed = Signal()
+
+
+def notify_appointment_changed(sender, before, after):
+    """Broadcast an appointment state change to all receivers."""
+    appointment_changed.send(sender=sender, before=before, after=after)
@@ -0,0 +1,146 @@
+"""
+Server-sent event stream of live availability changes.
+
+GET /events/medspas/<id>/ keeps the connection open and pushes an event
+whenever an appointment of the medspa is booked, moved, canceled or
+deleted, so front-desk screens no longer poll `availability` and
+`calendar`. Pass `date=YYYY-MM-DD` to receive only events touching that
+day. Browsers' EventSource cannot set headers, so the JWT access token is
+accepted as `?token=` as well as an `Authorization: Bearer` header.
+
+This is a plain ASGI application mounted by asgi.py next to Django; it
+never holds a worker thread while idle.
+"""
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .models import Medspa
+from .utils import events
+from .utils.constants import EVENT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+PATH_PATTERN = re.compile(r'^/events/medspas/(?P<medspa_id>\d+)/?$')
+
+
+def get_raw_token(scope, query):
+    if query.get('token'):
+        return query['token'][0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    return None
+
+
+@sync_to_async
+def authenticate(raw_token):
+    """Return the user for a JWT access token, or None if it is not valid."""
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+    return user if user.is_active else None
+
+
+@sync_to_async
+def medspa_exists(medspa_id):
+    return Medspa.objects.filter(pk=medspa_id).exists()
+
+
+async def send_error(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'error': message}).encode(),
+    })
+
+
+def format_event(message):
+    """Render a published message as an SSE frame."""
+    event_type = json.loads(message).get('type', 'message')
+    return f"event: {event_type}\ndata: {message}\n\n".encode()
+
+
+def matches_date(message, date):
+    if date is None:
+        return True
+    payload = json.loads(message)
+    return payload.get('type') != 'appointment' or date in payload.get('dates', [])
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI application serving /events/medspas/<id>/."""
+    match = PATH_PATTERN.match(scope['path'])
+    if scope['type'] != 'http' or match is None:
+        await send_error(send, 404, "Not found")
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    raw_token = get_raw_token(scope, query)
+    if raw_token is None or await authenticate(raw_token) is None:
+        await send_error(send, 401, "Authentication credentials were not provided or are invalid")
+        return
+
+    medspa_id = int(match.group('medspa_id'))
+    if not await medspa_exists(medspa_id):
+        await send_error(send, 404, "Medspa not found")
+        return
+    date = query.get('date', [None])[0]
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=EVENT_SETTINGS['queue_size'])
+    events.subscribe(medspa_id, loop, queue)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+
+        while not disconnected.done():
+            next_message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_message, disconnected},
+                timeout=EVENT_SETTINGS['heartbeat'],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_message not in done:
+                next_message.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+                continue
+            message = next_message.result()
+            if matches_date(message, date):
+                await send({'type': 'http.response.body', 'body': format_event(message), 'more_body': True})
+    except OSError as e:
+        logger.info(f"Event stream for medspa {medspa_id} closed: {str(e)}")
+    finally:
+        events.unsubscribe(medspa_id, loop, queue)
+        disconnected.cancel()
@@ -0,0 +1,169 @@
+from django.test import SimpleTestCase
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from ..utils import holds, occupancy
+from ..utils.availability import (
+    merge_intervals,
+    iter_free_slots,
+    parse_date_range,
+    parse_slot_parameters
+)
+from ..utils.occupancy import CELLS_PER_DAY, build_counts, counts_to_intervals
+from ..utils.schedule import DEFAULT_HOURS, Schedule
+
+
+def at(hour, minute=0):
+    return datetime(2030, 1, 7, hour, minute)
+
+
+class TestMergeIntervals(SimpleTestCase):
+    def test_merges_overlapping_and_touching(self):
+        merged = merge_intervals([
+            (at(11), at(12)),
+            (at(9), at(10)),
+            (at(9, 30), at(10, 15)),
+            (at(12), at(12, 30)),
+        ])
+        self.assertEqual(merged, [
+            (at(9), at(10, 15)),
+            (at(11), at(12, 30)),
+        ])
+
+    def test_contained_interval_does_not_shrink(self):
+        merged = merge_intervals([(at(9), at(12)), (at(10), at(11))])
+        self.assertEqual(merged, [(at(9), at(12))])
+
+
+class TestFreeSlotSweep(SimpleTestCase):
+    def brute_force(self, busy, start, end, duration, granularity):
+        """Reference implementation: check every slot against every interval."""
+        slots = []
+        slot = start
+        while slot + timedelta(minutes=duration) <= end:
+            slot_end = slot + timedelta(minutes=duration)
+            if not any(slot < b_end and slot_end > b_start for b_start, b_end in busy):
+                slots.append(slot)
+            slot += timedelta(minutes=granularity)
+        return slots
+
+    def test_empty_day(self):
+        slots = list(iter_free_slots([], at(9), at(17), 60, 30))
+        self.assertEqual(len(slots), 15)
+        self.assertEqual(slots[0], at(9))
+        self.assertEqual(slots[-1], at(16))
+
+    def test_matches_brute_force(self):
+        busy = merge_intervals([
+            (at(8), at(9, 10)),
+            (at(10, 5), at(10, 50)),
+            (at(13), at(13, 30)),
+            (at(16, 45), at(18)),
+        ])
+        for duration in (15, 30, 60, 90):
+            for granularity in (5, 15, 30):
+                self.assertEqual(
+                    list(iter_free_slots(busy, at(9), at(17), duration, granularity)),
+                    self.brute_force(busy, at(9), at(17), duration, granularity)
+                )
+
+    def test_fully_booked(self):
+        busy = [(at(8), at(18))]
+        self.assertEqual(list(iter_free_slots(busy, at(9), at(17), 30, 30)), [])
+
+
+class TestSlotParameters(SimpleTestCase):
+    def test_defaults(self):
+        self.assertEqual(parse_slot_parameters({}), (60, 30))
+
+    def test_rejects_out_of_range_duration(self):
+        with self.assertRaises(ValueError):
+            parse_slot_parameters({'duration': '5'})
+        with self.assertRaises(ValueError):
+            parse_slot_parameters({'granularity': 'abc'})
+
+    def test_date_range_limits(self):
+        self.assertEqual(
+            parse_date_range({'start_date': '2030-01-01', 'end_date': '2030-01-14'}),
+            (datetime(2030, 1, 1).date(), datetime(2030, 1, 14).date())
+        )
+        with self.assertRaises(ValueError):
+            parse_date_range({'start_date': '2030-01-14', 'end_date': '2030-01-01'})
+        with self.assertRaises(ValueError):
+            parse_date_range({'start_date': '2030-01-01', 'end_date': '2030-06-01'})
+
+
+class TestOccupancyCells(SimpleTestCase):
+    def aware(self, hour, minute=0):
+        return timezone.make_aware(at(hour, minute))
+
+    def test_round_trip_rounds_outwards_to_cells(self):
+        date = at(0).date()
+        counts = build_counts(date, [
+            (self.aware(10, 2), self.aware(10, 58)),
+            (self.aware(10, 30), self.aware(11, 30)),
+        ])
+        self.assertEqual(len(counts), CELLS_PER_DAY)
+        self.assertEqual(counts[10 * 12 + 6], 2)
+        self.assertEqual(
+            counts_to_intervals(date, counts),
+            [(self.aware(10), self.aware(11, 30))]
+        )
+
+    def test_cell_aligned_answers_match_exact_intervals(self):
+        date = at(0).date()
+        exact = merge_intervals([
+            (self.aware(9, 40), self.aware(10, 10)),
+            (self.aware(13, 3), self.aware(13, 57)),
+        ])
+        from_cells = counts_to_intervals(date, build_counts(date, exact))
+        window = (self.aware(9), self.aware(17))
+        self.assertTrue(occupancy.is_cell_aligned(window[0], 15))
+        self.assertEqual(
+            list(iter_free_slots(from_cells, *window, 30, 15)),
+            list(iter_free_slots(exact, *window, 30, 15))
+        )
+
+
+class TestSchedule(SimpleTestCase):
+    def test_weekly_hours_and_closures(self):
+        monday = at(0).date()
+        weekly = [DEFAULT_HOURS] * 5 + [(time(10), time(14)), None]
+        schedule = Schedule(
+            version='v1',
+            weekly=tuple(weekly),
+            closures=frozenset([monday + timedelta(days=1)])
+        )
+        self.assertEqual(
+            schedule.window(monday),
+            (timezone.make_aware(at(9)), timezone.make_aware(at(17)))
+        )
+        self.assertIsNone(schedule.window(monday + timedelta(days=1)))
+        self.assertEqual(
+            schedule.window(monday + timedelta(days=5))[1],
+            timezone.make_aware(at(14) + timedelta(days=5))
+        )
+        self.assertIsNone(schedule.window(monday + timedelta(days=6)))
+
+
+class TestSlotHolds(SimpleTestCase):
+    def aware(self, hour, minute=0):
+        return timezone.make_aware(at(hour, minute))
+
+    def test_member_round_trip(self):
+        member = holds.encode_member('abc_-1', self.aware(10), self.aware(11))
+        self.assertEqual(
+            holds.decode_member(member.encode()),
+            ('abc_-1', self.aware(10), self.aware(11))
+        )
+
+    def test_held_slots_are_excluded(self):
+        slots = [self.aware(9), self.aware(9, 30), self.aware(10), self.aware(10, 30)]
+        held = [(self.aware(10), self.aware(10, 30), 'token')]
+        self.assertEqual(
+            holds.exclude_held_slots(slots, held, 30),
+            [self.aware(9), self.aware(9, 30), self.aware(10, 30)]
+        )
+        self.assertEqual(
+            holds.exclude_held_slots(slots, held, 60),
+            [self.aware(9), self.aware(10, 30)]
+        )
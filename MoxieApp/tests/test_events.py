@@ -0,0 +1,115 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from datetime import datetime, timedelta
+from rest_framework_simplejwt.tokens import RefreshToken
+from ..models import Medspa
+from ..streams import application
+from ..utils import events, leaderboard
+from ..utils.helpers import AppointmentSnapshot
+
+
+def snapshot(hour, status='scheduled', medspa_id=1, service_ids=(3, 4)):
+    start = timezone.make_aware(datetime(2030, 1, 7, hour))
+    return AppointmentSnapshot(
+        id=7, medspa_id=medspa_id, start_time=start,
+        end_time=start + timedelta(hours=1), status=status,
+        service_ids=service_ids
+    )
+
+
+class TestAppointmentEvents(SimpleTestCase):
+    def test_booking_and_cancellation_deltas(self):
+        created = events.build_events(None, snapshot(10))[1]
+        self.assertEqual(created['taken'], [(snapshot(10).start_time, snapshot(10).end_time)])
+        self.assertEqual(created['released'], [])
+
+        canceled = events.build_events(snapshot(10), snapshot(10, 'canceled'))[1]
+        self.assertEqual(canceled['taken'], [])
+        self.assertEqual(canceled['released'], [(snapshot(10).start_time, snapshot(10).end_time)])
+        self.assertEqual(canceled['appointment']['status'], 'canceled')
+
+    def test_status_change_without_calendar_effect(self):
+        confirmed = events.build_events(snapshot(10), snapshot(10, 'confirmed'))[1]
+        self.assertEqual((confirmed['taken'], confirmed['released']), ([], []))
+        self.assertEqual(confirmed['dates'], [snapshot(10).start_time.date()])
+
+    def test_move_between_medspas_notifies_both(self):
+        moved = events.build_events(snapshot(10), snapshot(11, medspa_id=2))
+        self.assertEqual(sorted(moved), [1, 2])
+        self.assertEqual(len(moved[1]['released']), 1)
+        self.assertEqual(len(moved[2]['taken']), 1)
+
+
+class TestLeaderboardDeltas(SimpleTestCase):
+    def deltas(self, before, after):
+        counts = leaderboard.contributions(after)
+        counts.subtract(leaderboard.contributions(before))
+        return {key: delta for key, delta in counts.items() if delta}
+
+    def test_booking_counts_each_service(self):
+        day = snapshot(10).start_time.date()
+        self.assertEqual(self.deltas(None, snapshot(10)), {
+            ('booked', 1, day, 3): 1,
+            ('booked', 1, day, 4): 1,
+        })
+
+    def test_completion_and_service_changes(self):
+        day = snapshot(10).start_time.date()
+        self.assertEqual(
+            self.deltas(snapshot(10), snapshot(10, 'completed', service_ids=(4,))),
+            {('booked', 1, day, 3): -1, ('completed', 1, day, 4): 1}
+        )
+        self.assertEqual(self.deltas(snapshot(10), snapshot(11)), {})
+
+
+class TestEventStream(TestCase):
+    def setUp(self):
+        self.medspa = Medspa.objects.create(
+            name="Test Medspa",
+            email_address="test@medspa.com"
+        )
+        user = User.objects.create_user(username='frontdesk', password='secret')
+        self.token = str(RefreshToken.for_user(user).access_token)
+
+    async def request(self, query_string):
+        sent = asyncio.Queue()
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        scope = {
+            'type': 'http',
+            'path': f'/events/medspas/{self.medspa.id}/',
+            'query_string': query_string.encode(),
+            'headers': [],
+        }
+        task = asyncio.ensure_future(application(scope, receive, sent.put))
+        return task, sent, disconnect
+
+    async def test_requires_token(self):
+        task, sent, _ = await self.request('')
+        await asyncio.wait_for(task, 5)
+        self.assertEqual((await sent.get())['status'], 401)
+
+    async def test_streams_appointment_changes(self):
+        task, sent, disconnect = await self.request(f'token={self.token}')
+        self.assertEqual((await asyncio.wait_for(sent.get(), 5))['status'], 200)
+        self.assertEqual((await asyncio.wait_for(sent.get(), 5))['body'], b': connected\n\n')
+
+        await sync_to_async(events.publish_appointment_change)(
+            None, snapshot(10, medspa_id=self.medspa.id)
+        )
+        frame = (await asyncio.wait_for(sent.get(), 5))['body'].decode()
+        self.assertTrue(frame.startswith('event: appointment\n'))
+        payload = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(payload['medspa'], self.medspa.id)
+        self.assertEqual(len(payload['taken']), 1)
+
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
@@ -2,7 +2,7 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import json
 
 
@@ -22,6 +22,10 @@ class TestBookingFlow(APITestCase):
             format='json'
         )
         self.medspa_id = self.medspa_response.data['id']
+        # Within the default 09:00-17:00 business hours whenever the suite runs
+        self.start_time = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=1), time(10))
+        )
 
         # Create category and type
         self.category_data = {
@@ -82,7 +86,7 @@ class TestBookingFlow(APITestCase):
 
         # 3. Create appointment
         appointment_data = {
-            "start_time": (timezone.now() + timedelta(days=1)).isoformat(),
+            "start_time": self.start_time.isoformat(),
             "medspa": self.medspa_id,
             "services": [self.service_id]
         }
@@ -128,7 +132,7 @@ class TestBookingFlow(APITestCase):
 
         # Test booking with non-existent service
         invalid_service_data = {
-            "start_time": (timezone.now() + timedelta(days=1)).isoformat(),
+            "start_time": self.start_time.isoformat(),
             "medspa": self.medspa_id,
             "services": [9999]
         }
@@ -141,7 +145,7 @@ class TestBookingFlow(APITestCase):
 
         # Test invalid status update
         appointment_data = {
-            "start_time": (timezone.now() + timedelta(days=1)).isoformat(),
+            "start_time": self.start_time.isoformat(),
             "medspa": self.medspa_id,
             "services": [self.service_id]
         }
@@ -1,5 +1,9 @@
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from io import StringIO
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
 from ..models import (
@@ -8,7 +12,20 @@ from ..models import (
     Appointment,
     ServiceCategory,
     ServiceType,
-    AppointmentService
+    AppointmentService,
+    AppointmentHourly,
+    DailyRevenue,
+    ServiceHourly,
+    StatisticsRefresh
+)
+from ..utils.custom_exceptions import ConcurrentBookingError
+from ..utils.helpers import booking_conflict_guard
+from ..utils import statistics
+from ..utils.rollups import (
+    find_daily_revenue_drift,
+    find_hourly_drift,
+    rebuild_daily_revenue,
+    rebuild_hourly
 )
 
 class TestMedspaModel(TestCase):
@@ -148,6 +165,7 @@ class TestAppointmentModel(TestCase):
             medspa=self.medspa
         )
         self.appointment.services.add(self.service1, self.service2)
+        self.appointment.refresh_from_db()
 
     def test_appointment_creation(self):
         self.assertTrue(isinstance(self.appointment, Appointment))
@@ -162,6 +180,30 @@ class TestAppointmentModel(TestCase):
             Decimal("499.98")
         )
 
+    def test_totals_follow_service_changes(self):
+        AppointmentService.objects.filter(service=self.service1).delete()
+        self.appointment.refresh_from_db()
+        self.assertEqual(
+            (self.appointment.total_price, self.appointment.total_duration),
+            (Decimal("199.99"), 60)
+        )
+
+        AppointmentService.objects.bulk_create([
+            AppointmentService(appointment=self.appointment, service=self.service1)
+        ])
+        self.appointment.refresh_from_db()
+        self.assertEqual(
+            (self.appointment.total_price, self.appointment.total_duration),
+            (Decimal("499.98"), 90)
+        )
+
+        self.appointment.services.clear()
+        self.appointment.refresh_from_db()
+        self.assertEqual(
+            (self.appointment.total_price, self.appointment.total_duration),
+            (Decimal("0.00"), 0)
+        )
+
     def test_past_appointment_validation(self):
         with self.assertRaises(ValidationError):
             Appointment.objects.create(
@@ -178,3 +220,284 @@ class TestAppointmentModel(TestCase):
         with self.assertRaises(ValidationError):
             self.appointment.status = 'invalid_status'
             self.appointment.save()
+
+class TestAppointmentOverlapConstraint(TestCase):
+    def setUp(self):
+        self.medspa = Medspa.objects.create(
+            name="Test Medspa",
+            email_address="test@medspa.com"
+        )
+        self.start = timezone.now() + timedelta(days=1)
+        Appointment.objects.create(
+            start_time=self.start,
+            end_time=self.start + timedelta(minutes=60),
+            medspa=self.medspa
+        )
+
+    def test_overlapping_booking_is_rejected(self):
+        with self.assertRaises(ConcurrentBookingError):
+            with booking_conflict_guard():
+                Appointment.objects.create(
+                    start_time=self.start + timedelta(minutes=30),
+                    end_time=self.start + timedelta(minutes=90),
+                    medspa=self.medspa
+                )
+
+    def test_adjacent_and_canceled_bookings_are_allowed(self):
+        with booking_conflict_guard():
+            Appointment.objects.create(
+                start_time=self.start + timedelta(minutes=60),
+                end_time=self.start + timedelta(minutes=120),
+                medspa=self.medspa
+            )
+            Appointment.objects.create(
+                start_time=self.start,
+                end_time=self.start + timedelta(minutes=60),
+                medspa=self.medspa,
+                status='canceled'
+            )
+        self.assertEqual(Appointment.objects.count(), 3)
+
+
+class TestDailyRevenueRollup(TestCase):
+    def setUp(self):
+        self.medspa = Medspa.objects.create(
+            name="Test Medspa",
+            email_address="test@medspa.com"
+        )
+        self.injectables = ServiceCategory.objects.create(name="Injectables")
+        self.facials = ServiceCategory.objects.create(name="Facials")
+        neuromodulators = ServiceType.objects.create(category=self.injectables, name="Neuromodulators")
+        peels = ServiceType.objects.create(category=self.facials, name="Peels")
+        self.services = [
+            Service.objects.create(
+                name=name, price=Decimal("100.00"), duration=30, medspa=self.medspa,
+                category=service_type.category, service_type=service_type
+            )
+            for name, service_type in [
+                ("Botox", neuromodulators),
+                ("Dysport", neuromodulators),
+                ("Hydrafacial", peels),
+            ]
+        ]
+        start = timezone.now() + timedelta(days=1)
+        self.appointment = Appointment.objects.create(
+            start_time=start,
+            end_time=start + timedelta(minutes=90),
+            medspa=self.medspa,
+            total_price=Decimal("300.00")
+        )
+        AppointmentService.objects.bulk_create([
+            AppointmentService(appointment=self.appointment, service=service)
+            for service in self.services
+        ])
+
+    def read_view(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT date, medspa_id, medspa_name, total_appointments, daily_revenue, "
+                "service_categories_used FROM mv_daily_revenue"
+            )
+            return cursor.fetchall()
+
+    def test_rollup_follows_appointment_changes(self):
+        self.assertEqual(self.read_view(), [])
+
+        self.appointment.status = 'completed'
+        self.appointment.save()
+        self.assertEqual(self.read_view(), [(
+            timezone.now().date(), self.medspa.id, "Test Medspa", 1, Decimal("300.00"),
+            sorted([self.injectables.id, self.facials.id])
+        )])
+
+        # Removing one of two injectables keeps the category in use
+        AppointmentService.objects.filter(service=self.services[0]).delete()
+        AppointmentService.objects.filter(service=self.services[2]).delete()
+        self.assertEqual(self.read_view()[0][5], [self.injectables.id])
+
+        self.appointment.total_price = Decimal("100.00")
+        self.appointment.save()
+        self.assertEqual(self.read_view()[0][4], Decimal("100.00"))
+        self.assertEqual(find_daily_revenue_drift(), ([], []))
+
+        self.appointment.delete()
+        self.assertEqual(self.read_view(), [])
+        self.assertEqual(find_daily_revenue_drift(), ([], []))
+
+    def test_rebuild_repairs_drift(self):
+        self.appointment.status = 'completed'
+        self.appointment.save()
+        DailyRevenue.objects.update(daily_revenue=Decimal("1.00"))
+        self.assertEqual(len(find_daily_revenue_drift()[0]), 1)
+
+        self.assertEqual(rebuild_daily_revenue(), 1)
+        self.assertEqual(find_daily_revenue_drift(), ([], []))
+        self.assertEqual(self.read_view()[0][4], Decimal("300.00"))
+
+    def test_deleting_medspa_clears_rollup(self):
+        self.appointment.status = 'completed'
+        self.appointment.save()
+        self.medspa.delete()
+        self.assertFalse(DailyRevenue.objects.exists())
+
+
+class TestStatisticsRefresh(TestCase):
+    def setUp(self):
+        self.medspa = Medspa.objects.create(
+            name="Test Medspa",
+            email_address="test@medspa.com"
+        )
+        start = timezone.now() + timedelta(days=1)
+        Appointment.objects.create(
+            start_time=start,
+            end_time=start + timedelta(minutes=60),
+            medspa=self.medspa
+        )
+
+    def test_refreshes_are_coalesced_and_debounced(self):
+        statistics.request_refresh([self.medspa.id])
+        statistics.request_refresh([self.medspa.id])
+        self.assertEqual(StatisticsRefresh.objects.count(), 1)
+
+        self.assertEqual(statistics.run_due_refreshes(), 1)
+        self.assertEqual(
+            statistics.get_medspa_statistics([self.medspa.id])[self.medspa.id]['total_appointments'], 1
+        )
+
+        # Refreshed just now: the next change waits for the interval
+        statistics.request_refresh([self.medspa.id])
+        self.assertEqual(statistics.run_due_refreshes(), 0)
+        self.assertGreater(
+            StatisticsRefresh.objects.get().due_at,
+            timezone.now() + timedelta(seconds=30)
+        )
+
+    def test_never_refreshed_medspa_is_computed_on_read(self):
+        stats = statistics.get_medspa_statistics([self.medspa.id])[self.medspa.id]
+        self.assertEqual(stats['total_appointments'], 1)
+        self.assertEqual(stats['completed_appointments'], 0)
+
+    def test_refresh_covers_services_and_completed_revenue(self):
+        category = ServiceCategory.objects.create(name="Injectables")
+        service_type = ServiceType.objects.create(category=category, name="Neuromodulators")
+        booked, unbooked = [
+            Service.objects.create(
+                name=name, price=Decimal("300.00"), duration=30, medspa=self.medspa,
+                category=category, service_type=service_type
+            )
+            for name in ("Botox", "Dysport")
+        ]
+        appointment = Appointment.objects.get()
+        appointment.status = 'completed'
+        appointment.total_price = Decimal("300.00")
+        appointment.save()
+        AppointmentService.objects.create(appointment=appointment, service=booked)
+
+        statistics.refresh_statistics([self.medspa.id])
+
+        stats = statistics.get_medspa_statistics([self.medspa.id])[self.medspa.id]
+        self.assertEqual(
+            (stats['total_services'], stats['active_categories'], stats['completed_appointments']),
+            (2, 1, 1)
+        )
+        self.assertEqual(stats['total_revenue'], Decimal("300.00"))
+        self.assertEqual(
+            statistics.get_service_utilization(booked)['revenue'], Decimal("300.00")
+        )
+        self.assertEqual(statistics.get_service_utilization(unbooked)['total_bookings'], 0)
+
+
+class TestHourlyRollups(TestCase):
+    def setUp(self):
+        self.medspa = Medspa.objects.create(
+            name="Test Medspa",
+            email_address="test@medspa.com"
+        )
+        category = ServiceCategory.objects.create(name="Injectables")
+        service_type = ServiceType.objects.create(category=category, name="Neuromodulators")
+        self.service = Service.objects.create(
+            name="Botox", price=Decimal("300.00"), duration=30, medspa=self.medspa,
+            category=category, service_type=service_type
+        )
+        self.start = (timezone.now() + timedelta(days=1)).replace(minute=15, second=0, microsecond=0)
+        self.appointment = Appointment.objects.create(
+            start_time=self.start,
+            end_time=self.start + timedelta(minutes=30),
+            medspa=self.medspa,
+            total_price=Decimal("300.00")
+        )
+        AppointmentService.objects.create(appointment=self.appointment, service=self.service)
+        self.range = (self.start - timedelta(days=2), self.start + timedelta(days=2))
+
+    def totals(self, model, *fields):
+        return sorted(model.objects.exclude(**{fields[-1]: 0}).values_list(*fields))
+
+    def test_rollups_follow_appointment_and_service_changes(self):
+        hour = self.start.replace(minute=0)
+        self.assertEqual(
+            self.totals(AppointmentHourly, 'status', 'hour', 'revenue', 'minutes', 'appointments'),
+            [('scheduled', hour, Decimal("300.00"), 30, 1)]
+        )
+        self.assertEqual(
+            self.totals(ServiceHourly, 'status', 'hour', 'revenue', 'minutes', 'bookings'),
+            [('scheduled', hour, Decimal("300.00"), 30, 1)]
+        )
+
+        self.appointment.start_time += timedelta(hours=2)
+        self.appointment.end_time += timedelta(hours=2)
+        self.appointment.status = 'completed'
+        self.appointment.save()
+        self.service.price = Decimal("250.00")
+        self.service.save()
+
+        later = hour + timedelta(hours=2)
+        self.assertEqual(
+            self.totals(AppointmentHourly, 'status', 'hour', 'appointments'),
+            [('completed', later, 1)]
+        )
+        self.assertEqual(
+            self.totals(ServiceHourly, 'status', 'hour', 'revenue', 'bookings'),
+            [('completed', later, Decimal("250.00"), 1)]
+        )
+        self.assertEqual(find_hourly_drift(*self.range), ([], []))
+
+        self.appointment.delete()
+        self.assertEqual(self.totals(AppointmentHourly, 'appointments'), [])
+        self.assertEqual(self.totals(ServiceHourly, 'bookings'), [])
+
+    def test_rollups_follow_service_set_changes(self):
+        category = ServiceCategory.objects.create(name="Fillers")
+        other = Service.objects.create(
+            name="Filler", price=Decimal("450.00"), duration=45, medspa=self.medspa,
+            category=category,
+            service_type=ServiceType.objects.create(category=category, name="HA dermal filler")
+        )
+        start = self.start + timedelta(hours=3)
+        appointment = Appointment.objects.create(
+            start_time=start,
+            end_time=start + timedelta(minutes=45),
+            medspa=self.medspa,
+            status='completed'
+        )
+
+        # First bookings of each service and category for their keys
+        appointment.services.add(self.service, other)
+        appointment.services.remove(self.service)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.total_price, Decimal("450.00"))
+        self.assertEqual(find_hourly_drift(*self.range), ([], []))
+        self.assertEqual(find_daily_revenue_drift(), ([], []))
+
+        appointment.services.set([self.service])
+        self.assertEqual(find_hourly_drift(*self.range), ([], []))
+        self.assertEqual(find_daily_revenue_drift(), ([], []))
+
+    def test_backfill_repairs_drift(self):
+        AppointmentHourly.objects.all().delete()
+        ServiceHourly.objects.update(bookings=5)
+        drift = find_hourly_drift(*self.range)
+        self.assertEqual((len(drift[0]), len(drift[1])), (1, 1))
+
+        self.assertEqual(rebuild_hourly(*self.range), 1)
+        self.assertEqual(find_hourly_drift(*self.range), ([], []))
+        call_command('backfill_hourly_rollups', '--verify', stdout=StringIO())
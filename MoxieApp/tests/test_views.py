@@ -4,12 +4,24 @@ from django.urls import reverse
 from django.utils import timezone
 from ..models import (
     Medspa,
+    BusinessHours,
+    Closure,
     Service,
     Appointment,
     ServiceCategory,
     ServiceType
 )
-from datetime import datetime, timedelta
+from ..serializers import AppointmentSerializer
+from ..signals import notify_appointment_changed
+from ..utils.helpers import (
+    compare_range_analytics,
+    compute_medspa_statistics,
+    get_appointment_analytics,
+    snapshot_appointment,
+    split_rollup_range
+)
+from ..utils import statistics
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 import json
 
@@ -69,6 +81,175 @@ class TestMedspaViews(APITestCase):
         self.assertIn('total_services', response.data)
         self.assertIn('total_appointments', response.data)
 
+    def test_batch_medspa_statistics(self):
+        """Test statistics of many medspas computed only for cache misses"""
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        cache.clear()
+        category = ServiceCategory.objects.create(name="Injectables")
+        service_type = ServiceType.objects.create(category=category, name="Neuromodulators")
+        medspas = [
+            Medspa.objects.create(name=f"Medspa {i}", email_address=f"m{i}@medspa.com")
+            for i in range(3)
+        ]
+        for hours, medspa in enumerate(medspas[:2]):
+            service = Service.objects.create(
+                medspa=medspa, category=category, service_type=service_type,
+                name="Botox", price=Decimal('100.00'), duration=30
+            )
+            start = timezone.now() + timedelta(days=1, hours=hours)
+            appointment = Appointment.objects.create(
+                medspa=medspa, start_time=start,
+                end_time=start + timedelta(minutes=30), status='completed'
+            )
+            appointment.services.add(service)
+
+        url = reverse('medspa-batch-statistics')
+        response = self.client.get(url, {'ids': f"{medspas[0].id},{medspas[2].id}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {str(medspas[0].id), str(medspas[2].id)})
+        self.assertEqual(response.data[str(medspas[0].id)]['total_services'], 1)
+        self.assertEqual(response.data[str(medspas[0].id)]['revenue'], Decimal('100.00'))
+        self.assertEqual(response.data[str(medspas[2].id)]['total_appointments'], 0)
+
+        # Only the missing medspa is computed: its never refreshed rows are
+        # filled in, then today's appointments are counted
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(set(response.data), {str(medspa.id) for medspa in medspas})
+        self.assertEqual(response.data[str(medspas[1].id)]['total_appointments'], 1)
+        grouped = [q for q in queries.captured_queries if 'GROUP BY' in q['sql']]
+        self.assertEqual(len(grouped), 3)
+        self.assertTrue(all(
+            f"[{medspas[1].id}]" in q['sql'] or f"({medspas[1].id})" in q['sql'] for q in grouped
+        ))
+
+        # One read of the precomputed rows and one grouped count of today's
+        # appointments, however many medspas
+        with self.assertNumQueries(2):
+            compute_medspa_statistics([medspa.id for medspa in medspas])
+
+        response = self.client.get(url, {'ids': 'a,b'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_statistics_follow_tagged_writes(self):
+        """Test cached responses are retired by writes to what they depend on"""
+        from django.core.cache import cache
+
+        cache.clear()
+        medspa = Medspa.objects.create(**self.medspa_data)
+        other = Medspa.objects.create(name="Other Medspa", email_address="other@medspa.com")
+        url = reverse('medspa-statistics', kwargs={'pk': medspa.id})
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        start = timezone.now() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                medspa=other, start_time=start, end_time=start + timedelta(minutes=30)
+            )
+            notify_appointment_changed(
+                sender=Appointment, before=None, after=snapshot_appointment(appointment)
+            )
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                medspa=medspa, start_time=start + timedelta(hours=1),
+                end_time=start + timedelta(hours=1, minutes=30)
+            )
+            notify_appointment_changed(
+                sender=Appointment, before=None, after=snapshot_appointment(appointment)
+            )
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        # The worker's refresh of the precomputed row retires the entry too
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            statistics.refresh_statistics([medspa.id])
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_appointments'], 1)
+
+        categories = reverse('servicecategory-list')
+        self.client.get(categories)
+        self.assertEqual(self.client.get(categories)['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(categories, {'name': "Facials"}, format='json')
+        response = self.client.get(categories)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_local_cache_tier(self):
+        """Test hot responses are served in-process until a tag changes anywhere"""
+        import time as clock
+        from unittest import mock
+        from django.core.cache import cache
+        from ..utils import response_cache
+        from ..utils.constants import CACHE_KEYS, RESPONSE_CACHE_SETTINGS
+
+        cache.clear()
+        response_cache.local_cache.clear()
+        response_cache.local_tag_versions.clear()
+        medspa = Medspa.objects.create(**self.medspa_data)
+        url = reverse('medspa-statistics', kwargs={'pk': medspa.id})
+        before = response_cache.get_cache_stats()
+
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        # A local hit reads neither the entry nor the tag versions from the shared cache
+        with mock.patch.object(response_cache, 'cache', wraps=cache) as shared:
+            response = self.client.get(url)
+        self.assertEqual(shared.method_calls, [])
+        self.assertEqual(response['X-Cache-Tier'], 'local')
+        self.assertEqual(json.loads(response.content)['total_appointments'], 0)
+
+        # A write in this process retires the local copy at once
+        response_cache.invalidate_tags(response_cache.medspa_tag(medspa.id))
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        # A write in another process only replaces the shared token, which
+        # this process picks up once its copy is older than the local tag TTL
+        tag_key = CACHE_KEYS['cache_tag'].format(response_cache.medspa_tag(medspa.id))
+        cache.set(tag_key, 'replaced elsewhere', None)
+        self.assertEqual(self.client.get(url)['X-Cache-Tier'], 'local')
+        ttl = RESPONSE_CACHE_SETTINGS['local_tag_ttl']
+        with mock.patch('time.monotonic', return_value=clock.monotonic() + ttl):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        after = response_cache.get_cache_stats()
+        self.assertEqual(after['local']['hits'] - before['local']['hits'], 2)
+        self.assertEqual(after['local']['misses'] - before['local']['misses'], 3)
+        self.assertEqual(after['shared']['misses'] - before['shared']['misses'], 3)
+
+        lru = response_cache.LocalResponseCache(max_bytes=250)
+        entry = {'status': 200, 'content': b'x' * 100, 'headers': []}
+        lru.set('a', entry, 60)
+        lru.set('b', entry, 60)
+        lru.get('a')
+        lru.set('c', entry, 60)
+        self.assertEqual(list(lru.entries), ['a', 'c'])
+        self.assertEqual(lru.size, 200)
+        lru.set('d', {**entry, 'content': b'x' * 300}, 60)
+        self.assertIsNone(lru.get('d'))
+
+    def test_statistics_roll_over_at_midnight(self):
+        """Test today's statistics are not served from yesterday's entries"""
+        from unittest import mock
+        from django.core.cache import cache
+        from ..utils import response_cache
+
+        cache.clear()
+        response_cache.local_cache.clear()
+        medspa = Medspa.objects.create(**self.medspa_data)
+        url = reverse('medspa-statistics', kwargs={'pk': medspa.id})
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.localdate', return_value=tomorrow):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
     def test_medspa_availability(self):
         """Test medspa availability endpoint"""
         medspa = Medspa.objects.create(**self.medspa_data)
@@ -80,6 +261,145 @@ class TestMedspaViews(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('available_slots', response.data)
+        self.assertEqual(response.data['available_slots'][0], f"{tomorrow} 09:00")
+
+    def test_medspa_availability_range(self):
+        """Test multi-day availability returns one slot list per day"""
+        medspa = Medspa.objects.create(**self.medspa_data)
+        start = (timezone.now() + timedelta(days=1)).date()
+        end = start + timedelta(days=13)
+
+        response = self.client.get(
+            reverse('medspa-availability', kwargs={'pk': medspa.id}),
+            {'start_date': start.isoformat(), 'end_date': end.isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 14)
+        self.assertEqual(response.data['days'][start.isoformat()][0], '09:00')
+
+        response = self.client.get(
+            reverse('medspa-availability', kwargs={'pk': medspa.id}),
+            {'start_date': end.isoformat(), 'end_date': start.isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_availability_follows_medspa_hours_and_closures(self):
+        """Test per-medspa opening hours and closures drive availability"""
+        medspa = Medspa.objects.create(**self.medspa_data)
+        start = (timezone.now() + timedelta(days=1)).date()
+        closed = start + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            hours = BusinessHours.objects.create(
+                medspa=medspa, weekday=start.weekday(),
+                opens_at=time(10), closes_at=time(12)
+            )
+            BusinessHours.objects.create(
+                medspa=medspa, weekday=closed.weekday(),
+                opens_at=time(10), closes_at=time(12)
+            )
+            Closure.objects.create(medspa=medspa, date=closed, reason="Holiday")
+
+        url = reverse('medspa-availability', kwargs={'pk': medspa.id})
+        params = {
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=2)).isoformat()
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['days'][start.isoformat()], ['10:00', '10:30', '11:00'])
+        self.assertEqual(response.data['days'][closed.isoformat()], [])
+        self.assertEqual(response.data['days'][(start + timedelta(days=2)).isoformat()], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hours.closes_at = time(11)
+            hours.save()
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.data['days'][start.isoformat()], ['10:00'])
+
+class TestResponseCacheRecompute(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from ..utils import response_cache
+
+        cache.clear()
+        response_cache.local_cache.clear()
+        self.calls = []
+
+    def compute(self, delay=0):
+        import time as clock
+
+        def compute():
+            clock.sleep(delay)
+            self.calls.append(1)
+            entry = {'status': 200, 'content': str(len(self.calls)).encode(), 'headers': []}
+            return None, entry
+        return compute
+
+    def test_stale_entry_served_while_one_request_refreshes(self):
+        from django.core.cache import cache
+        from ..utils import response_cache
+
+        response_cache.serve_cached('key', self.compute(), 60, stale_ttl=60)
+        entry = cache.get('key')
+        cache.set('key', {**entry, 'fresh_until': 0}, 60)
+
+        # Another worker holds the refresh lock: serve the previous value
+        token = response_cache.acquire_refresh_lock('key')
+        response = response_cache.serve_cached('key', self.compute(), 60, stale_ttl=60)
+        self.assertEqual((response['X-Cache'], response.content), ('STALE', b'1'))
+        self.assertEqual(len(self.calls), 1)
+
+        response_cache.release_refresh_lock('key', token)
+        response_cache.serve_cached('key', self.compute(), 60, stale_ttl=60)
+        self.assertEqual(len(self.calls), 2)
+        response = response_cache.serve_cached('key', self.compute(), 60, stale_ttl=60)
+        self.assertEqual((response['X-Cache'], response.content), ('HIT', b'2'))
+
+    def test_concurrent_misses_recompute_once(self):
+        import threading
+        from ..utils import response_cache
+
+        responses = []
+
+        def request():
+            responses.append(response_cache.serve_cached('key', self.compute(delay=0.2), 60))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sum(1 for response in responses if response is not None), 4)
+        self.assertTrue(all(response.content == b'1' for response in responses if response is not None))
+        self.assertEqual(response_cache.key_events, {})
+
+    def test_misses_on_other_keys_do_not_wait(self):
+        import threading
+        import time as clock
+        from ..utils import response_cache
+
+        slow = threading.Thread(
+            target=response_cache.serve_cached, args=('slow', self.compute(delay=0.5), 60)
+        )
+        slow.start()
+        clock.sleep(0.1)
+        started = clock.monotonic()
+        response_cache.serve_cached('other', self.compute(), 60)
+        self.assertLess(clock.monotonic() - started, 0.3)
+        slow.join()
+
+    def test_expired_lock_is_not_released_by_its_old_holder(self):
+        from django.core.cache import cache
+        from ..utils import response_cache
+        from ..utils.constants import CACHE_KEYS
+
+        token = response_cache.acquire_refresh_lock('key')
+        # The lock expired and another request took it
+        cache.set(CACHE_KEYS['response_lock'].format('key'), 'other', 60)
+        response_cache.release_refresh_lock('key', token)
+        self.assertIsNone(response_cache.acquire_refresh_lock('key'))
 
 
 class TestServiceViews(APITestCase):
@@ -173,6 +493,12 @@ class TestServiceViews(APITestCase):
         self.assertIn('total_appointments', response.data)
         self.assertIn('revenue', response.data)
 
+        url = reverse('service-usage-statistics', kwargs={'pk': service.id})
+        self.assertEqual(self.client.get(url, {'days': 7}).status_code, status.HTTP_200_OK)
+        for days in ('abc', '1.5', '0', '-3', '99999999'):
+            response = self.client.get(url, {'days': days})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, days)
+
 
 class TestAppointmentViews(APITestCase):
     def setUp(self):
@@ -195,8 +521,12 @@ class TestAppointmentViews(APITestCase):
             category=self.category,
             service_type=self.service_type
         )
+        # Within the default 09:00-17:00 business hours whenever the suite runs
+        self.start_time = timezone.make_aware(
+            datetime.combine(timezone.localdate() + timedelta(days=1), time(10))
+        )
         self.appointment_data = {
-            "start_time": (timezone.now() + timedelta(days=1)).isoformat(),
+            "start_time": self.start_time.isoformat(),
             "medspa": self.medspa.id,
             "services": [self.service.id]
         }
@@ -215,6 +545,35 @@ class TestAppointmentViews(APITestCase):
             Decimal("199.99")
         )
 
+    def test_appointment_outside_business_hours(self):
+        """Test bookings must start and end within the medspa's business hours"""
+        def validate(start_time):
+            serializer = AppointmentSerializer(data={
+                "start_time": start_time.isoformat(),
+                "medspa": self.medspa.id,
+                "services": [{"service": self.service.id}]
+            })
+            return serializer.is_valid(), serializer.errors
+
+        self.assertEqual(validate(self.start_time), (True, {}))
+
+        for start_time in (self.start_time.replace(hour=7), self.start_time.replace(hour=16, minute=30)):
+            valid, errors = validate(start_time)
+            self.assertFalse(valid)
+            self.assertIn('start_time', errors)
+
+        # A booking the current hours no longer allow can still change status
+        early = self.start_time.replace(hour=7)
+        appointment = Appointment.objects.create(
+            start_time=early, end_time=early + timedelta(minutes=60), medspa=self.medspa
+        )
+        serializer = AppointmentSerializer(appointment, data={'status': 'canceled'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer = AppointmentSerializer(
+            appointment, data={'start_time': early.isoformat()}, partial=True
+        )
+        self.assertFalse(serializer.is_valid())
+
     def test_list_appointments(self):
         """Test retrieving list of appointments"""
         appointment = Appointment.objects.create(
@@ -267,6 +626,100 @@ class TestAppointmentViews(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['status'], 'completed')
 
+    def test_appointment_timeseries(self):
+        """Test timeseries are bucketed in one query and gap-filled"""
+        first_day = (timezone.now() + timedelta(days=1)).date()
+        for offset, status_value, price in [
+            (0, 'completed', Decimal("100.00")),
+            (0, 'canceled', Decimal("80.00")),
+            (8, 'completed', Decimal("50.00")),
+        ]:
+            start = timezone.make_aware(datetime.combine(first_day + timedelta(days=offset), time(10)))
+            Appointment.objects.create(
+                start_time=start,
+                end_time=start + timedelta(hours=1),
+                medspa=self.medspa,
+                status=status_value,
+                total_price=price
+            )
+        params = {
+            'start_date': first_day.isoformat(),
+            'end_date': (first_day + timedelta(days=9)).isoformat(),
+        }
+
+        response = self.client.get(reverse('appointment-timeseries'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['buckets']), 10)
+        self.assertEqual(response.data['appointments'], [2] + [0] * 7 + [1, 0])
+        self.assertEqual(response.data['canceled'][0], 1)
+        self.assertEqual(response.data['revenue'][0], Decimal("100.00"))
+        self.assertEqual(response.data['revenue'][1], Decimal("0.00"))
+
+        response = self.client.get(
+            reverse('medspa-timeseries', kwargs={'pk': self.medspa.id}),
+            {**params, 'interval': 'week'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['buckets'][0], first_day - timedelta(days=first_day.weekday()))
+        self.assertEqual(sum(response.data['appointments']), 3)
+        self.assertEqual(sum(response.data['revenue']), Decimal("150.00"))
+
+        response = self.client.get(reverse('appointment-timeseries'), {'interval': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_appointment_export(self):
+        """Test appointments stream out as CSV and NDJSON"""
+        start = timezone.now() + timedelta(days=1)
+        for offset in range(3):
+            appointment = Appointment.objects.create(
+                start_time=start + timedelta(hours=offset),
+                end_time=start + timedelta(hours=offset, minutes=30),
+                medspa=self.medspa
+            )
+            appointment.services.add(self.service)
+
+        response = self.client.get(reverse('appointment-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'medspa_id', 'medspa__name'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('199.99', lines[1])
+
+        response = self.client.get(reverse('appointment-export'), {
+            'output': 'ndjson',
+            'start_date': start.date().isoformat(),
+            'end_date': start.date().isoformat()
+        })
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), sum(
+            1 for offset in range(3)
+            if timezone.localdate(start + timedelta(hours=offset)) == start.date()
+        ))
+
+        response = self.client.get(reverse('appointment-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_responses_follow_query_params(self):
+        """Test cached responses are keyed on query params, not request identity"""
+        from django.core.cache import cache
+
+        cache.clear()
+        url = reverse('appointment-analytics')
+        first = self.client.get(url, {'days': 7, 'status': 'completed'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        second = self.client.get(url, {'status': 'completed', 'days': 7})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        self.assertNotIn('X-Execution-Time', second)
+
+        other = self.client.get(url, {'days': 8, 'status': 'completed'})
+        self.assertEqual(other['X-Cache'], 'MISS')
+        self.assertEqual(other.data['period']['days'], 8)
+
     def test_appointment_calendar(self):
         """Test appointment calendar endpoint"""
         appointment = Appointment.objects.create(
@@ -294,6 +747,263 @@ class TestAppointmentViews(APITestCase):
         self.assertIn('revenue', response.data)
         self.assertIn('services', response.data)
 
+    def test_appointment_analytics_query_budget(self):
+        """Test analytics are computed with two queries"""
+        second_service = Service.objects.create(
+            name="Second Service",
+            price=Decimal("50.00"),
+            duration=30,
+            medspa=self.medspa,
+            category=self.category,
+            service_type=self.service_type
+        )
+        start = timezone.now() + timedelta(days=1)
+        for offset, status_value, services in [
+            (0, 'completed', [self.service, second_service]),
+            (2, 'completed', [self.service]),
+            (4, 'canceled', [self.service]),
+            (6, 'scheduled', []),
+        ]:
+            appointment = Appointment.objects.create(
+                start_time=start + timedelta(hours=offset),
+                end_time=start + timedelta(hours=offset + 1),
+                medspa=self.medspa,
+                status=status_value
+            )
+            appointment.services.add(*services)
+
+        with self.assertNumQueries(2):
+            analytics = get_appointment_analytics(Appointment.objects.all())
+
+        self.assertEqual(
+            analytics['appointments'],
+            {'total': 4, 'completed': 2, 'canceled': 1, 'scheduled': 1}
+        )
+        self.assertEqual(analytics['revenue'], Decimal("449.98"))
+        self.assertEqual(analytics['services']['average_per_appointment'], 1)
+        self.assertEqual(
+            analytics['services']['most_popular'][0],
+            {'services__name': "Test Service", 'count': 3}
+        )
+        self.assertEqual(analytics['categories']['distribution'], [{
+            'services__category__name': "Injectables",
+            'count': 3,
+            'revenue': Decimal("449.98"),
+        }])
+
+    def test_hybrid_analytics_match_raw_rows(self):
+        """Test rollup-backed analytics agree with the raw path across closed and open hours"""
+        second_service = Service.objects.create(
+            name="Second Service",
+            price=Decimal("50.00"),
+            duration=30,
+            medspa=self.medspa,
+            category=self.category,
+            service_type=self.service_type
+        )
+        now = timezone.now()
+        for offset, status_value, services in [
+            (-50, 'completed', [self.service, second_service]),
+            (-26, 'completed', [self.service]),
+            (-3, 'canceled', [self.service]),
+            (0, 'scheduled', [second_service]),
+            (5, 'scheduled', []),
+        ]:
+            appointment = Appointment.objects.create(
+                start_time=now + timedelta(days=1),
+                end_time=now + timedelta(days=1, minutes=30),
+                medspa=self.medspa,
+                status=status_value
+            )
+            appointment.services.add(*services)
+            # Move it to its real, possibly past, start time
+            Appointment.objects.filter(pk=appointment.pk).update(
+                start_time=now + timedelta(hours=offset),
+                end_time=now + timedelta(hours=offset, minutes=30)
+            )
+
+        for start, end, filters in [
+            (now - timedelta(days=4), now + timedelta(days=1), {}),
+            (now - timedelta(hours=30), now - timedelta(hours=2), {}),
+            (None, None, {'status': 'completed'}),
+            (now - timedelta(days=4), None, {'medspa_id': self.medspa.id}),
+        ]:
+            self.assertEqual(compare_range_analytics(start, end, **filters), [])
+
+    def test_split_rollup_range(self):
+        """Test ranges split into closed hours and raw edges"""
+        now = datetime(2030, 1, 7, 12, 40, tzinfo=timezone.utc)
+        hour = datetime(2030, 1, 7, 12, tzinfo=timezone.utc)
+        start = datetime(2030, 1, 1, 9, 30, tzinfo=timezone.utc)
+
+        closed, raw = split_rollup_range(start, now + timedelta(days=1), now=now)
+        self.assertEqual(closed, (start + timedelta(minutes=30), hour))
+        self.assertEqual(raw, [(start, start + timedelta(minutes=30)), (hour, now + timedelta(days=1))])
+
+        self.assertEqual(split_rollup_range(now, None, now=now), (None, [(now, None)]))
+        self.assertEqual(split_rollup_range(None, hour, now=now), ((None, hour), []))
+
+    def test_availability_excludes_booked_slots(self):
+        """Test availability skips slots overlapping a booked appointment"""
+        day = (timezone.now() + timedelta(days=1)).date()
+        booked_start = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=10)))
+        appointment = Appointment.objects.create(
+            start_time=booked_start,
+            end_time=booked_start + timedelta(minutes=60),
+            medspa=self.medspa
+        )
+        appointment.services.add(self.service)
+
+        response = self.client.get(
+            reverse('medspa-availability', kwargs={'pk': self.medspa.id}),
+            {'date': day.strftime('%Y-%m-%d'), 'duration': 60, 'granularity': 30}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slots = response.data['available_slots']
+        self.assertNotIn(f"{booked_start:%Y-%m-%d %H:%M}", slots)
+        self.assertNotIn(f"{booked_start - timedelta(minutes=30):%Y-%m-%d %H:%M}", slots)
+        self.assertIn(f"{booked_start - timedelta(minutes=60):%Y-%m-%d %H:%M}", slots)
+        self.assertIn(f"{booked_start + timedelta(minutes=60):%Y-%m-%d %H:%M}", slots)
+
+    def test_availability_cache_follows_booking_changes(self):
+        """Test cached availability is retired when a booking on the day changes"""
+        day = (timezone.now() + timedelta(days=1)).date()
+        booked_start = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=10)))
+        url = reverse('medspa-availability', kwargs={'pk': self.medspa.id})
+        params = {'date': day.strftime('%Y-%m-%d'), 'duration': 60, 'granularity': 30}
+        booked_slot = f"{booked_start:%Y-%m-%d %H:%M}"
+
+        self.assertIn(booked_slot, self.client.get(url, params).data['available_slots'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                start_time=booked_start,
+                end_time=booked_start + timedelta(minutes=60),
+                medspa=self.medspa
+            )
+            notify_appointment_changed(
+                sender=Appointment, before=None, after=snapshot_appointment(appointment)
+            )
+        self.assertNotIn(booked_slot, self.client.get(url, params).data['available_slots'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('appointment-update-status', kwargs={'pk': appointment.id}),
+                {'status': 'canceled'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(booked_slot, self.client.get(url, params).data['available_slots'])
+
+    def test_availability_for_service_bundle(self):
+        """Test availability derives the slot length from requested services"""
+        second_service = Service.objects.create(
+            name="Second Service",
+            price=Decimal("99.99"),
+            duration=90,
+            medspa=self.medspa,
+            category=self.category,
+            service_type=self.service_type
+        )
+        tomorrow = (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        response = self.client.get(
+            reverse('medspa-availability', kwargs={'pk': self.medspa.id}),
+            {'date': tomorrow, 'service_ids': f"{self.service.id},{second_service.id}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['duration'], 150)
+
+        response = self.client.get(
+            reverse('medspa-availability', kwargs={'pk': self.medspa.id}),
+            {'date': tomorrow, 'service_ids': '99999'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_earliest_availability_across_medspas(self):
+        """Test earliest-slot search merges slots from several medspas"""
+        other_medspa = Medspa.objects.create(
+            name="Other Medspa",
+            email_address="other@medspa.com"
+        )
+        day = (timezone.now() + timedelta(days=1)).date()
+        opening = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=9)))
+        appointment = Appointment.objects.create(
+            start_time=opening,
+            end_time=opening + timedelta(minutes=60),
+            medspa=self.medspa
+        )
+        appointment.services.add(self.service)
+
+        response = self.client.get(
+            reverse('medspa-earliest-availability'),
+            {
+                'medspa_ids': f"{self.medspa.id},{other_medspa.id}",
+                'after': opening.isoformat(),
+                'duration': 60,
+                'limit': 3
+            }
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r['medspa'], r['start_time']) for r in response.data['results']],
+            [
+                (other_medspa.id, opening),
+                (other_medspa.id, opening + timedelta(minutes=30)),
+                (self.medspa.id, opening + timedelta(minutes=60)),
+            ]
+        )
+
+    def test_capacity_matches_single_day_availability(self):
+        """Test the batch capacity report agrees slot for slot with availability"""
+        other_medspa = Medspa.objects.create(
+            name="Other Medspa",
+            email_address="other@medspa.com"
+        )
+        start = (timezone.now() + timedelta(days=1)).date()
+        end = start + timedelta(days=2)
+        BusinessHours.objects.create(
+            medspa=other_medspa, weekday=start.weekday(),
+            opens_at=time(8, 15), closes_at=time(13)
+        )
+        for medspa, day, hour, minute, length in [
+            (self.medspa, start, 9, 40, 50),
+            (self.medspa, start, 13, 0, 95),
+            (self.medspa, end, 16, 5, 30),
+            (other_medspa, start, 11, 10, 20),
+        ]:
+            booked_start = timezone.make_aware(datetime.combine(day, time(hour, minute)))
+            Appointment.objects.create(
+                start_time=booked_start,
+                end_time=booked_start + timedelta(minutes=length),
+                medspa=medspa
+            )
+
+        params = {
+            'medspa_ids': f"{self.medspa.id},{other_medspa.id}",
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'duration': 45,
+            'granularity': 15,
+        }
+        response = self.client.get(reverse('medspa-capacity'), {**params, 'output': 'slots'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for medspa in (self.medspa, other_medspa):
+            single_day = self.client.get(
+                reverse('medspa-availability', kwargs={'pk': medspa.id}),
+                {'start_date': start.isoformat(), 'end_date': end.isoformat(),
+                 'duration': 45, 'granularity': 15}
+            )
+            self.assertEqual(response.data['slots'][medspa.id], single_day.data['days'])
+
+        response = self.client.get(reverse('medspa-capacity'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['medspa_ids'], [self.medspa.id, other_medspa.id])
+        self.assertEqual(response.data['total'][0], [30, 30, 30])
+        self.assertEqual(response.data['total'][1][1:], [0, 0])
+        self.assertEqual(response.data['utilization'][1][1:], [None, None])
+        self.assertEqual(response.data['free'][0][1], 30)
+
     def test_appointment_validation(self):
         """Test appointment validation"""
         # Test past date
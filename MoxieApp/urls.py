@@ -22,7 +22,11 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
+router.register(r'service-categories', views.ServiceCategoryViewSet)
+router.register(r'service-types', views.ServiceTypeViewSet)
 router.register(r'medspas', views.MedspaViewSet)
+router.register(r'business-hours', views.BusinessHoursViewSet)
+router.register(r'closures', views.ClosureViewSet)
 router.register(r'services', views.ServiceViewSet)
 router.register(r'appointments', views.AppointmentViewSet)
 
@@ -0,0 +1,546 @@
+# utils/availability.py
+import heapq
+import uuid
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .constants import (
+    APPOINTMENT_DURATION_LIMITS,
+    AVAILABILITY_DEFAULTS,
+    CACHE_KEYS,
+    NON_BLOCKING_STATUSES
+)
+from .custom_exceptions import ConcurrentBookingError
+from .schedule import get_schedule, get_schedules
+
+
+def parse_slot_parameters(params):
+    """
+    Read and validate the `duration` and `granularity` query parameters.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        duration = int(params.get('duration', AVAILABILITY_DEFAULTS['duration']))
+        granularity = int(params.get('granularity', AVAILABILITY_DEFAULTS['granularity']))
+    except (TypeError, ValueError):
+        raise ValueError("Duration and granularity must be integers (minutes)")
+
+    if not APPOINTMENT_DURATION_LIMITS['min'] <= duration <= APPOINTMENT_DURATION_LIMITS['max']:
+        raise ValueError(
+            f"Duration must be between {APPOINTMENT_DURATION_LIMITS['min']} "
+            f"and {APPOINTMENT_DURATION_LIMITS['max']} minutes"
+        )
+    if granularity <= 0:
+        raise ValueError("Granularity must be greater than zero")
+
+    return duration, granularity
+
+
+def get_list_parameter(params, name):
+    """
+    Return the values of a parameter given comma separated, repeated, or
+    as a JSON list.
+    """
+    if hasattr(params, 'getlist'):
+        values = params.getlist(name)
+    else:
+        values = params.get(name) or []
+        if not isinstance(values, list):
+            values = [values]
+    raw_values = []
+    for value in values:
+        raw_values.extend(part for part in str(value).split(',') if part.strip())
+    return raw_values
+
+
+def parse_service_ids(params):
+    """
+    Read the `service_ids` parameter (comma separated or repeated).
+    Returns an empty list when it is absent.
+    """
+    raw_ids = get_list_parameter(params, 'service_ids')
+    try:
+        return [int(service_id) for service_id in raw_ids]
+    except ValueError:
+        raise ValueError("service_ids must be a comma separated list of ids")
+
+
+def parse_search_parameters(params):
+    """
+    Read and validate the earliest-slot search parameters: `medspa_ids`,
+    `after` (ISO datetime, defaults to now), `horizon_days` and `limit`.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    raw_ids = get_list_parameter(params, 'medspa_ids')
+    try:
+        medspa_ids = sorted({int(medspa_id) for medspa_id in raw_ids})
+        horizon_days = int(params.get('horizon_days', AVAILABILITY_DEFAULTS['search_horizon_days']))
+        limit = int(params.get('limit', AVAILABILITY_DEFAULTS['search_limit']))
+    except ValueError:
+        raise ValueError("medspa_ids, horizon_days and limit must be integers")
+
+    if not medspa_ids:
+        raise ValueError("medspa_ids is required")
+    if len(medspa_ids) > AVAILABILITY_DEFAULTS['search_max_medspas']:
+        raise ValueError(
+            f"At most {AVAILABILITY_DEFAULTS['search_max_medspas']} medspas can be searched at once"
+        )
+    if not 1 <= horizon_days <= AVAILABILITY_DEFAULTS['max_range_days']:
+        raise ValueError(
+            f"horizon_days must be between 1 and {AVAILABILITY_DEFAULTS['max_range_days']}"
+        )
+    if not 1 <= limit <= AVAILABILITY_DEFAULTS['search_max_limit']:
+        raise ValueError(
+            f"limit must be between 1 and {AVAILABILITY_DEFAULTS['search_max_limit']}"
+        )
+
+    after = timezone.now()
+    if params.get('after'):
+        try:
+            after = parse_datetime(params['after'])
+        except ValueError:
+            after = None
+        if after is None:
+            raise ValueError("Invalid after value. Use an ISO 8601 datetime")
+        if timezone.is_naive(after):
+            after = timezone.make_aware(after)
+
+    return medspa_ids, after, horizon_days, limit
+
+
+def parse_medspa_ids(params, max_count, name='medspa_ids'):
+    """
+    Read a list of medspa ids (comma separated or repeated, `medspa_ids` by
+    default) as a sorted list of unique ids. Raises ValueError on bad input.
+    """
+    try:
+        medspa_ids = sorted({int(medspa_id) for medspa_id in get_list_parameter(params, name)})
+    except ValueError:
+        raise ValueError(f"{name} must be a comma separated list of ids")
+    if len(medspa_ids) > max_count:
+        raise ValueError(f"At most {max_count} medspas can be requested at once")
+    return medspa_ids
+
+
+def parse_start_time(value):
+    """
+    Parse a requested slot start (ISO 8601) into an aware datetime.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        start_time = parse_datetime(value or '')
+    except ValueError:
+        start_time = None
+    if start_time is None:
+        raise ValueError("Invalid start_time value. Use an ISO 8601 datetime")
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    return start_time
+
+
+def parse_date_range(params, max_days=None):
+    """
+    Read and validate the `start_date`/`end_date` query parameters, allowing
+    at most `max_days` days (max_range_days by default).
+    Raises ValueError with a client-facing message on bad input.
+    """
+    max_days = max_days or AVAILABILITY_DEFAULTS['max_range_days']
+    try:
+        start_date = datetime.strptime(params.get('start_date') or '', '%Y-%m-%d').date()
+        end_date = datetime.strptime(params.get('end_date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date")
+    if (end_date - start_date).days + 1 > max_days:
+        raise ValueError(f"Date range cannot exceed {max_days} days")
+
+    return start_date, end_date
+
+
+def get_business_window(medspa_id, date):
+    """
+    Return a medspa's (open, close) datetimes for a date in the current
+    timezone, or None when it is closed that day.
+    """
+    return get_schedule(medspa_id).window(date)
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching (start, end) intervals into a sorted list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def iter_free_slots(busy, window_start, window_end, duration, granularity):
+    """
+    Yield slot start times of `duration` minutes, stepping by `granularity`
+    minutes from `window_start`, that fit before `window_end` and do not
+    overlap any interval in `busy`.
+
+    `busy` must be sorted and merged (see `merge_intervals`), which lets the
+    sweep advance a single cursor: O(slots + intervals).
+    """
+    step = timedelta(minutes=granularity)
+    length = timedelta(minutes=duration)
+    slot = window_start
+
+    for busy_start, busy_end in busy:
+        if busy_end <= slot:
+            continue
+        if busy_start >= window_end:
+            break
+        while slot + length <= busy_start and slot + length <= window_end:
+            yield slot
+            slot += step
+        if slot < busy_end:
+            # Jump to the first step-aligned start at or after the interval end
+            steps = -(-(busy_end - slot) // step)
+            slot += steps * step
+
+    while slot + length <= window_end:
+        yield slot
+        slot += step
+
+
+def iter_dates(start_date, end_date):
+    """Yield each date from start_date to end_date inclusive."""
+    for offset in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=offset)
+
+
+def get_day_bounds(date):
+    """Return the local midnight-to-midnight (start, end) datetimes for a date."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def load_appointment_intervals_bulk(medspa_ids, start_date, end_date):
+    """
+    Load the (start, end) interval of every blocking appointment overlapping
+    the local days start_date..end_date for many medspas with a single
+    query, bucketed as {medspa_id: {date: [...]}}. Intervals are neither
+    clipped nor merged.
+    """
+    from ..models import Appointment
+
+    range_start = get_day_bounds(start_date)[0]
+    range_end = get_day_bounds(end_date)[1]
+
+    rows = Appointment.objects.filter(
+        medspa_id__in=medspa_ids,
+        start_time__lt=range_end,
+        end_time__gt=range_start
+    ).exclude(
+        status__in=NON_BLOCKING_STATUSES
+    ).values_list('medspa_id', 'start_time', 'end_time')
+
+    buckets = {
+        medspa_id: {date: [] for date in iter_dates(start_date, end_date)}
+        for medspa_id in medspa_ids
+    }
+    for medspa_id, start, end in rows:
+        first_day = max(timezone.localtime(start).date(), start_date)
+        last_day = min(timezone.localtime(end).date(), end_date)
+        for date in iter_dates(first_day, last_day):
+            buckets[medspa_id][date].append((start, end))
+
+    return buckets
+
+
+def load_appointment_intervals(medspa, start_date, end_date):
+    """Load one medspa's appointment intervals per day; see the bulk variant."""
+    return load_appointment_intervals_bulk([medspa.pk], start_date, end_date)[medspa.pk]
+
+
+def clip_to_window(intervals, window_start, window_end):
+    """Keep only the intervals overlapping the window, merged and sorted."""
+    return merge_intervals(
+        (start, end) for start, end in intervals
+        if start < window_end and end > window_start
+    )
+
+
+def clip_to_business_window(intervals, window):
+    """Like clip_to_window, for a business window that may be None (closed)."""
+    if window is None:
+        return []
+    return clip_to_window(intervals, *window)
+
+
+def load_busy_intervals_range(medspa, start_date, end_date):
+    """
+    Load a medspa's occupied intervals for every business day in the range
+    with a single query, bucketed per day as merged, sorted lists.
+    """
+    intervals_by_day = load_appointment_intervals(medspa, start_date, end_date)
+    schedule = get_schedule(medspa.pk)
+    return {
+        date: clip_to_business_window(intervals, schedule.window(date))
+        for date, intervals in intervals_by_day.items()
+    }
+
+
+def load_busy_intervals(medspa, date):
+    """Load a medspa's occupied intervals for one business day."""
+    return load_busy_intervals_range(medspa, date, date)[date]
+
+
+def load_busy_intervals_for_days(medspa, dates, granularity, windows):
+    """
+    Return {date: busy intervals within business hours} for the given open
+    days, whose business windows are given as {date: (open, close)}.
+
+    Days with a Redis occupancy map are answered from it without touching
+    the database, as long as slot boundaries line up with occupancy cells.
+    The remaining days are loaded with one query and their maps rebuilt,
+    unless a booking touched them while the query ran.
+    """
+    from . import occupancy
+
+    aligned = [
+        date for date in dates
+        if occupancy.is_cell_aligned(windows[date][0], granularity)
+    ]
+    busy_by_day = {
+        date: clip_to_window(intervals, *windows[date])
+        for date, intervals in occupancy.load_days(medspa.pk, aligned).items()
+    }
+
+    unbuilt = [date for date in dates if date not in busy_by_day]
+    if unbuilt:
+        generations = occupancy.get_generations(medspa.pk, unbuilt)
+        intervals_by_day = load_appointment_intervals(medspa, unbuilt[0], unbuilt[-1])
+        occupancy.store_days(medspa.pk, intervals_by_day, generations)
+        for date in unbuilt:
+            busy_by_day[date] = clip_to_window(intervals_by_day[date], *windows[date])
+
+    return busy_by_day
+
+
+def get_day_versions(medspa_id, dates):
+    """
+    Return {date: version token} of a medspa's booked days. A day's token is
+    replaced whenever an appointment touching it changes, which retires
+    every cached slot list of that day at once.
+    """
+    keys = {
+        date: CACHE_KEYS['availability_version'].format(medspa_id, date.isoformat())
+        for date in dates
+    }
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for date, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        versions[date] = version
+    return versions
+
+
+def invalidate_days(medspa_id, dates):
+    """Retire the cached availability of a medspa for the given days."""
+    cache.set_many({
+        CACHE_KEYS['availability_version'].format(medspa_id, date.isoformat()): uuid.uuid4().hex
+        for date in dates
+    }, None)
+
+
+def invalidate_appointment_change(before, after):
+    """
+    Retire the cached availability of every day an appointment change
+    touches. Changes that leave the booked footprint as it was, such as
+    confirming an appointment, keep the cache.
+    """
+    footprints = [
+        (snapshot.medspa_id, snapshot.start_time, snapshot.end_time)
+        if snapshot is not None and snapshot.status not in NON_BLOCKING_STATUSES
+        else None
+        for snapshot in (before, after)
+    ]
+    if footprints[0] == footprints[1]:
+        return
+
+    days = {}
+    for medspa_id, start_time, end_time in filter(None, footprints):
+        days.setdefault(medspa_id, set()).update(iter_dates(
+            timezone.localtime(start_time).date(),
+            timezone.localtime(end_time).date()
+        ))
+    for medspa_id, dates in days.items():
+        invalidate_days(medspa_id, dates)
+
+
+def get_available_slots_range(medspa, start_date, end_date, duration=None, granularity=None):
+    """
+    Get available slots for each day in the range as {date: [slot, ...]}.
+
+    Days already in the per-day cache are served from it; the remaining days
+    are computed together from one appointment query and cached. Slots
+    covered by a live hold are left out.
+    """
+    from . import holds
+
+    duration = duration or AVAILABILITY_DEFAULTS['duration']
+    granularity = granularity or AVAILABILITY_DEFAULTS['granularity']
+
+    # Schedule and day versions are part of the key so a cached day is
+    # dropped as soon as the medspa's hours or that day's bookings change
+    schedule = get_schedule(medspa.pk)
+    dates = list(iter_dates(start_date, end_date))
+    day_versions = get_day_versions(medspa.pk, dates)
+    keys = {
+        date: CACHE_KEYS['availability_day'].format(
+            medspa.pk, date.isoformat(), duration, granularity,
+            schedule.version, day_versions[date]
+        )
+        for date in dates
+    }
+    cached = cache.get_many(list(keys.values()))
+    slots_by_day = {
+        date: cached[key] for date, key in keys.items() if key in cached
+    }
+
+    missing = [date for date in keys if date not in slots_by_day]
+    if missing:
+        windows = {date: schedule.window(date) for date in missing}
+        open_days = [date for date in missing if windows[date] is not None]
+        busy_by_day = load_busy_intervals_for_days(medspa, open_days, granularity, windows)
+        fresh = {}
+        for date in missing:
+            slots_by_day[date] = []
+            if windows[date] is not None:
+                slots_by_day[date] = list(iter_free_slots(
+                    busy_by_day[date], *windows[date], duration, granularity
+                ))
+            fresh[keys[date]] = slots_by_day[date]
+        cache.set_many(fresh, AVAILABILITY_DEFAULTS['cache_timeout'])
+
+    # Holds are short-lived, so they are applied on every read rather than
+    # being baked into the cached days
+    held = holds.load_held_intervals([medspa.pk], list(keys)).get(medspa.pk, {})
+    return {
+        date: holds.exclude_held_slots(slots_by_day[date], held.get(date), duration)
+        for date in keys
+    }
+
+
+def check_slot_open(medspa, start_time, end_time):
+    """
+    Check that [start_time, end_time) is in the future, inside the day's
+    business hours and free of appointments. Raises ValueError for a slot
+    that can never be booked and ConcurrentBookingError for a taken one.
+    """
+    date = timezone.localtime(start_time).date()
+    window = get_business_window(medspa.pk, date)
+    if start_time < timezone.now():
+        raise ValueError("Slot cannot start in the past")
+    if window is None:
+        raise ValueError("The medspa is closed on that day")
+    if start_time < window[0] or end_time > window[1]:
+        raise ValueError("Slot must be within business hours")
+
+    busy = load_busy_intervals(medspa, date)
+    if any(start < end_time and end > start_time for start, end in busy):
+        raise ConcurrentBookingError("The requested time slot is no longer available")
+
+
+def get_available_slots(medspa, date, duration=None, granularity=None):
+    """Get available appointment slots for a medspa on a given date."""
+    return get_available_slots_range(
+        medspa, date, date, duration=duration, granularity=granularity
+    )[date]
+
+
+def format_slots(slots):
+    """Render slots as 'YYYY-MM-DD HH:MM' strings in the current time zone."""
+    return [timezone.localtime(slot).strftime('%Y-%m-%d %H:%M') for slot in slots]
+
+
+def format_slot_map(slots_by_day):
+    """Render {date: [slot, ...]} as a compact {'YYYY-MM-DD': ['HH:MM', ...]} map."""
+    return {
+        date.isoformat(): [
+            timezone.localtime(slot).strftime('%H:%M') for slot in slots
+        ]
+        for date, slots in slots_by_day.items()
+    }
+
+
+def iter_medspa_slots(medspa_id, schedule, intervals_by_day, after, duration, granularity):
+    """
+    Yield (slot, medspa_id) for one medspa in chronological order across the
+    loaded days, skipping closed days and slots that start before `after`.
+    """
+    for date in sorted(intervals_by_day):
+        window = schedule.window(date)
+        if window is None or window[1] <= after:
+            continue
+        window_start, window_end = window
+        busy = clip_to_window(intervals_by_day[date], window_start, window_end)
+        for slot in iter_free_slots(busy, window_start, window_end, duration, granularity):
+            if slot >= after:
+                yield slot, medspa_id
+
+
+def find_earliest_slots(medspa_ids, after, duration, granularity=None,
+                        horizon_days=None, limit=None):
+    """
+    Find the first `limit` open slots across many medspas starting at or
+    after `after`, searching up to `horizon_days` ahead.
+
+    The horizon is scanned in chunks; each chunk costs one query for all
+    medspas, and the per-medspa slot streams are combined with a k-way heap
+    merge so the search stops as soon as enough slots are found. Held slots
+    count as busy.
+    """
+    from . import holds
+
+    granularity = granularity or AVAILABILITY_DEFAULTS['granularity']
+    horizon_days = horizon_days or AVAILABILITY_DEFAULTS['search_horizon_days']
+    limit = limit or AVAILABILITY_DEFAULTS['search_limit']
+    chunk_days = AVAILABILITY_DEFAULTS['search_chunk_days']
+
+    first_day = timezone.localtime(after).date()
+    last_day = first_day + timedelta(days=horizon_days - 1)
+    schedules = get_schedules(medspa_ids) if medspa_ids else {}
+    results = []
+
+    chunk_start = first_day
+    while chunk_start <= last_day and medspa_ids:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), last_day)
+        intervals = load_appointment_intervals_bulk(medspa_ids, chunk_start, chunk_end)
+        held = holds.load_held_intervals(
+            medspa_ids, list(iter_dates(chunk_start, chunk_end))
+        )
+        for medspa_id, held_by_day in held.items():
+            for date, held_intervals in held_by_day.items():
+                intervals[medspa_id][date].extend(
+                    (start, end) for start, end, _ in held_intervals
+                )
+        streams = [
+            iter_medspa_slots(
+                medspa_id, schedules[medspa_id], intervals[medspa_id],
+                after, duration, granularity
+            )
+            for medspa_id in medspa_ids
+        ]
+        for slot, medspa_id in heapq.merge(*streams):
+            results.append((slot, medspa_id))
+            if len(results) >= limit:
+                return results
+        chunk_start = chunk_end + timedelta(days=1)
+
+    return results
@@ -0,0 +1,190 @@
+# utils/capacity.py
+"""
+Vectorized availability for many medspas over long date ranges.
+
+Capacity reports need the free slots of hundreds of medspas over months,
+which is far too slow through the per-day sweep. Here the blocking
+appointments of every medspa are loaded with one query into NumPy arrays
+and every candidate slot of every open day is laid out in one array. The
+number of appointments overlapping a slot is a difference of two
+cumulative event counts:
+
+    overlapping(slot) = #(starts < slot_end) - #(ends <= slot_start)
+
+which `searchsorted` answers for all slots at once. Each medspa's times
+are shifted into its own disjoint block so a single sorted array serves
+every medspa. The result matches the single-day availability endpoint
+slot for slot, live holds included.
+"""
+from datetime import datetime
+import numpy as np
+from django.db.models import F
+from django.db.models.functions import Extract
+from django.utils import timezone
+
+from .availability import get_day_bounds, iter_dates
+from .constants import AVAILABILITY_DEFAULTS, NON_BLOCKING_STATUSES
+from .schedule import get_schedules
+
+
+class CapacityGrid:
+    """
+    Candidate slots of every (medspa, day) window with a free flag each.
+    Windows are ordered medspa-major, days in date order; closed days have
+    a window without slots.
+    """
+
+    def __init__(self, medspa_ids, dates, slot_starts, window_ids, window_sizes, free):
+        self.medspa_ids = medspa_ids
+        self.dates = dates
+        self.slot_starts = slot_starts
+        self.window_ids = window_ids
+        self.window_sizes = window_sizes
+        self.free = free
+
+    def matrix(self, counts):
+        return counts.reshape(len(self.medspa_ids), len(self.dates))
+
+    def total_matrix(self):
+        """Bookable slots per medspa (rows) and day (columns)."""
+        return self.matrix(self.window_sizes)
+
+    def free_matrix(self):
+        """Free slots per medspa (rows) and day (columns)."""
+        return self.matrix(np.bincount(
+            self.window_ids[self.free], minlength=self.window_sizes.size
+        ))
+
+    def utilization_matrix(self):
+        """Percentage of bookable slots already taken, NaN on closed days."""
+        total = self.total_matrix().astype(float)
+        taken = total - self.free_matrix()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, np.round(100 * taken / total, 1), np.nan)
+
+    def utilization_report(self):
+        """The count and utilization matrices as JSON-ready nested lists."""
+        return {
+            'free': self.free_matrix().tolist(),
+            'total': self.total_matrix().tolist(),
+            'utilization': [
+                [None if np.isnan(value) else value for value in row]
+                for row in self.utilization_matrix().tolist()
+            ],
+        }
+
+    def free_slots(self):
+        """Return {medspa_id: {date: [slot, ...]}} of free slot start times."""
+        result = {
+            medspa_id: {date: [] for date in self.dates}
+            for medspa_id in self.medspa_ids
+        }
+        day_count = len(self.dates)
+        for window_id, start in zip(self.window_ids[self.free], self.slot_starts[self.free]):
+            medspa_index, day_index = divmod(int(window_id), day_count)
+            result[self.medspa_ids[medspa_index]][self.dates[day_index]].append(
+                datetime.fromtimestamp(int(start), timezone.utc)
+            )
+        return result
+
+
+def load_interval_arrays(medspa_ids, range_start, range_end):
+    """
+    Load blocking appointments overlapping the range as (medspa index,
+    start, end) arrays of epoch seconds with a single query.
+    """
+    from ..models import Appointment
+
+    rows = Appointment.objects.filter(
+        medspa_id__in=medspa_ids,
+        start_time__lt=range_end,
+        end_time__gt=range_start
+    ).exclude(
+        status__in=NON_BLOCKING_STATUSES
+    ).annotate(
+        start_epoch=Extract(F('start_time'), 'epoch'),
+        end_epoch=Extract(F('end_time'), 'epoch')
+    ).values_list('medspa_id', 'start_epoch', 'end_epoch')
+
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, 3)
+    index = {medspa_id: position for position, medspa_id in enumerate(medspa_ids)}
+    medspa_index = np.array([index[int(medspa_id)] for medspa_id in data[:, 0]], dtype=np.int64)
+    return medspa_index, data[:, 1], data[:, 2]
+
+
+def load_held_arrays(medspa_ids, dates):
+    """Live holds as (medspa index, start, end) arrays of epoch seconds."""
+    from .holds import load_held_intervals
+
+    held = load_held_intervals(medspa_ids, dates)
+    rows = [
+        (position, start.timestamp(), end.timestamp())
+        for position, medspa_id in enumerate(medspa_ids)
+        for intervals in held.get(medspa_id, {}).values()
+        for start, end, _ in intervals
+    ]
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2]
+
+
+def compute_capacity(medspa_ids, start_date, end_date, duration=None, granularity=None):
+    """
+    Compute the free/taken state of every candidate slot for many medspas
+    and days at once. Returns a CapacityGrid.
+    """
+    duration = duration or AVAILABILITY_DEFAULTS['duration']
+    granularity = granularity or AVAILABILITY_DEFAULTS['granularity']
+    medspa_ids = list(medspa_ids)
+    dates = list(iter_dates(start_date, end_date))
+
+    range_start = get_day_bounds(start_date)[0]
+    range_end = get_day_bounds(end_date)[1]
+    base = int(range_start.timestamp())
+    # Width of each medspa's block of the shared time axis
+    span = int(range_end.timestamp()) - base + 1
+
+    # Business windows, medspa-major, as offsets into the range
+    schedules = get_schedules(medspa_ids) if medspa_ids else {}
+    opens = np.zeros(len(medspa_ids) * len(dates), dtype=np.int64)
+    closes = np.zeros_like(opens)
+    position = 0
+    for medspa_id in medspa_ids:
+        schedule = schedules[medspa_id]
+        for date in dates:
+            window = schedule.window(date)
+            if window is not None:
+                opens[position] = int(window[0].timestamp()) - base
+                closes[position] = int(window[1].timestamp()) - base
+            position += 1
+
+    # Every candidate slot start laid out in one array
+    length = duration * 60
+    step = granularity * 60
+    window_sizes = np.maximum((closes - opens - length) // step + 1, 0)
+    window_ids = np.repeat(np.arange(opens.size), window_sizes)
+    first_slot = np.cumsum(window_sizes) - window_sizes
+    slot_offsets = opens[window_ids] + (np.arange(window_ids.size) - first_slot[window_ids]) * step
+    slot_keys = (window_ids // max(len(dates), 1)) * span + slot_offsets
+
+    # Appointment and hold start/end events, sorted on the shared axis
+    booked = load_interval_arrays(medspa_ids, range_start, range_end)
+    held = load_held_arrays(medspa_ids, dates)
+    medspa_index = np.concatenate([booked[0], held[0]])
+    starts = np.clip(np.concatenate([booked[1], held[1]]) - base, 0, span - 1)
+    ends = np.clip(np.concatenate([booked[2], held[2]]) - base, 0, span - 1)
+    start_events = np.sort(medspa_index * span + starts)
+    end_events = np.sort(medspa_index * span + ends)
+
+    overlapping = (
+        np.searchsorted(start_events, slot_keys + length, side='left')
+        - np.searchsorted(end_events, slot_keys, side='right')
+    )
+
+    return CapacityGrid(
+        medspa_ids=medspa_ids,
+        dates=dates,
+        slot_starts=slot_offsets + base,
+        window_ids=window_ids,
+        window_sizes=window_sizes,
+        free=overlapping == 0
+    )
@@ -38,6 +38,7 @@ SERVICE_CATEGORIES = {
 }
 
 # Time Constants
+# Opening hours of medspas that have not configured their own
 BUSINESS_HOURS = {
     'start': 9,  # 9 AM
     'end': 17,   # 5 PM
@@ -48,11 +49,87 @@ APPOINTMENT_DURATION_LIMITS = {
     'max': 480,   # 8 hours
 }
 
+# Availability
+AVAILABILITY_DEFAULTS = {
+    'duration': 60,     # requested slot length in minutes
+    'granularity': 30,  # minutes between candidate slot starts
+    'max_range_days': 62,
+    'cache_timeout': 60 * 60,  # days are also invalidated on every booking change
+    'search_horizon_days': 14,
+    'search_chunk_days': 7,  # days loaded per query by earliest-slot search
+    'search_limit': 5,
+    'search_max_limit': 50,
+    'search_max_medspas': 100,
+    'capacity_max_days': 92,
+    'capacity_max_medspas': 500,
+}
+
+OCCUPANCY_SETTINGS = {
+    'cell_minutes': 5,
+    'ttl': 60 * 60 * 24 * 7,  # rebuilt from the database after a week
+}
+
+HOLD_SETTINGS = {
+    'ttl': 5 * 60,  # seconds a slot stays held for the client that picked it
+}
+
+EVENT_SETTINGS = {
+    'channel_prefix': 'events:medspa:',
+    'heartbeat': 15,        # seconds between keep-alive comments on idle streams
+    'queue_size': 100,      # events buffered per client before forcing a resync
+    'reconnect_delay': 1,   # seconds before the Redis listener reconnects
+}
+
+ANALYTICS_DEFAULTS = {
+    'timeseries_days': 30,        # range when no start_date/end_date is given
+    'timeseries_max_days': 731,
+    'timeseries_intervals': ['day', 'week', 'month'],
+    'statistics_timeout': 6 * 60 * 60,
+    'statistics_max_medspas': 500,
+    'usage_max_days': 3650,       # longest trailing `days` of service usage
+}
+
+STATISTICS_REFRESH = {
+    'interval': 60,       # minimum seconds between refreshes of one medspa
+    'batch_size': 50,     # medspas refreshed per worker iteration
+    'poll_interval': 1,   # seconds the worker sleeps when nothing is due
+}
+
+LEADERBOARD_SETTINGS = {
+    'prefix': 'leaderboard',
+    'retention_days': 400,   # day buckets expire this long after their day
+    'top_k': 5,
+}
+
+RESPONSE_CACHE_SETTINGS = {
+    'local_max_bytes': 32 * 1024 * 1024,   # in-process tier, per worker
+    'local_tag_ttl': 2,        # seconds the in-process tier trusts its tag versions
+    'lock_ttl': 30,            # seconds a recompute may hold the refresh lock
+    'lock_wait': 10,           # seconds a request waits for another's recompute
+    'poll_interval': 0.05,     # seconds between checks while waiting
+}
+
+EXPORT_SETTINGS = {
+    'chunk_size': 2000,   # rows fetched per round trip of the server-side cursor
+    'max_days': 366,
+    'outputs': ['csv', 'ndjson'],
+}
+
+# Appointments in these statuses do not occupy the calendar
+NON_BLOCKING_STATUSES = ['canceled', 'no_show']
+
 # Cache Keys
 CACHE_KEYS = {
     'medspa_services': 'medspa_{}_services',
     'appointment_details': 'appointment_{}',
     'service_categories': 'service_categories',
+    'availability_day': 'availability_{}_{}_{}_{}_{}_{}',
+    'availability_version': 'availability_version_{}_{}',
+    'schedule_version': 'schedule_version_{}',
+    'medspa_statistics': 'medspa_statistics_{}_{}_{}',
+    'response': 'response:{}:{}',
+    'cache_tag': 'cache_tag:{}',
+    'response_lock': 'response_lock:{}',
 }
 
 # Error Messages
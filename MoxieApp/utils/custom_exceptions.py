@@ -1,14 +1,18 @@
 # utils/custom_exceptions.py
 
-class ServiceValidationError(Exception):
+class ValidationError(Exception):
+    """Base class for validation errors raised by the API layer."""
+    pass
+
+class ServiceValidationError(ValidationError):
     """Exception raised for validation errors in Service operations."""
     pass
 
-class AppointmentValidationError(Exception):
+class AppointmentValidationError(ValidationError):
     """Exception raised for validation errors in Appointment operations."""
     pass
 
-class MedspaValidationError(Exception):
+class MedspaValidationError(ValidationError):
     """Exception raised for validation errors in Medspa operations."""
     pass
 
@@ -6,7 +6,8 @@ from django.core.cache import cache
 from django.db import transaction
 from rest_framework.response import Response
 from rest_framework import status
-from .custom_exceptions import ValidationError
+from .custom_exceptions import ConcurrentBookingError, ValidationError
+from .response_cache import build_cache_key, render_response, serve_cached
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,12 @@ def handle_exceptions(func):
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except ConcurrentBookingError as e:
+            logger.info(f"Booking conflict in {func.__name__}: {str(e)}")
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             logger.error(f"Error in {func.__name__}: {str(e)}", exc_info=True)
             return Response(
@@ -56,28 +63,37 @@ def measure_execution_time(func):
     return wrapper
 
 
-def cache_response(timeout=300):
-    """Decorator for caching view responses."""
+def cache_response(timeout=300, per_user=False, tags=None, local=False, stale_ttl=0):
+    """
+    Decorator for caching successful view responses as rendered bytes.
+    Entries are keyed by view, route kwargs, query parameters and the
+    caller's permissions, or the caller when per_user is set. `tags` maps
+    (view, request) to the cache tags the response depends on; `local`
+    also keeps entries in the in-process tier and reads the tag versions
+    from the process's short-lived copy. Expired entries are served
+    for `stale_ttl` more seconds while one request recomputes them, and
+    concurrent misses wait for a single recompute.
+    """
 
     def decorator(func):
         @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            # Generate cache key
-            cache_key = f"{func.__name__}:{args}:{kwargs}"
-
-            # Try to get from cache
-            cached_response = cache.get(cache_key)
-            if cached_response is not None:
-                return cached_response
-
-            # Get fresh response
-            response = func(*args, **kwargs)
+        def wrapper(view_instance, request, *args, **kwargs):
+            cache_key = build_cache_key(
+                view_instance, request, func.__name__, per_user=per_user,
+                tags=tags(view_instance, request) if tags else (), local=local
+            )
 
-            # Cache the response
-            if response.status_code == 200:
-                cache.set(cache_key, response, timeout)
+            def compute():
+                response = func(view_instance, request, *args, **kwargs)
+                entry = None
+                if isinstance(response, Response) and response.status_code == 200:
+                    entry = render_response(view_instance, request, response)
+                    response['X-Cache'] = 'MISS'
+                return response, entry
 
-            return response
+            return serve_cached(
+                cache_key, compute, timeout, stale_ttl=stale_ttl, local=local
+            )
 
         return wrapper
 
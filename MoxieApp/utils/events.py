@@ -0,0 +1,189 @@
+# utils/events.py
+"""
+Pub/sub of live availability events per medspa.
+
+Appointment writes publish a small delta (the time range a booking took
+and the range it released) on the medspa's channel once they commit.
+With a Redis cache the event goes through Redis pub/sub so every process
+sees it; one listener thread per process relays it to the local
+subscribers. Without Redis, events are delivered in-process only.
+
+Subscribers are asyncio queues owned by the ASGI event stream (see
+MoxieApp/streams.py).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .availability import iter_dates
+from .constants import EVENT_SETTINGS, NON_BLOCKING_STATUSES
+from .occupancy import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Put in place of dropped events when a subscriber falls behind, telling
+# the client to refetch instead of applying deltas
+RESYNC_EVENT = json.dumps({'type': 'resync'})
+
+
+def medspa_channel(medspa_id):
+    return f"{EVENT_SETTINGS['channel_prefix']}{medspa_id}"
+
+
+class LocalBroker:
+    """Fan events out to the asyncio queues subscribed in this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, loop, queue):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add((loop, queue))
+
+    def unsubscribe(self, channel, loop, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard((loop, queue))
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def deliver(self, channel, message):
+        """Hand a message to every subscriber of the channel; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(offer, queue, message)
+            except RuntimeError:
+                # The subscriber's event loop has already been closed
+                self.unsubscribe(channel, loop, queue)
+
+
+def offer(queue, message):
+    """Queue a message, replacing the backlog with a resync if the queue is full."""
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_EVENT)
+
+
+broker = LocalBroker()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def listen_to_redis(conn):
+    """Relay every medspa event published in Redis to the local broker."""
+    pattern = f"{EVENT_SETTINGS['channel_prefix']}*"
+    while True:
+        try:
+            pubsub = conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(pattern)
+            for message in pubsub.listen():
+                if message['type'] == 'pmessage':
+                    broker.deliver(message['channel'].decode(), message['data'].decode())
+        except RedisError as e:
+            logger.warning(f"Event listener lost Redis, reconnecting: {str(e)}")
+            time.sleep(EVENT_SETTINGS['reconnect_delay'])
+
+
+def ensure_listener():
+    """Start this process's Redis listener thread once, if Redis is configured."""
+    global _listener
+    conn = get_connection()
+    if conn is None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=listen_to_redis, args=(conn,),
+                name='medspa-event-listener', daemon=True
+            )
+            _listener.start()
+
+
+def subscribe(medspa_id, loop, queue):
+    ensure_listener()
+    broker.subscribe(medspa_channel(medspa_id), loop, queue)
+
+
+def unsubscribe(medspa_id, loop, queue):
+    broker.unsubscribe(medspa_channel(medspa_id), loop, queue)
+
+
+def publish(medspa_id, event):
+    """Publish an event to every subscriber of a medspa, in any process."""
+    channel = medspa_channel(medspa_id)
+    message = json.dumps(event, cls=DjangoJSONEncoder)
+    conn = get_connection()
+    if conn is None:
+        broker.deliver(channel, message)
+        return
+    try:
+        conn.publish(channel, message)
+    except RedisError as e:
+        logger.warning(f"Could not publish event for medspa {medspa_id}: {str(e)}")
+
+
+def footprint(snapshot):
+    """The time range a snapshot occupies in the calendar, or None."""
+    if snapshot is None or snapshot.status in NON_BLOCKING_STATUSES:
+        return None
+    return snapshot.medspa_id, snapshot.start_time, snapshot.end_time
+
+
+def build_events(before, after):
+    """
+    Describe an appointment change as {medspa_id: event}. Each event names
+    the affected local dates, the appointment's new state, and the ranges
+    it took and released in that medspa's calendar.
+    """
+    current = after or before
+    appointment = {
+        'id': current.id,
+        'status': after.status if after else 'deleted',
+        'start_time': current.start_time,
+        'end_time': current.end_time,
+    }
+
+    events = {}
+    for snapshot in (before, after):
+        if snapshot is None:
+            continue
+        event = events.setdefault(snapshot.medspa_id, {
+            'type': 'appointment',
+            'medspa': snapshot.medspa_id,
+            'dates': set(),
+            'appointment': appointment,
+            'taken': [],
+            'released': [],
+        })
+        event['dates'].update(iter_dates(
+            timezone.localtime(snapshot.start_time).date(),
+            timezone.localtime(snapshot.end_time).date()
+        ))
+
+    previous, current_footprint = footprint(before), footprint(after)
+    if previous != current_footprint:
+        if previous:
+            events[previous[0]]['released'].append(previous[1:])
+        if current_footprint:
+            events[current_footprint[0]]['taken'].append(current_footprint[1:])
+
+    for event in events.values():
+        event['dates'] = sorted(event['dates'])
+    return events
+
+
+def publish_appointment_change(before, after):
+    """Push an appointment change to the medspas whose calendars it touched."""
+    for medspa_id, event in build_events(before, after).items():
+        publish(medspa_id, event)
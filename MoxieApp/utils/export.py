@@ -0,0 +1,70 @@
+# utils/export.py
+"""
+Streaming bulk export of appointments.
+
+Rows are read as flat `values()` dicts through a server-side cursor
+(`iterator(chunk_size=...)`) and encoded one at a time into the body of a
+StreamingHttpResponse, so memory stays constant however many appointments
+are exported and the header goes out before the query has finished.
+"""
+import csv
+import json
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .constants import EXPORT_SETTINGS
+
+EXPORT_FIELDS = (
+    'id', 'medspa_id', 'medspa__name', 'start_time', 'end_time', 'status',
+    'total_price', 'total_duration', 'created_at', 'updated_at'
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset):
+    """Yield the export rows of a queryset in id order, chunk by chunk."""
+    return queryset.prefetch_related(None).order_by('id').values(
+        *EXPORT_FIELDS
+    ).iterator(chunk_size=EXPORT_SETTINGS['chunk_size'])
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in (row[field] for field in EXPORT_FIELDS)
+        ])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(queryset, output='csv', filename='appointments'):
+    """
+    Return a StreamingHttpResponse with the appointments of a queryset as
+    CSV or newline-delimited JSON.
+    """
+    if output not in EXPORT_SETTINGS['outputs']:
+        raise ValueError(f"output must be one of {', '.join(EXPORT_SETTINGS['outputs'])}")
+    encode = iter_csv if output == 'csv' else iter_ndjson
+    response = StreamingHttpResponse(
+        encode(iter_rows(queryset)), content_type=CONTENT_TYPES[output]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
@@ -1,66 +1,591 @@
 # utils/helpers.py
-from datetime import datetime, timedelta
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
 from django.utils import timezone
-from django.db.models import Sum, Count, Avg
+from django.db.models import Sum, Count, Avg, Q
+from django.db.models.functions import Trunc
 from decimal import Decimal
+from .constants import ANALYTICS_DEFAULTS, CACHE_KEYS
+from .custom_exceptions import ConcurrentBookingError, ServiceValidationError
+from .response_cache import get_tag_versions, medspa_tag
 import logging
 
 logger = logging.getLogger(__name__)
 
+SERVICE_CATALOG_TIMEOUT = 60 * 60
+
+# SQLSTATE raised by PostgreSQL when an exclusion constraint is violated
+EXCLUSION_VIOLATION = '23P01'
+
 def calculate_appointment_metrics(appointment):
-    """Calculate total duration and price for an appointment."""
-    services = appointment.services.all()
-    
-    total_duration = services.aggregate(
-        total_duration=Sum('duration')
-    )['total_duration'] or 0
-    
-    total_price = services.aggregate(
-        total_price=Sum('price')
-    )['total_price'] or Decimal('0')
-    
+    """Total duration and price of an appointment, as kept on its row."""
     return {
-        'total_duration': total_duration,
-        'total_price': total_price
+        'total_duration': appointment.total_duration,
+        'total_price': appointment.total_price
     }
 
-def get_available_slots(medspa, date, duration=60):
+AppointmentSnapshot = namedtuple(
+    'AppointmentSnapshot',
+    ['id', 'medspa_id', 'start_time', 'end_time', 'status', 'service_ids'],
+    defaults=[()]
+)
+
+def snapshot_appointment(appointment):
+    """Capture the scheduling-relevant state and services of a saved appointment."""
+    return AppointmentSnapshot(
+        id=appointment.pk,
+        medspa_id=appointment.medspa_id,
+        start_time=appointment.start_time,
+        end_time=appointment.end_time,
+        status=appointment.status,
+        service_ids=tuple(sorted(
+            appointment.appointmentservice_set.values_list('service_id', flat=True)
+        ))
+    )
+
+@contextmanager
+def booking_conflict_guard():
+    """
+    Run an appointment write in a savepoint and translate a violation of the
+    appointment_no_overlap constraint into ConcurrentBookingError.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as e:
+        if getattr(e.__cause__, 'pgcode', None) == EXCLUSION_VIOLATION:
+            raise ConcurrentBookingError(
+                "The requested time slot is no longer available"
+            ) from e
+        raise
+
+def get_service_catalog(medspa_id):
+    """
+    Return {service_id: {...}} describing every service of a medspa.
+    Cached until a service of the medspa is written.
+    """
+    from ..models import Service
+
+    cache_key = CACHE_KEYS['medspa_services'].format(medspa_id)
+    catalog = cache.get(cache_key)
+    if catalog is None:
+        catalog = {
+            row['id']: row
+            for row in Service.objects.filter(medspa_id=medspa_id).values(
+                'id', 'name', 'duration', 'price', 'active'
+            )
+        }
+        cache.set(cache_key, catalog, SERVICE_CATALOG_TIMEOUT)
+    return catalog
+
+def invalidate_service_catalog(*medspa_ids):
+    """Drop the cached service catalog of the given medspas."""
+    cache.delete_many([
+        CACHE_KEYS['medspa_services'].format(medspa_id)
+        for medspa_id in medspa_ids if medspa_id is not None
+    ])
+
+def get_bundle_duration(medspa_id, service_ids):
+    """Total duration in minutes of a bundle of services booked together."""
+    catalog = get_service_catalog(medspa_id)
+    total_duration = 0
+    for service_id in service_ids:
+        service = catalog.get(service_id)
+        if service is None:
+            raise ServiceValidationError(
+                f"Service with id {service_id} does not exist for this medspa"
+            )
+        if not service['active']:
+            raise ServiceValidationError(
+                f"Service {service['name']} is not currently active"
+            )
+        total_duration += service['duration']
+    return total_duration
+
+def get_booking_window(data):
+    """
+    Read (medspa_id, start_time, end_time) from raw appointment request data
+    using the cached service catalog. Returns None when the data is
+    incomplete; the serializer reports the details.
+    """
+    from .availability import parse_start_time
+
+    try:
+        medspa_id = int(data.get('medspa'))
+        start_time = parse_start_time(data.get('start_time'))
+        service_ids = [
+            int(service['service'] if isinstance(service, dict) else service)
+            for service in data.get('services') or []
+        ]
+        duration = get_bundle_duration(medspa_id, service_ids)
+    except (TypeError, ValueError, KeyError, ServiceValidationError):
+        return None
+    if not service_ids:
+        return None
+    return medspa_id, start_time, start_time + timedelta(minutes=duration)
+
+def get_available_slots(medspa, date, duration=60, granularity=30):
     """Get available appointment slots for a given date."""
-    from .constants import BUSINESS_HOURS
-    
-    # Convert date to datetime objects for start and end of business day
-    start_time = datetime.combine(date, datetime.min.time().replace(
-        hour=BUSINESS_HOURS['start']
-    ))
-    end_time = datetime.combine(date, datetime.min.time().replace(
-        hour=BUSINESS_HOURS['end']
-    ))
-    
-    # Get all appointments for the day
-    existing_appointments = medspa.appointments.filter(
-        start_time__date=date
-    ).values_list('start_time', 'services__duration')
-    
-    # Create list of all possible slots
-    all_slots = []
-    current_slot = start_time
-    while current_slot + timedelta(minutes=duration) <= end_time:
-        slot_end = current_slot + timedelta(minutes=duration)
-        
-        # Check if slot conflicts with existing appointments
-        is_available = True
-        for appt_start, appt_duration in existing_appointments:
-            appt_end = appt_start + timedelta(minutes=appt_duration or 0)
-            if (current_slot < appt_end and slot_end > appt_start):
-                is_available = False
-                break
-        
-        if is_available:
-            all_slots.append(current_slot)
-        
-        current_slot += timedelta(minutes=30)  # 30-minute intervals
-    
-    return all_slots
+    from .availability import get_available_slots as compute_available_slots
+
+    return compute_available_slots(
+        medspa, date, duration=duration, granularity=granularity
+    )
+
+@contextmanager
+def consistent_snapshot(using='default'):
+    """
+    Run the reads of the block against a single database snapshot
+    (REPEATABLE READ on PostgreSQL). Inside an existing transaction the
+    isolation level can no longer change, so the block just joins it.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block or connection.vendor != 'postgresql':
+        yield
+        return
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield
+
+# Per-status appointment counts reported by analytics
+STATUS_COUNTS = {
+    'total': Count('id'),
+    'completed': Count('id', filter=Q(status='completed')),
+    'canceled': Count('id', filter=Q(status='canceled')),
+    'scheduled': Count('id', filter=Q(status='scheduled')),
+}
+
+COMPLETED_REVENUE = Sum('total_price', filter=Q(status='completed'))
+
+def get_appointment_analytics(appointments):
+    """
+    Build the appointment analytics sections for a queryset of appointments
+    with two queries read from one snapshot: per-status counts over the
+    appointments, and per-service usage and completed revenue over their
+    services, from which every service and category figure is derived.
+    """
+    from ..models import AppointmentService
+
+    completed = Q(appointment__status='completed')
+    with consistent_snapshot():
+        counts = appointments.order_by().aggregate(
+            revenue=COMPLETED_REVENUE, **STATUS_COUNTS
+        )
+        usage = list(AppointmentService.objects.filter(
+            appointment__in=appointments.order_by().values('pk')
+        ).values(
+            'service__name', 'service__category__name'
+        ).annotate(
+            count=Count('id'),
+            completed_count=Count('id', filter=completed),
+            revenue=Sum('service__price', filter=completed)
+        ).order_by())
+
+    return build_appointment_analytics(counts, usage)
+
+def build_appointment_analytics(counts, usage):
+    """
+    Shape per-status counts plus completed `revenue` and per-service usage
+    rows ('service__name', 'service__category__name', 'count',
+    'completed_count', 'revenue') into the analytics sections.
+    """
+    counts = dict(counts)
+    revenue = counts.pop('revenue') or Decimal('0.00')
+    popularity = {}
+    categories = {}
+    for row in usage:
+        if not row['count']:
+            continue
+        popularity[row['service__name']] = popularity.get(row['service__name'], 0) + row['count']
+        if row['completed_count']:
+            category = categories.setdefault(row['service__category__name'], {
+                'services__category__name': row['service__category__name'],
+                'count': 0,
+                'revenue': Decimal('0.00'),
+            })
+            category['count'] += row['completed_count']
+            category['revenue'] += row['revenue']
+
+    return {
+        'appointments': counts,
+        'revenue': revenue,
+        'services': {
+            'average_per_appointment': (
+                sum(popularity.values()) / counts['total'] if counts['total'] else 0
+            ),
+            'most_popular': [
+                {'services__name': name, 'count': count}
+                for name, count in sorted(
+                    popularity.items(), key=lambda item: (-item[1], item[0])
+                )[:5]
+            ]
+        },
+        'categories': {
+            'distribution': sorted(
+                categories.values(),
+                key=lambda category: (-category['count'], category['services__category__name'])
+            )
+        }
+    }
+
+def floor_hour(value):
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def split_rollup_range(start, end, now=None):
+    """
+    Split [start, end) into the closed hours that the hourly rollups answer
+    and the ranges left to raw rows: the partial hours at either edge and
+    the open tail from the current hour on. Either bound may be None for an
+    unbounded range. Returns (closed, raw_ranges) where `closed` is a
+    (start, end) pair of hour boundaries or None.
+    """
+    current_hour = floor_hour(now or timezone.now())
+    closed_start = None
+    if start is not None:
+        closed_start = floor_hour(start)
+        if closed_start < start:
+            closed_start += timedelta(hours=1)
+    closed_end = current_hour if end is None else min(floor_hour(end), current_hour)
+
+    if closed_start is not None and closed_start >= closed_end:
+        return None, [(start, end)]
+    raw_ranges = []
+    if start is not None and start < closed_start:
+        raw_ranges.append((start, closed_start))
+    if end is None or closed_end < end:
+        raw_ranges.append((closed_end, end))
+    return (closed_start, closed_end), raw_ranges
+
+def range_filter(field, ranges):
+    """Q matching `field` inside any of the (start, end) ranges; None bounds are open."""
+    condition = Q(pk__in=[])
+    for start, end in ranges:
+        if start is None and end is None:
+            return Q()
+        bounds = Q()
+        if start is not None:
+            bounds &= Q(**{f'{field}__gte': start})
+        if end is not None:
+            bounds &= Q(**{f'{field}__lt': end})
+        condition |= bounds
+    return condition
+
+def appointment_filters(medspa_id=None, status=None):
+    filters = {}
+    if medspa_id:
+        filters['medspa_id'] = medspa_id
+    if status:
+        filters['status'] = status
+    return filters
+
+def get_appointment_counts(start, end, medspa_id=None, status=None):
+    """
+    Per-status counts and completed revenue of the appointments starting in
+    [start, end), read from the hourly rollups for closed hours and from
+    raw rows for the edges and the open tail.
+    """
+    from ..models import Appointment, AppointmentHourly
+
+    filters = appointment_filters(medspa_id, status)
+    closed, raw_ranges = split_rollup_range(start, end)
+    counts = {name: 0 for name in STATUS_COUNTS}
+    counts['revenue'] = Decimal('0.00')
+    partials = []
+    with consistent_snapshot():
+        if closed is not None:
+            partials.append(AppointmentHourly.objects.filter(
+                range_filter('hour', [closed]), **filters
+            ).aggregate(
+                total=Sum('appointments'),
+                completed=Sum('appointments', filter=Q(status='completed')),
+                canceled=Sum('appointments', filter=Q(status='canceled')),
+                scheduled=Sum('appointments', filter=Q(status='scheduled')),
+                revenue=Sum('revenue', filter=Q(status='completed'))
+            ))
+        if raw_ranges:
+            partials.append(Appointment.objects.filter(
+                range_filter('start_time', raw_ranges), **filters
+            ).order_by().aggregate(revenue=COMPLETED_REVENUE, **STATUS_COUNTS))
+    for partial in partials:
+        for name, value in partial.items():
+            counts[name] += value or 0
+    return counts
+
+def get_service_usage(start, end, medspa_id=None, status=None, service_id=None):
+    """
+    Per-service usage rows ('service__name', 'service__category__name',
+    'count', 'completed_count', 'revenue') of the appointments starting in
+    [start, end), read like get_appointment_counts.
+    """
+    from ..models import AppointmentService, ServiceHourly
+
+    filters = appointment_filters(medspa_id, status)
+    raw_filters = {f'appointment__{name}': value for name, value in filters.items()}
+    if service_id:
+        filters['service_id'] = raw_filters['service_id'] = service_id
+
+    closed, raw_ranges = split_rollup_range(start, end)
+    rows = []
+    with consistent_snapshot():
+        if closed is not None:
+            completed = Q(status='completed')
+            rows.extend(
+                (row['service__name'], row['category__name'], row['count'],
+                 row['completed_count'], row['completed_revenue'])
+                for row in ServiceHourly.objects.filter(
+                    range_filter('hour', [closed]), **filters
+                ).values(
+                    'service__name', 'category__name'
+                ).annotate(
+                    count=Sum('bookings'),
+                    completed_count=Sum('bookings', filter=completed),
+                    completed_revenue=Sum('revenue', filter=completed)
+                ).order_by()
+            )
+        if raw_ranges:
+            completed = Q(appointment__status='completed')
+            rows.extend(
+                (row['service__name'], row['service__category__name'], row['count'],
+                 row['completed_count'], row['completed_revenue'])
+                for row in AppointmentService.objects.filter(
+                    range_filter('appointment__start_time', raw_ranges), **raw_filters
+                ).values(
+                    'service__name', 'service__category__name'
+                ).annotate(
+                    count=Count('id'),
+                    completed_count=Count('id', filter=completed),
+                    completed_revenue=Sum('service__price', filter=completed)
+                ).order_by()
+            )
+
+    usage = {}
+    for name, category, count, completed_count, revenue in rows:
+        row = usage.setdefault((name, category), {
+            'service__name': name,
+            'service__category__name': category,
+            'count': 0,
+            'completed_count': 0,
+            'revenue': Decimal('0.00'),
+        })
+        row['count'] += count or 0
+        row['completed_count'] += completed_count or 0
+        row['revenue'] += revenue or Decimal('0.00')
+    return list(usage.values())
+
+def get_range_analytics(start, end, medspa_id=None, status=None):
+    """
+    Appointment analytics of the appointments starting in [start, end),
+    the same sections as get_appointment_analytics but served mostly from
+    the hourly rollups, so long ranges cost about as much as short ones.
+    """
+    with consistent_snapshot():
+        return build_appointment_analytics(
+            get_appointment_counts(start, end, medspa_id=medspa_id, status=status),
+            get_service_usage(start, end, medspa_id=medspa_id, status=status)
+        )
+
+def compare_range_analytics(start, end, medspa_id=None, status=None):
+    """
+    Consistency check of the hybrid path: compute the analytics of the
+    range from rollups plus raw rows and from raw rows only, and return
+    the names of the sections that differ (empty when they agree).
+    """
+    from ..models import Appointment
+
+    with consistent_snapshot():
+        hybrid = get_range_analytics(start, end, medspa_id=medspa_id, status=status)
+        raw = get_appointment_analytics(
+            Appointment.objects.filter(
+                range_filter('start_time', [(start, end)]), **appointment_filters(medspa_id, status)
+            )
+        )
+    return [name for name in raw if hybrid[name] != raw[name]]
+
+def parse_timeseries_parameters(params):
+    """
+    Read `interval` and the optional `start_date`/`end_date` of a
+    timeseries request; without dates the trailing timeseries_days are
+    covered. Raises ValueError with a client-facing message on bad input.
+    """
+    from .availability import parse_date_range
+
+    interval = params.get('interval', 'day')
+    if interval not in ANALYTICS_DEFAULTS['timeseries_intervals']:
+        raise ValueError(
+            f"interval must be one of {', '.join(ANALYTICS_DEFAULTS['timeseries_intervals'])}"
+        )
+    if params.get('start_date') or params.get('end_date'):
+        start_date, end_date = parse_date_range(
+            params, max_days=ANALYTICS_DEFAULTS['timeseries_max_days']
+        )
+    else:
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=ANALYTICS_DEFAULTS['timeseries_days'] - 1)
+    return start_date, end_date, interval
+
+def parse_days_parameter(params):
+    """
+    Read the optional `days` parameter, a number of trailing whole days.
+    Returns None when it is absent. Raises ValueError with a client-facing
+    message on bad input.
+    """
+    days = params.get('days')
+    if not days:
+        return None
+    try:
+        days = int(days)
+    except ValueError:
+        raise ValueError("days must be an integer")
+    if not 0 < days <= ANALYTICS_DEFAULTS['usage_max_days']:
+        raise ValueError(f"days must be between 1 and {ANALYTICS_DEFAULTS['usage_max_days']}")
+    return days
+
+def truncate_date(date, interval):
+    """First day of the day, ISO week or month bucket containing a date."""
+    if interval == 'week':
+        return date - timedelta(days=date.weekday())
+    if interval == 'month':
+        return date.replace(day=1)
+    return date
+
+def iter_buckets(start_date, end_date, interval):
+    """Yield the first day of every bucket overlapping [start_date, end_date]."""
+    bucket = truncate_date(start_date, interval)
+    while bucket <= end_date:
+        yield bucket
+        if interval == 'week':
+            bucket += timedelta(days=7)
+        elif interval == 'month':
+            bucket = (bucket + timedelta(days=32)).replace(day=1)
+        else:
+            bucket += timedelta(days=1)
+
+def get_appointment_timeseries(start_date, end_date, interval='day', medspa_id=None, status=None):
+    """
+    Appointment counts and completed revenue per local day, week or month
+    of start_time, computed with one date_trunc query. Buckets without
+    appointments are filled with zeros, and the series are returned as
+    parallel arrays.
+    """
+    from .availability import get_day_bounds
+    from ..models import Appointment
+
+    rows = Appointment.objects.filter(
+        start_time__gte=get_day_bounds(start_date)[0],
+        start_time__lt=get_day_bounds(end_date)[1],
+        **appointment_filters(medspa_id, status)
+    ).annotate(
+        bucket=Trunc('start_time', interval)
+    ).values('bucket').annotate(
+        appointments=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        canceled=Count('id', filter=Q(status='canceled')),
+        revenue=Sum('total_price', filter=Q(status='completed'))
+    ).order_by()
+    by_bucket = {timezone.localtime(row['bucket']).date(): row for row in rows}
+
+    buckets = list(iter_buckets(start_date, end_date, interval))
+    empty = {'appointments': 0, 'completed': 0, 'canceled': 0, 'revenue': None}
+    series = [by_bucket.get(bucket, empty) for bucket in buckets]
+    return {
+        'interval': interval,
+        'start_date': start_date,
+        'end_date': end_date,
+        'buckets': buckets,
+        'appointments': [row['appointments'] for row in series],
+        'completed': [row['completed'] for row in series],
+        'canceled': [row['canceled'] for row in series],
+        'revenue': [row['revenue'] or Decimal('0.00') for row in series],
+    }
+
+def get_most_popular_service(medspa, start_date, end_date):
+    """
+    The medspa's most booked service over the days of the period, with its
+    `usage_count`, read from the Redis leaderboard when it covers the
+    period and from the appointment/service join otherwise.
+    """
+    from . import leaderboard
+
+    ranked = leaderboard.top_services(
+        timezone.localtime(start_date).date(),
+        timezone.localtime(end_date).date(),
+        medspa_id=medspa.id,
+        limit=1
+    )
+    if ranked is None:
+        return medspa.services.annotate(
+            usage_count=Count('appointmentservice')
+        ).order_by('-usage_count').first()
+    if not ranked:
+        return None
+    service_id, usage_count = ranked[0]
+    service = medspa.services.filter(id=service_id).first()
+    if service is not None:
+        service.usage_count = usage_count
+    return service
+
+def compute_medspa_statistics(medspa_ids):
+    """
+    Read the statistics of many medspas with two queries: their precomputed
+    all-time rows and one grouped count of today's appointments.
+    Returns {medspa_id: stats} with the fields of the statistics endpoint.
+    """
+    from ..models import Appointment
+    from .statistics import get_medspa_statistics
+
+    today = timezone.localdate()
+    stats = {
+        medspa_id: {
+            'total_services': row['total_services'],
+            'total_appointments': row['total_appointments'],
+            'appointments_today': 0,
+            'revenue': row['total_revenue'],
+            'active_categories': row['active_categories'],
+        }
+        for medspa_id, row in get_medspa_statistics(medspa_ids).items()
+    }
+
+    for row in Appointment.objects.filter(
+        medspa_id__in=medspa_ids, start_time__date=today
+    ).values('medspa_id').annotate(today=Count('id')).order_by():
+        stats[row['medspa_id']]['appointments_today'] = row['today']
+
+    return stats
+
+def get_cached_medspa_statistics(medspa_ids):
+    """
+    Return {medspa_id: stats}, cached per medspa and day so that a request
+    for many medspas only computes the ones missing from the cache. Entries
+    are retired by the medspa's cache tag when its data changes.
+    """
+    today = timezone.localdate()
+    versions = get_tag_versions([medspa_tag(medspa_id) for medspa_id in medspa_ids])
+    keys = {
+        medspa_id: CACHE_KEYS['medspa_statistics'].format(
+            medspa_id, today, versions[medspa_tag(medspa_id)]
+        )
+        for medspa_id in medspa_ids
+    }
+    cached = cache.get_many(list(keys.values()))
+    stats = {
+        medspa_id: cached[key]
+        for medspa_id, key in keys.items()
+        if key in cached
+    }
+
+    missing = [medspa_id for medspa_id in medspa_ids if medspa_id not in stats]
+    if missing:
+        computed = compute_medspa_statistics(missing)
+        cache.set_many(
+            {keys[medspa_id]: computed[medspa_id] for medspa_id in missing},
+            ANALYTICS_DEFAULTS['statistics_timeout']
+        )
+        stats.update(computed)
+    return stats
 
 def generate_medspa_report(medspa, start_date=None, end_date=None):
     """Generate statistical report for a medspa."""
@@ -88,17 +613,15 @@ def generate_medspa_report(medspa, start_date=None, end_date=None):
         },
         'services': {
             'total': medspa.services.count(),
-            'most_popular': medspa.services.annotate(
-                usage_count=Count('appointmentservice')
-            ).order_by('-usage_count').first(),
+            'most_popular': get_most_popular_service(medspa, start_date, end_date),
         },
         'revenue': {
             'total': completed_appointments.aggregate(
-                total=Sum('services__price')
+                total=Sum('total_price')
             )['total'] or 0,
-            'average_per_appointment': completed_appointments.annotate(
-                total=Sum('services__price')
-            ).aggregate(avg=Avg('total'))['avg'] or 0,
+            'average_per_appointment': completed_appointments.aggregate(
+                avg=Avg('total_price')
+            )['avg'] or 0,
         }
     }
     
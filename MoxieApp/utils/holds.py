@@ -0,0 +1,218 @@
+# utils/holds.py
+"""
+Short-lived slot holds kept in Redis.
+
+A client that picked a slot from `availability` can hold it for a few
+minutes and book it with the returned token. Holds live in one sorted set
+per medspa and local day, scored by expiry, so overlapping holds are
+rejected atomically and expired ones fall away without a sweeper. Held
+slots are hidden from availability and bookings that collide with someone
+else's hold fail before reaching the database. The exclusion constraint on
+appointments remains the final authority.
+"""
+import logging
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .constants import HOLD_SETTINGS
+from .custom_exceptions import ConcurrentBookingError
+from .occupancy import get_connection
+
+logger = logging.getLogger(__name__)
+
+Hold = namedtuple('Hold', ['token', 'medspa_id', 'start_time', 'end_time', 'expires_at'])
+
+# Drop expired holds of the day, then add the new one unless it overlaps a
+# live hold. Members are "token:start:end" with epoch-second bounds.
+CREATE_HOLD_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local start = tonumber(ARGV[2])
+local finish = tonumber(ARGV[3])
+for _, member in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    local held_start, held_end = string.match(member, ':(%d+):(%d+)$')
+    if tonumber(held_start) < finish and tonumber(held_end) > start then
+        return 0
+    end
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[5])
+redis.call('PEXPIREAT', KEYS[1], ARGV[4])
+redis.call('SET', KEYS[2], ARGV[6], 'PX', ARGV[7])
+return 1
+"""
+
+
+class HoldsUnavailable(Exception):
+    """Raised when holds are requested but the cache is not backed by Redis."""
+
+
+def day_key(medspa_id, date):
+    return f"holds:{medspa_id}:{date.isoformat()}"
+
+
+def token_key(token):
+    return f"hold:{token}"
+
+
+def encode_member(token, start_time, end_time):
+    return f"{token}:{int(start_time.timestamp())}:{int(end_time.timestamp())}"
+
+
+def decode_member(member):
+    """Return (token, start, end) for a stored hold member."""
+    if isinstance(member, bytes):
+        member = member.decode()
+    token, start, end = member.rsplit(':', 2)
+    return (
+        token,
+        datetime.fromtimestamp(int(start), timezone.utc),
+        datetime.fromtimestamp(int(end), timezone.utc)
+    )
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def create_hold(medspa_id, start_time, end_time):
+    """
+    Atomically hold [start_time, end_time) for a medspa and return the Hold.
+    Raises ConcurrentBookingError if the slot overlaps a live hold.
+    """
+    conn = get_connection()
+    if conn is None:
+        raise HoldsUnavailable("Slot holds require a Redis cache")
+
+    token = secrets.token_urlsafe(16)
+    date = timezone.localtime(start_time).date()
+    ttl_ms = HOLD_SETTINGS['ttl'] * 1000
+    now = now_ms()
+    member = encode_member(token, start_time, end_time)
+
+    create = conn.register_script(CREATE_HOLD_SCRIPT)
+    created = create(
+        keys=[day_key(medspa_id, date), token_key(token)],
+        args=[
+            now,
+            int(start_time.timestamp()),
+            int(end_time.timestamp()),
+            now + ttl_ms,
+            member,
+            f"{medspa_id}:{date.isoformat()}:{member}",
+            ttl_ms
+        ]
+    )
+    if not created:
+        raise ConcurrentBookingError("The requested time slot is currently held")
+
+    return Hold(
+        token=token,
+        medspa_id=medspa_id,
+        start_time=start_time,
+        end_time=end_time,
+        expires_at=datetime.fromtimestamp((now + ttl_ms) / 1000, timezone.utc)
+    )
+
+
+def release_hold(token, medspa_id=None):
+    """
+    Release a hold early, e.g. once it has been booked. Missing holds, and
+    holds of another medspa than `medspa_id` when it is given, are ignored.
+    """
+    conn = get_connection()
+    if conn is None or not token:
+        return
+    try:
+        value = conn.get(token_key(token))
+        if value is None:
+            return
+        held_medspa_id, date, member = value.decode().split(':', 2)
+        if medspa_id is not None and held_medspa_id != str(medspa_id):
+            return
+        pipe = conn.pipeline(transaction=False)
+        pipe.zrem(f"holds:{held_medspa_id}:{date}", member)
+        pipe.delete(token_key(token))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not release hold {token}: {str(e)}")
+
+
+def load_held_intervals(medspa_ids, dates):
+    """
+    Return {medspa_id: {date: [(start, end, token), ...]}} of live holds.
+    Medspas and days without holds are omitted.
+    """
+    conn = get_connection()
+    if conn is None or not medspa_ids or not dates:
+        return {}
+
+    keys = [(medspa_id, date) for medspa_id in medspa_ids for date in dates]
+    try:
+        pipe = conn.pipeline(transaction=False)
+        now = now_ms()
+        for medspa_id, date in keys:
+            pipe.zrangebyscore(day_key(medspa_id, date), now, '+inf')
+        results = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not read slot holds: {str(e)}")
+        return {}
+
+    held = {}
+    for (medspa_id, date), members in zip(keys, results):
+        if members:
+            held.setdefault(medspa_id, {})[date] = [
+                (start, end, token)
+                for token, start, end in map(decode_member, members)
+            ]
+    return held
+
+
+def exclude_held_slots(slots, held, duration):
+    """Drop slots of `duration` minutes that overlap any of the `held` intervals."""
+    if not held:
+        return slots
+    length = timedelta(minutes=duration)
+    return [
+        slot for slot in slots
+        if not any(slot < end and slot + length > start for start, end, _ in held)
+    ]
+
+
+def check_booking(medspa_id, start_time, end_time, token=None):
+    """
+    Fail fast before a booking reaches the database.
+
+    With a token, the hold must exist and belong to this medspa and start
+    time. In every case the booking must not overlap anybody else's hold.
+    Raises ConcurrentBookingError otherwise.
+    """
+    conn = get_connection()
+    if conn is None:
+        return
+
+    if token:
+        try:
+            value = conn.get(token_key(token))
+        except RedisError as e:
+            logger.warning(f"Could not read hold {token}: {str(e)}")
+            return
+        if value is None:
+            raise ConcurrentBookingError("The slot hold has expired")
+        held_medspa_id, _, member = value.decode().split(':', 2)
+        held_start = decode_member(member)[1]
+        if int(held_medspa_id) != int(medspa_id) \
+                or int(held_start.timestamp()) != int(start_time.timestamp()):
+            raise ConcurrentBookingError("The slot hold does not match this booking")
+
+    dates = sorted({
+        timezone.localtime(start_time).date(),
+        timezone.localtime(end_time).date()
+    })
+    held = load_held_intervals([medspa_id], dates).get(medspa_id, {})
+    for intervals in held.values():
+        for start, end, held_token in intervals:
+            if held_token != token and start < end_time and end > start_time:
+                raise ConcurrentBookingError("The requested time slot is currently held")
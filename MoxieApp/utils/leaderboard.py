@@ -0,0 +1,183 @@
+# utils/leaderboard.py
+"""
+Popular-services leaderboards kept in Redis sorted sets.
+
+For every local day there is one sorted set per medspa and one across all
+medspas, scoring each service by how often it was booked on appointments
+starting that day; a second family counts only completed appointments.
+Appointment changes adjust the scores with ZINCRBY once they commit, so
+the top services of any window are a ZUNIONSTORE of its day buckets
+instead of a GROUP BY over the appointment/service join.
+
+Leaderboards only answer for days since the last
+`manage.py rebuild_leaderboards`; earlier windows, or a cache that is not
+Redis, make `top_services` return None and callers fall back to SQL.
+"""
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from django.db.models import Count
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from .availability import get_day_bounds, iter_dates
+from .constants import LEADERBOARD_SETTINGS
+from .occupancy import get_connection
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('booked', 'completed')
+GLOBAL_SCOPE = 'all'
+
+
+def board_key(kind, scope, date):
+    return f"{LEADERBOARD_SETTINGS['prefix']}:{kind}:{scope}:{date.isoformat()}"
+
+
+def since_key():
+    return f"{LEADERBOARD_SETTINGS['prefix']}:since"
+
+
+def expire_at(date):
+    """Epoch second at which a day bucket is dropped."""
+    return int(get_day_bounds(date + timedelta(days=LEADERBOARD_SETTINGS['retention_days']))[0].timestamp())
+
+
+def contributions(snapshot):
+    """Counter of (kind, medspa_id, date, service_id) scores an appointment adds."""
+    counts = Counter()
+    if snapshot is None:
+        return counts
+    date = timezone.localtime(snapshot.start_time).date()
+    kinds = KINDS if snapshot.status == 'completed' else KINDS[:1]
+    for kind in kinds:
+        for service_id in snapshot.service_ids:
+            counts[(kind, snapshot.medspa_id, date, service_id)] += 1
+    return counts
+
+
+def apply_change(before, after):
+    """Move an appointment's services between leaderboard buckets."""
+    deltas = contributions(after)
+    deltas.subtract(contributions(before))
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    conn = get_connection()
+    if conn is None:
+        return
+
+    try:
+        pipe = conn.pipeline(transaction=False)
+        for (kind, medspa_id, date, service_id), delta in deltas.items():
+            for scope in (medspa_id, GLOBAL_SCOPE):
+                key = board_key(kind, scope, date)
+                pipe.zincrby(key, delta, service_id)
+                if delta < 0:
+                    pipe.zremrangebyscore(key, '-inf', 0)
+                pipe.expireat(key, expire_at(date))
+        pipe.execute()
+    except RedisError as e:
+        # The next rebuild repairs the missed adjustment
+        logger.warning(f"Could not update leaderboards: {str(e)}")
+
+
+def get_since(conn):
+    value = conn.get(since_key())
+    return datetime.strptime(value.decode(), '%Y-%m-%d').date() if value else None
+
+
+def top_services(start_date, end_date, medspa_id=None, kind='booked', limit=None):
+    """
+    Return [(service_id, count)] of the most booked services of appointments
+    starting between start_date and end_date, best first, or None when the
+    leaderboards cannot answer for that window.
+    """
+    limit = limit or LEADERBOARD_SETTINGS['top_k']
+    conn = get_connection()
+    if conn is None:
+        return None
+    scope = GLOBAL_SCOPE if medspa_id is None else medspa_id
+
+    try:
+        since = get_since(conn)
+        oldest = timezone.localdate() - timedelta(days=LEADERBOARD_SETTINGS['retention_days'])
+        if since is None or start_date < max(since, oldest):
+            return None
+        keys = [board_key(kind, scope, date) for date in iter_dates(start_date, end_date)]
+        union_key = f"{LEADERBOARD_SETTINGS['prefix']}:union:{uuid.uuid4().hex}"
+        pipe = conn.pipeline()
+        pipe.zunionstore(union_key, keys)
+        pipe.zrevrangebyscore(union_key, '+inf', '(0', start=0, num=limit, withscores=True)
+        pipe.delete(union_key)
+        _, ranked, _ = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not read leaderboards: {str(e)}")
+        return None
+    return [(int(service_id), int(score)) for service_id, score in ranked]
+
+
+def get_most_popular(start_date, end_date, medspa_id=None, limit=None):
+    """
+    The `most_popular` section of analytics ([{'services__name', 'count'}])
+    from the leaderboards, or None when they cannot answer for the window.
+    """
+    from ..models import Service
+
+    ranked = top_services(start_date, end_date, medspa_id=medspa_id, limit=limit)
+    if ranked is None:
+        return None
+    names = dict(Service.objects.filter(
+        id__in=[service_id for service_id, _ in ranked]
+    ).values_list('id', 'name'))
+    return [
+        {'services__name': names[service_id], 'count': count}
+        for service_id, count in ranked
+        if service_id in names
+    ]
+
+
+def rebuild(start_date):
+    """
+    Recompute every leaderboard bucket from start_date up to the last booked
+    day from the database and mark the leaderboards complete from
+    start_date on. Returns the number of sorted sets written.
+    """
+    from ..models import AppointmentService
+
+    conn = get_connection()
+    if conn is None:
+        raise RuntimeError("The default cache is not backed by Redis")
+
+    rows = AppointmentService.objects.filter(
+        appointment__start_time__gte=get_day_bounds(start_date)[0]
+    ).annotate(
+        day=Trunc('appointment__start_time', 'day')
+    ).values(
+        'day', 'appointment__medspa_id', 'appointment__status', 'service_id'
+    ).annotate(count=Count('id')).order_by()
+
+    boards = {}
+    for row in rows:
+        date = timezone.localtime(row['day']).date()
+        kinds = KINDS if row['appointment__status'] == 'completed' else KINDS[:1]
+        for kind in kinds:
+            for scope in (row['appointment__medspa_id'], GLOBAL_SCOPE):
+                board = boards.setdefault((board_key(kind, scope, date), date), Counter())
+                board[row['service_id']] += row['count']
+
+    stale = [
+        key for key in conn.scan_iter(match=f"{LEADERBOARD_SETTINGS['prefix']}:*:*:*")
+        if key.decode().rsplit(':', 1)[1] >= start_date.isoformat()
+    ]
+    pipe = conn.pipeline()
+    if stale:
+        pipe.delete(*stale)
+    for (key, date), board in boards.items():
+        pipe.zadd(key, dict(board))
+        pipe.expireat(key, expire_at(date))
+    pipe.set(since_key(), start_date.isoformat())
+    pipe.execute()
+    return len(boards)
@@ -0,0 +1,257 @@
+# utils/occupancy.py
+"""
+Per-medspa, per-day occupancy maps kept in Redis.
+
+Each local day is split into 5-minute cells and stored as one byte per cell
+holding the number of blocking appointments covering it, so overlapping
+bookings can be added and removed independently. A day with no key has not
+been built yet; readers fall back to the database and build it.
+
+Every change to a day also bumps the day's generation, whether or not its
+map exists. A reader rebuilding a day notes the generation before querying
+the database and only writes the map if it is unchanged, so a booking
+committed while the rebuild was in flight is never overwritten by a map
+that misses it.
+"""
+import logging
+from datetime import timedelta
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .availability import get_day_bounds, iter_dates, merge_intervals
+from .constants import NON_BLOCKING_STATUSES, OCCUPANCY_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+CELL_MINUTES = OCCUPANCY_SETTINGS['cell_minutes']
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+
+# Bump the day's generation KEYS[2], then adjust the counters of cells
+# [ARGV[1], ARGV[2]) by ARGV[3], but only if the day has already been built;
+# a partial map would read as authoritative.
+ADJUST_CELLS_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local first = tonumber(ARGV[1])
+local last = tonumber(ARGV[2])
+local delta = tonumber(ARGV[3])
+local counts = redis.call('GETRANGE', KEYS[1], first, last - 1)
+local adjusted = {}
+for i = 1, last - first do
+    local count = (string.byte(counts, i) or 0) + delta
+    adjusted[i] = string.char(math.max(0, math.min(255, count)))
+end
+redis.call('SETRANGE', KEYS[1], first, table.concat(adjusted))
+return 1
+"""
+
+# Write a rebuilt map ARGV[2] with a TTL of ARGV[3] seconds, unless the
+# day's generation KEYS[2] moved away from ARGV[1] since the rebuild began.
+STORE_DAY_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def occupancy_key(medspa_id, date):
+    return f"occupancy:{medspa_id}:{date.isoformat()}"
+
+
+def generation_key(medspa_id, date):
+    return f"occupancy_generation:{medspa_id}:{date.isoformat()}"
+
+
+def get_connection():
+    """Return the raw Redis connection, or None if the cache is not Redis."""
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
+
+
+def is_cell_aligned(window_start, granularity):
+    """
+    Cell-rounded occupancy answers slot queries exactly only when every slot
+    boundary falls on a cell boundary.
+    """
+    return (
+        granularity % CELL_MINUTES == 0
+        and window_start.minute % CELL_MINUTES == 0
+        and window_start.second == 0
+    )
+
+
+def cell_range(date, start, end):
+    """
+    Return the [first, last) cells of `date` covered by the interval,
+    rounding outwards to whole cells.
+    """
+    day_start, day_end = get_day_bounds(date)
+    start = max(start, day_start)
+    end = min(end, day_end)
+    if end <= start:
+        return 0, 0
+
+    cell = timedelta(minutes=CELL_MINUTES)
+    first = (start - day_start) // cell
+    last = -(-(end - day_start) // cell)
+    return first, min(last, CELLS_PER_DAY)
+
+
+def build_counts(date, intervals):
+    """Build the byte-per-cell counter map for one day from raw intervals."""
+    counts = bytearray(CELLS_PER_DAY)
+    for start, end in intervals:
+        first, last = cell_range(date, start, end)
+        for index in range(first, last):
+            counts[index] = min(counts[index] + 1, 255)
+    return bytes(counts)
+
+
+def counts_to_intervals(date, counts):
+    """Convert a counter map back into merged busy intervals."""
+    day_start = get_day_bounds(date)[0]
+    cell = timedelta(minutes=CELL_MINUTES)
+    intervals = []
+    run_start = None
+    for index, count in enumerate(counts):
+        if count and run_start is None:
+            run_start = index
+        elif not count and run_start is not None:
+            intervals.append((day_start + run_start * cell, day_start + index * cell))
+            run_start = None
+    if run_start is not None:
+        intervals.append((day_start + run_start * cell, day_start + len(counts) * cell))
+    return merge_intervals(intervals)
+
+
+def get_generations(medspa_id, dates):
+    """
+    Return {date: generation} of the given days, to be read before loading
+    them from the database and passed on to store_days.
+    """
+    conn = get_connection()
+    if conn is None or not dates:
+        return {}
+    try:
+        values = conn.mget([generation_key(medspa_id, date) for date in dates])
+    except RedisError as e:
+        logger.warning(f"Could not read occupancy generations for medspa {medspa_id}: {str(e)}")
+        return {}
+    return {
+        date: value.decode() if value is not None else ''
+        for date, value in zip(dates, values)
+    }
+
+
+def store_days(medspa_id, intervals_by_day, generations):
+    """
+    Write freshly built counter maps for the days in `generations`, skipping
+    any day that changed since its generation was read. Returns the skipped
+    days.
+    """
+    conn = get_connection()
+    if conn is None or not generations:
+        return []
+    dates = [date for date in generations if date in intervals_by_day]
+    try:
+        store = conn.register_script(STORE_DAY_SCRIPT)
+        pipe = conn.pipeline(transaction=False)
+        for date in dates:
+            store(
+                keys=[occupancy_key(medspa_id, date), generation_key(medspa_id, date)],
+                args=[generations[date], build_counts(date, intervals_by_day[date]), OCCUPANCY_SETTINGS['ttl']],
+                client=pipe
+            )
+        stored = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not store occupancy for medspa {medspa_id}: {str(e)}")
+        return []
+    return [date for date, written in zip(dates, stored) if not written]
+
+
+def load_days(medspa_id, dates):
+    """
+    Return {date: busy intervals} for the days that have an occupancy map.
+    Days without one are omitted.
+    """
+    conn = get_connection()
+    if conn is None or not dates:
+        return {}
+    try:
+        values = conn.mget([occupancy_key(medspa_id, date) for date in dates])
+    except RedisError as e:
+        logger.warning(f"Could not read occupancy for medspa {medspa_id}: {str(e)}")
+        return {}
+
+    return {
+        date: counts_to_intervals(date, value)
+        for date, value in zip(dates, values)
+        if value is not None and len(value) == CELLS_PER_DAY
+    }
+
+
+def is_blocking(snapshot):
+    return snapshot is not None and snapshot.status not in NON_BLOCKING_STATUSES
+
+
+def apply_change(before, after):
+    """
+    Incrementally move an appointment's footprint from its previous state to
+    its new one. Only days whose map already exists are touched; the rest
+    are built from the database on first read.
+    """
+    conn = get_connection()
+    if conn is None:
+        return
+
+    removed = before if is_blocking(before) else None
+    added = after if is_blocking(after) else None
+    if removed and added and removed.medspa_id == added.medspa_id \
+            and removed.start_time == added.start_time \
+            and removed.end_time == added.end_time:
+        return
+
+    try:
+        adjust = conn.register_script(ADJUST_CELLS_SCRIPT)
+        for snapshot, delta in ((removed, -1), (added, 1)):
+            if snapshot is None:
+                continue
+            for date in iter_dates(
+                timezone.localtime(snapshot.start_time).date(),
+                timezone.localtime(snapshot.end_time).date()
+            ):
+                first, last = cell_range(date, snapshot.start_time, snapshot.end_time)
+                if first < last:
+                    adjust(
+                        keys=[
+                            occupancy_key(snapshot.medspa_id, date),
+                            generation_key(snapshot.medspa_id, date)
+                        ],
+                        args=[first, last, delta, OCCUPANCY_SETTINGS['ttl']]
+                    )
+    except RedisError as e:
+        logger.warning(f"Could not update occupancy for appointment change: {str(e)}")
+
+
+def drop_days(medspa_id, dates):
+    """Delete occupancy maps so they are rebuilt from the database."""
+    conn = get_connection()
+    if conn is None or not dates:
+        return
+    try:
+        pipe = conn.pipeline(transaction=False)
+        for date in dates:
+            pipe.incr(generation_key(medspa_id, date))
+            pipe.expire(generation_key(medspa_id, date), OCCUPANCY_SETTINGS['ttl'])
+        pipe.delete(*[occupancy_key(medspa_id, date) for date in dates])
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not drop occupancy for medspa {medspa_id}: {str(e)}")
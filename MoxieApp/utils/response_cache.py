@@ -0,0 +1,448 @@
+# utils/response_cache.py
+"""
+Cached view responses for `cache_response`.
+
+A cache key names what the response depends on and nothing else: the
+view class and action, the resolved route kwargs, the query parameters
+in sorted order, the negotiated media type and the caller's scope. The
+scope is the user for per-user responses, otherwise the caller's set of
+permissions, so users with the same permissions share entries.
+
+Entries hold the rendered body bytes, status and headers rather than a
+pickled Response, and a hit is served as a plain HttpResponse without
+running the view or the renderer.
+
+Entries can also be tagged with the entities they depend on: `medspa:<id>`
+(`medspa:all` for responses over every medspa), `service:<id>`,
+`catalog`, and `day:<date>` for responses counting today's appointments,
+whose entries must not outlive the day. Each tag has a version token, like the availability and
+schedule versions, and the current tokens are part of the key. Writes
+replace the tokens of the tags they touch once they commit, which retires
+every dependent entry at once, so entries can live for hours.
+
+Hot, rarely changing responses can also be kept in a per-process LRU tier
+in front of the shared cache, bounded by the bytes it holds. Requests using
+the tier also read the tag tokens from a per-process copy that is refreshed
+from the shared cache once it is RESPONSE_CACHE_SETTINGS['local_tag_ttl']
+seconds old, so a local hit makes no round trip at all. A write in the same
+process drops its copies of the tokens it replaces; a write in another
+process makes the local copies unreachable within that TTL. Hits and misses
+are counted per tier.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .constants import CACHE_KEYS, RESPONSE_CACHE_SETTINGS
+from .occupancy import get_connection
+
+# Renderer formats whose output does not depend on the request beyond the key
+CACHEABLE_FORMATS = ('json',)
+
+# Headers describing how the original response was produced, not its content
+SKIPPED_HEADERS = ('x-execution-time', 'x-cache')
+
+CATALOG_TAG = 'catalog'
+ALL_MEDSPAS = 'all'
+
+
+def medspa_tag(medspa_id):
+    return f"medspa:{medspa_id}"
+
+
+def service_tag(service_id):
+    return f"service:{service_id}"
+
+
+def medspa_tags(*medspa_ids):
+    """Tags to invalidate when data of the given medspas changes."""
+    return [medspa_tag(medspa_id) for medspa_id in medspa_ids if medspa_id is not None] \
+        + [medspa_tag(ALL_MEDSPAS)]
+
+
+def get_tag_versions(tags):
+    """Return {tag: current version token} with one cache read."""
+    keys = {tag: CACHE_KEYS['cache_tag'].format(tag) for tag in tags}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for tag, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        versions[tag] = version
+    return versions
+
+
+# tag -> (expires_at, version token) of the tokens read by local-tier requests
+local_tag_versions = {}
+local_tag_versions_lock = threading.Lock()
+
+
+def get_local_tag_versions(tags):
+    """
+    Like get_tag_versions, but from this process's copy of the tokens, only
+    reading those missing or older than the local tag TTL from the cache.
+    """
+    now = time.monotonic()
+    with local_tag_versions_lock:
+        items = {tag: local_tag_versions.get(tag) for tag in tags}
+    versions = {
+        tag: item[1] for tag, item in items.items()
+        if item is not None and item[0] > now
+    }
+    missing = [tag for tag in tags if tag not in versions]
+    if missing:
+        found = get_tag_versions(missing)
+        expires_at = now + RESPONSE_CACHE_SETTINGS['local_tag_ttl']
+        with local_tag_versions_lock:
+            local_tag_versions.update(
+                (tag, (expires_at, version)) for tag, version in found.items()
+            )
+        versions.update(found)
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Retire every cached entry depending on any of the tags."""
+    tags = set(tags)
+    cache.set_many({
+        CACHE_KEYS['cache_tag'].format(tag): uuid.uuid4().hex for tag in tags
+    }, None)
+    with local_tag_versions_lock:
+        for tag in tags:
+            local_tag_versions.pop(tag, None)
+
+
+def invalidate_tags_on_commit(*tags):
+    """Invalidate the tags once the current transaction commits."""
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+def invalidate_appointment_change(before, after):
+    """Retire the entries of the medspas and services an appointment change touches."""
+    snapshots = [snapshot for snapshot in (before, after) if snapshot is not None]
+    invalidate_tags(
+        *medspa_tags(*{snapshot.medspa_id for snapshot in snapshots}),
+        *(service_tag(service_id) for snapshot in snapshots for service_id in snapshot.service_ids)
+    )
+
+
+def day_tag():
+    """Tag of the current local day, for responses with figures about today."""
+    return f"day:{timezone.localdate()}"
+
+
+def detail_tags(prefix, daily=False):
+    """
+    Tags of a detail route's object, e.g. detail_tags('medspa') -> medspa:<pk>,
+    plus the current day's tag when `daily` is set so entries roll over at
+    midnight.
+    """
+    if daily:
+        return lambda view, request: [f"{prefix}:{view.kwargs['pk']}", day_tag()]
+    return lambda view, request: [f"{prefix}:{view.kwargs['pk']}"]
+
+
+def medspa_filter_tags(view, request):
+    """Tags of a response over the `medspa_id` filter, or every medspa."""
+    return [medspa_tag(request.query_params.get('medspa_id') or ALL_MEDSPAS), CATALOG_TAG]
+
+
+def catalog_tags(view, request):
+    return [CATALOG_TAG]
+
+
+def get_cache_scope(user, per_user=False):
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    if per_user:
+        return f"user:{user.pk}"
+    if user.is_superuser:
+        return 'superuser'
+    permissions = ','.join(sorted(user.get_all_permissions()))
+    return 'perms:' + hashlib.sha1(permissions.encode()).hexdigest()
+
+
+def build_cache_key(view, request, name, per_user=False, tags=(), local=False):
+    """
+    Canonical cache key of a view action for a request and tag versions,
+    read from this process's copy of the tokens when `local` is set.
+    """
+    if not tags:
+        versions = {}
+    elif local:
+        versions = get_local_tag_versions(tags)
+    else:
+        versions = get_tag_versions(tags)
+    route = sorted((key, str(value)) for key, value in view.kwargs.items())
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    parts = [
+        repr(route),
+        repr(params),
+        getattr(request, 'accepted_media_type', '') or '',
+        get_cache_scope(getattr(request, 'user', None), per_user),
+        repr(sorted(versions.items())),
+    ]
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    return CACHE_KEYS['response'].format(f"{type(view).__name__}.{name}", digest)
+
+
+def render_response(view, request, response):
+    """
+    Render a DRF Response the way the view would and return its cache
+    entry, or None when the response should not be cached.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if renderer is None or renderer.format not in CACHEABLE_FORMATS:
+        return None
+    response.accepted_renderer = renderer
+    response.accepted_media_type = request.accepted_media_type
+    response.renderer_context = view.get_renderer_context()
+    response.render()
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'headers': [
+            (header, value) for header, value in response.items()
+            if header.lower() not in SKIPPED_HEADERS
+        ],
+    }
+
+
+def entry_size(entry):
+    """Approximate bytes held by a cache entry."""
+    return len(entry['content']) + sum(
+        len(header) + len(value) for header, value in entry['headers']
+    )
+
+
+class LocalResponseCache:
+    """Thread-safe LRU of cache entries bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, size, entry = item
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.size -= size
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (time.monotonic() + timeout, size, entry)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+local_cache = LocalResponseCache(RESPONSE_CACHE_SETTINGS['local_max_bytes'])
+
+stats = Counter()
+stats_lock = threading.Lock()
+
+
+def record(tier, outcome):
+    with stats_lock:
+        stats[(tier, outcome)] += 1
+
+
+def get_cache_stats():
+    """Hit and miss counts of this process per tier, plus the local tier's size."""
+    with stats_lock:
+        counts = dict(stats)
+    report = {
+        tier: {outcome: counts.get((tier, outcome), 0) for outcome in ('hits', 'misses')}
+        for tier in ('local', 'shared')
+    }
+    report['local']['bytes'] = local_cache.size
+    report['local']['entries'] = len(local_cache.entries)
+    return report
+
+
+def build_response(entry, tier, stale=False):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response['X-Cache'] = 'STALE' if stale else 'HIT'
+    response['X-Cache-Tier'] = tier
+    return response
+
+
+def is_fresh(entry):
+    return entry.get('fresh_until', 0) > time.time()
+
+
+def lookup(key, local_timeout=None, count=True):
+    """
+    Return (entry, tier) of the freshest cached copy of a key, looking in
+    the local tier first when local_timeout is given, or (None, None).
+    """
+    entry = local_cache.get(key) if local_timeout else None
+    if local_timeout and count:
+        record('local', 'hits' if entry is not None and is_fresh(entry) else 'misses')
+    if entry is not None and is_fresh(entry):
+        return entry, 'local'
+
+    shared = cache.get(key)
+    if count:
+        record('shared', 'hits' if shared is not None and is_fresh(shared) else 'misses')
+    if shared is None:
+        return (entry, 'local') if entry is not None else (None, None)
+    if local_timeout:
+        local_cache.set(key, shared, local_timeout)
+    return shared, 'shared'
+
+
+def store(key, entry, timeout, stale_ttl=0, local=False):
+    """Cache an entry as fresh for `timeout` and servable stale for `stale_ttl` after."""
+    entry['fresh_until'] = time.time() + timeout
+    cache.set(key, entry, timeout + stale_ttl)
+    if local:
+        local_cache.set(key, entry, timeout + stale_ttl)
+
+
+# Deletes the refresh lock only if it still holds the caller's token, so a
+# recompute that outlived the lock TTL cannot release a lock taken since
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_refresh_lock(key):
+    """Take the cross-process lock for recomputing a key; returns a token or None."""
+    token = uuid.uuid4().hex
+    lock_key = CACHE_KEYS['response_lock'].format(key)
+    conn = get_connection()
+    if conn is None:
+        acquired = cache.add(lock_key, token, RESPONSE_CACHE_SETTINGS['lock_ttl'])
+    else:
+        acquired = conn.set(lock_key, token, nx=True, ex=RESPONSE_CACHE_SETTINGS['lock_ttl'])
+    return token if acquired else None
+
+
+def release_refresh_lock(key, token):
+    """Release the refresh lock if the caller still holds it."""
+    lock_key = CACHE_KEYS['response_lock'].format(key)
+    conn = get_connection()
+    if conn is None:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        return
+    release = conn.register_script(RELEASE_LOCK_SCRIPT)
+    release(keys=[lock_key], args=[token])
+
+
+def wait_for_entry(key):
+    """Wait for another process to store a key; returns the entry or None on timeout."""
+    deadline = time.monotonic() + RESPONSE_CACHE_SETTINGS['lock_wait']
+    while time.monotonic() < deadline:
+        entry = cache.get(key)
+        if entry is not None and is_fresh(entry):
+            return entry
+        time.sleep(RESPONSE_CACHE_SETTINGS['poll_interval'])
+    return None
+
+
+# key -> event set once the request of this process recomputing the key is
+# done; other requests of the process missing the key wait on it instead of
+# each asking the shared cache for the lock
+key_events = {}
+key_events_lock = threading.Lock()
+
+
+def serve_cached(key, compute, timeout, stale_ttl=0, local=False):
+    """
+    Return the response for a cache key, calling compute() -> (response,
+    entry or None) at most once across processes per expiry.
+
+    A fresh entry is served as is. A stale one, within stale_ttl of its
+    expiry, is served while the request that takes the refresh lock
+    recomputes it. On a miss, requests of the same process wait for one
+    another and requests of other processes wait for the lock holder to
+    store the entry, recomputing themselves only if it never shows up.
+    """
+    local_timeout = timeout + stale_ttl if local else None
+
+    def recompute():
+        response, entry = compute()
+        if entry is not None:
+            store(key, entry, timeout, stale_ttl=stale_ttl, local=local)
+        return response
+
+    entry, tier = lookup(key, local_timeout)
+    if entry is not None and is_fresh(entry):
+        return build_response(entry, tier)
+
+    if entry is not None:
+        token = acquire_refresh_lock(key)
+        if token is None:
+            return build_response(entry, tier, stale=True)
+        try:
+            return recompute()
+        finally:
+            release_refresh_lock(key, token)
+
+    with key_events_lock:
+        event = key_events.get(key)
+        leader = event is None
+        if leader:
+            event = key_events[key] = threading.Event()
+    try:
+        if not leader:
+            event.wait(RESPONSE_CACHE_SETTINGS['lock_wait'])
+            entry, tier = lookup(key, local_timeout, count=False)
+            if entry is not None and is_fresh(entry):
+                return build_response(entry, tier)
+
+        token = acquire_refresh_lock(key)
+        if token is None:
+            entry = wait_for_entry(key)
+            if entry is not None:
+                if local:
+                    local_cache.set(key, entry, local_timeout)
+                return build_response(entry, 'shared')
+        try:
+            return recompute()
+        finally:
+            if token is not None:
+                release_refresh_lock(key, token)
+    finally:
+        if leader:
+            with key_events_lock:
+                del key_events[key]
+            event.set()
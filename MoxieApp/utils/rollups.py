@@ -0,0 +1,201 @@
+# utils/rollups.py
+"""
+Delta-maintained analytics rollups.
+
+`daily_revenue` and `daily_revenue_category` hold the completed
+appointments of each medspa per creation date. Triggers installed by
+migration 0008 adjust the affected rows whenever an appointment or one of
+its service links changes, so writes never rescan history; reporting reads
+them through the `mv_daily_revenue` view. The functions here recompute the
+rollups from the appointments to detect or repair drift.
+
+`appointment_hourly` and `service_hourly` (migration 0010) are maintained
+the same way and hold appointments and booked services per medspa,
+status and starting hour; they can be rebuilt for any range of history.
+"""
+from django.db import connection, transaction
+
+EXPECTED_DAILY_REVENUE_SQL = """
+SELECT DATE(created_at) AS date, medspa_id, COUNT(*) AS total_appointments,
+       SUM(total_price) AS daily_revenue
+FROM appointment
+WHERE status = 'completed'
+GROUP BY DATE(created_at), medspa_id
+"""
+
+EXPECTED_DAILY_REVENUE_CATEGORY_SQL = """
+SELECT DATE(a.created_at) AS date, a.medspa_id, used.category_id,
+       COUNT(*) AS total_appointments
+FROM (
+    SELECT DISTINCT as_j.appointment_id, s.category_id
+    FROM appointment_service as_j
+    JOIN service s ON s.id = as_j.service_id
+) used
+JOIN appointment a ON a.id = used.appointment_id
+WHERE a.status = 'completed'
+GROUP BY DATE(a.created_at), a.medspa_id, used.category_id
+"""
+
+# Rows whose stored totals differ from the recomputed ones. Rows left at
+# zero by decrements are equivalent to missing rows.
+DAILY_REVENUE_DRIFT_SQL = f"""
+SELECT COALESCE(e.date, r.date), COALESCE(e.medspa_id, r.medspa_id),
+       e.total_appointments, e.daily_revenue,
+       r.total_appointments, r.daily_revenue
+FROM ({EXPECTED_DAILY_REVENUE_SQL}) e
+FULL OUTER JOIN (
+    SELECT * FROM daily_revenue WHERE total_appointments <> 0 OR daily_revenue <> 0
+) r ON r.date = e.date AND r.medspa_id = e.medspa_id
+WHERE e.total_appointments IS DISTINCT FROM r.total_appointments
+   OR e.daily_revenue IS DISTINCT FROM r.daily_revenue
+ORDER BY 1, 2
+"""
+
+DAILY_REVENUE_CATEGORY_DRIFT_SQL = f"""
+SELECT COALESCE(e.date, r.date), COALESCE(e.medspa_id, r.medspa_id),
+       COALESCE(e.category_id, r.category_id),
+       e.total_appointments, r.total_appointments
+FROM ({EXPECTED_DAILY_REVENUE_CATEGORY_SQL}) e
+FULL OUTER JOIN (
+    SELECT * FROM daily_revenue_category WHERE total_appointments <> 0
+) r ON r.date = e.date AND r.medspa_id = e.medspa_id AND r.category_id = e.category_id
+WHERE e.total_appointments IS DISTINCT FROM r.total_appointments
+ORDER BY 1, 2, 3
+"""
+
+
+def find_daily_revenue_drift():
+    """
+    Compare the rollups with totals recomputed from the appointments.
+    Returns (revenue_rows, category_rows) of mismatches, each row holding
+    the key followed by the expected and the stored values.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(DAILY_REVENUE_DRIFT_SQL)
+        revenue_rows = cursor.fetchall()
+        cursor.execute(DAILY_REVENUE_CATEGORY_DRIFT_SQL)
+        category_rows = cursor.fetchall()
+    return revenue_rows, category_rows
+
+
+def rebuild_daily_revenue():
+    """
+    Recompute both rollup tables from the appointments. Appointment writes
+    are blocked while this runs so no delta is lost in between. Returns the
+    number of (date, medspa) rows written.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE appointment, appointment_service IN SHARE MODE")
+        cursor.execute("DELETE FROM daily_revenue_category")
+        cursor.execute("DELETE FROM daily_revenue")
+        cursor.execute(
+            "INSERT INTO daily_revenue (date, medspa_id, total_appointments, daily_revenue) "
+            + EXPECTED_DAILY_REVENUE_SQL
+        )
+        written = cursor.rowcount
+        cursor.execute(
+            "INSERT INTO daily_revenue_category (date, medspa_id, category_id, total_appointments) "
+            + EXPECTED_DAILY_REVENUE_CATEGORY_SQL
+        )
+    return written
+
+
+# Hourly rollups of the appointments starting in [%(start)s, %(end)s)
+EXPECTED_APPOINTMENT_HOURLY_SQL = """
+SELECT medspa_id, status, date_trunc('hour', start_time) AS hour,
+       COUNT(*) AS appointments, SUM(total_price) AS revenue,
+       SUM((EXTRACT(EPOCH FROM end_time - start_time) / 60)::integer) AS minutes
+FROM appointment
+WHERE start_time >= %(start)s AND start_time < %(end)s
+GROUP BY medspa_id, status, date_trunc('hour', start_time)
+"""
+
+EXPECTED_SERVICE_HOURLY_SQL = """
+SELECT a.medspa_id, s.id AS service_id, s.category_id, a.status,
+       date_trunc('hour', a.start_time) AS hour, COUNT(*) AS bookings,
+       SUM(s.price) AS revenue, SUM(s.duration) AS minutes
+FROM appointment_service as_j
+JOIN appointment a ON a.id = as_j.appointment_id
+JOIN service s ON s.id = as_j.service_id
+WHERE a.start_time >= %(start)s AND a.start_time < %(end)s
+GROUP BY a.medspa_id, s.id, s.category_id, a.status, date_trunc('hour', a.start_time)
+"""
+
+APPOINTMENT_HOURLY_DRIFT_SQL = f"""
+SELECT COALESCE(e.medspa_id, r.medspa_id), COALESCE(e.status, r.status),
+       COALESCE(e.hour, r.hour),
+       e.appointments, e.revenue, e.minutes,
+       r.appointments, r.revenue, r.minutes
+FROM ({EXPECTED_APPOINTMENT_HOURLY_SQL}) e
+FULL OUTER JOIN (
+    SELECT * FROM appointment_hourly
+    WHERE hour >= %(start)s AND hour < %(end)s
+      AND (appointments <> 0 OR revenue <> 0 OR minutes <> 0)
+) r ON r.medspa_id = e.medspa_id AND r.status = e.status AND r.hour = e.hour
+WHERE e.appointments IS DISTINCT FROM r.appointments
+   OR e.revenue IS DISTINCT FROM r.revenue
+   OR e.minutes IS DISTINCT FROM r.minutes
+ORDER BY 3, 1, 2
+"""
+
+SERVICE_HOURLY_DRIFT_SQL = f"""
+SELECT COALESCE(e.medspa_id, r.medspa_id), COALESCE(e.service_id, r.service_id),
+       COALESCE(e.category_id, r.category_id), COALESCE(e.status, r.status),
+       COALESCE(e.hour, r.hour),
+       e.bookings, e.revenue, e.minutes,
+       r.bookings, r.revenue, r.minutes
+FROM ({EXPECTED_SERVICE_HOURLY_SQL}) e
+FULL OUTER JOIN (
+    SELECT * FROM service_hourly
+    WHERE hour >= %(start)s AND hour < %(end)s
+      AND (bookings <> 0 OR revenue <> 0 OR minutes <> 0)
+) r ON r.medspa_id = e.medspa_id AND r.service_id = e.service_id
+   AND r.category_id = e.category_id AND r.status = e.status AND r.hour = e.hour
+WHERE e.bookings IS DISTINCT FROM r.bookings
+   OR e.revenue IS DISTINCT FROM r.revenue
+   OR e.minutes IS DISTINCT FROM r.minutes
+ORDER BY 5, 1, 2, 4
+"""
+
+
+def find_hourly_drift(start, end):
+    """
+    Compare the hourly rollups of [start, end) with totals recomputed from
+    the appointments. `start` and `end` must fall on whole hours. Returns
+    (appointment_rows, service_rows) of mismatches, each row holding the
+    key followed by the expected and the stored values.
+    """
+    params = {'start': start, 'end': end}
+    with connection.cursor() as cursor:
+        cursor.execute(APPOINTMENT_HOURLY_DRIFT_SQL, params)
+        appointment_rows = cursor.fetchall()
+        cursor.execute(SERVICE_HOURLY_DRIFT_SQL, params)
+        service_rows = cursor.fetchall()
+    return appointment_rows, service_rows
+
+
+def rebuild_hourly(start, end):
+    """
+    Recompute the hourly rollups of appointments starting in [start, end),
+    which must fall on whole hours, in one transaction that blocks
+    appointment writes. Returns the number of appointment rows written.
+    """
+    params = {'start': start, 'end': end}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE appointment, appointment_service, service IN SHARE MODE")
+        cursor.execute(
+            "DELETE FROM appointment_hourly WHERE hour >= %(start)s AND hour < %(end)s", params
+        )
+        cursor.execute(
+            "DELETE FROM service_hourly WHERE hour >= %(start)s AND hour < %(end)s", params
+        )
+        cursor.execute(
+            "INSERT INTO appointment_hourly (medspa_id, status, hour, appointments, revenue, minutes) "
+            + EXPECTED_APPOINTMENT_HOURLY_SQL, params
+        )
+        written = cursor.rowcount
+        cursor.execute(
+            "INSERT INTO service_hourly (medspa_id, service_id, category_id, status, hour, "
+            "bookings, revenue, minutes) " + EXPECTED_SERVICE_HOURLY_SQL, params
+        )
+    return written
@@ -0,0 +1,107 @@
+# utils/schedule.py
+"""
+Per-medspa opening hours compiled into an in-process lookup.
+
+A medspa's weekly BusinessHours rows and Closure dates are loaded once and
+compiled into a Schedule that answers "when is this medspa open on this
+date" without a query. Each medspa has a version token in the shared
+cache that is replaced whenever its hours or closures change; a process
+recompiles a schedule only when the token it compiled against is stale.
+Medspas without any weekly hours fall back to the global BUSINESS_HOURS.
+"""
+import uuid
+from collections import namedtuple
+from datetime import datetime, time
+from django.core.cache import cache
+from django.utils import timezone
+
+from .constants import BUSINESS_HOURS, CACHE_KEYS
+
+DEFAULT_HOURS = (time(hour=BUSINESS_HOURS['start']), time(hour=BUSINESS_HOURS['end']))
+
+# medspa_id -> Schedule, private to this process
+_compiled = {}
+
+
+class Schedule(namedtuple('Schedule', ['version', 'weekly', 'closures'])):
+    """
+    `weekly` holds (opens_at, closes_at) or None for each weekday, Monday
+    first; `closures` is a frozenset of closed dates.
+    """
+
+    def hours(self, date):
+        """Return (opens_at, closes_at) local times for a date, or None if closed."""
+        if date in self.closures:
+            return None
+        return self.weekly[date.weekday()]
+
+    def window(self, date):
+        """Return the aware (open, close) datetimes for a date, or None if closed."""
+        hours = self.hours(date)
+        if hours is None:
+            return None
+        tz = timezone.get_current_timezone()
+        return (
+            timezone.make_aware(datetime.combine(date, hours[0]), tz),
+            timezone.make_aware(datetime.combine(date, hours[1]), tz)
+        )
+
+
+def get_versions(medspa_ids):
+    """Return {medspa_id: current schedule version token} with one cache read."""
+    keys = {
+        medspa_id: CACHE_KEYS['schedule_version'].format(medspa_id)
+        for medspa_id in medspa_ids
+    }
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for medspa_id, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            version = cache.get(key)
+        versions[medspa_id] = version
+    return versions
+
+
+def bump_version(medspa_id):
+    """Mark a medspa's compiled schedule stale in every process."""
+    cache.set(CACHE_KEYS['schedule_version'].format(medspa_id), uuid.uuid4().hex, None)
+
+
+def compile_schedule(medspa_id, version):
+    """Load a medspa's hours and closures and build its Schedule."""
+    from ..models import BusinessHours, Closure
+
+    rows = BusinessHours.objects.filter(medspa_id=medspa_id).values_list(
+        'weekday', 'opens_at', 'closes_at'
+    )
+    if rows:
+        weekly = [None] * 7
+        for weekday, opens_at, closes_at in rows:
+            weekly[weekday] = (opens_at, closes_at)
+    else:
+        weekly = [DEFAULT_HOURS] * 7
+
+    closures = Closure.objects.filter(medspa_id=medspa_id).values_list('date', flat=True)
+    return Schedule(version=version, weekly=tuple(weekly), closures=frozenset(closures))
+
+
+def get_schedules(medspa_ids):
+    """
+    Return {medspa_id: Schedule}. Costs one cache read; the database is only
+    hit for medspas whose hours or closures changed since they were compiled.
+    """
+    schedules = {}
+    for medspa_id, version in get_versions(medspa_ids).items():
+        schedule = _compiled.get(medspa_id)
+        if schedule is None or schedule.version != version:
+            schedule = compile_schedule(medspa_id, version)
+            _compiled[medspa_id] = schedule
+        schedules[medspa_id] = schedule
+    return schedules
+
+
+def get_schedule(medspa_id):
+    """Return the compiled Schedule of one medspa."""
+    return get_schedules([medspa_id])[medspa_id]
@@ -0,0 +1,199 @@
+# utils/statistics.py
+"""
+Precomputed medspa statistics and service utilization.
+
+The all-time figures of the statistics and usage endpoints aggregate every
+appointment of a medspa, so instead of computing them per request they are
+kept in `medspa_statistics` and `service_utilization` by a background
+worker (`manage.py refresh_statistics`). A refresh retires the cached
+responses of the medspa and its services, so readers see the new rows as
+soon as they are written.
+
+Appointment writes only queue the medspa in `statistics_refresh`. An entry
+is due right away if the medspa has not been refreshed within the last
+STATISTICS_REFRESH['interval'] seconds, otherwise once that interval has
+passed; further writes while the entry is queued coalesce into it. Each
+medspa is therefore refreshed at most once per interval however busy it
+is, and the write itself costs one small insert.
+"""
+import logging
+from django.db import connection, transaction
+
+from .constants import STATISTICS_REFRESH
+from .response_cache import invalidate_tags_on_commit, medspa_tags, service_tag
+
+logger = logging.getLogger(__name__)
+
+REQUEST_REFRESH_SQL = """
+INSERT INTO statistics_refresh (medspa_id, due_at)
+SELECT m.id, GREATEST(now(), s.refreshed_at + make_interval(secs => %s))
+FROM medspa m
+LEFT JOIN medspa_statistics s ON s.medspa_id = m.id
+WHERE m.id = ANY(%s)
+ON CONFLICT (medspa_id) DO NOTHING
+"""
+
+CLAIM_DUE_SQL = """
+DELETE FROM statistics_refresh
+WHERE medspa_id IN (
+    SELECT medspa_id FROM statistics_refresh
+    WHERE due_at <= now()
+    ORDER BY due_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING medspa_id
+"""
+
+REFRESH_MEDSPA_STATISTICS_SQL = """
+INSERT INTO medspa_statistics (
+    medspa_id, total_services, active_categories, total_appointments,
+    completed_appointments, total_revenue, refreshed_at
+)
+SELECT m.id, COALESCE(s.total_services, 0), COALESCE(s.active_categories, 0),
+       COALESCE(a.total_appointments, 0), COALESCE(a.completed_appointments, 0),
+       COALESCE(a.total_revenue, 0), now()
+FROM medspa m
+LEFT JOIN (
+    SELECT medspa_id, COUNT(*) AS total_services,
+           COUNT(DISTINCT category_id) AS active_categories
+    FROM service
+    WHERE active AND medspa_id = ANY(%(ids)s)
+    GROUP BY medspa_id
+) s ON s.medspa_id = m.id
+LEFT JOIN (
+    SELECT medspa_id, COUNT(*) AS total_appointments,
+           COUNT(*) FILTER (WHERE status = 'completed') AS completed_appointments,
+           SUM(total_price) FILTER (WHERE status = 'completed') AS total_revenue
+    FROM appointment
+    WHERE medspa_id = ANY(%(ids)s)
+    GROUP BY medspa_id
+) a ON a.medspa_id = m.id
+WHERE m.id = ANY(%(ids)s)
+ON CONFLICT (medspa_id) DO UPDATE SET
+    total_services = EXCLUDED.total_services,
+    active_categories = EXCLUDED.active_categories,
+    total_appointments = EXCLUDED.total_appointments,
+    completed_appointments = EXCLUDED.completed_appointments,
+    total_revenue = EXCLUDED.total_revenue,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# One row per service of the medspas, booked or not
+REFRESH_SERVICE_UTILIZATION_SQL = """
+INSERT INTO service_utilization (
+    service_id, medspa_id, total_bookings, completed_bookings, revenue, refreshed_at
+)
+SELECT s.id, s.medspa_id, COUNT(a.id),
+       COUNT(a.id) FILTER (WHERE a.status = 'completed'),
+       COALESCE(SUM(s.price) FILTER (WHERE a.status = 'completed'), 0), now()
+FROM service s
+LEFT JOIN appointment_service as_j ON as_j.service_id = s.id
+LEFT JOIN appointment a ON a.id = as_j.appointment_id
+WHERE s.medspa_id = ANY(%(ids)s)
+GROUP BY s.id, s.medspa_id
+RETURNING service_id
+"""
+
+
+def request_refresh(medspa_ids):
+    """
+    Queue the medspas' statistics for a refresh. Runs inside the caller's
+    transaction, so the entry only becomes visible to the worker once the
+    change it reflects has committed.
+    """
+    medspa_ids = sorted(set(medspa_ids))
+    if not medspa_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(REQUEST_REFRESH_SQL, [STATISTICS_REFRESH['interval'], medspa_ids])
+
+
+def claim_due(limit=None):
+    """Take up to `limit` due medspas off the queue and return their ids."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CLAIM_DUE_SQL, [limit or STATISTICS_REFRESH['batch_size']])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def refresh_statistics(medspa_ids, invalidate=True):
+    """
+    Recompute the precomputed rows of the given medspas from the appointment
+    and service tables. Unless `invalidate` is False, the cached responses
+    of the medspas and their services are retired once the refresh commits,
+    so they are rebuilt from the new rows.
+    """
+    medspa_ids = sorted(set(medspa_ids))
+    if not medspa_ids:
+        return
+    params = {'ids': medspa_ids}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(REFRESH_MEDSPA_STATISTICS_SQL, params)
+        cursor.execute("DELETE FROM service_utilization WHERE medspa_id = ANY(%(ids)s)", params)
+        cursor.execute(REFRESH_SERVICE_UTILIZATION_SQL, params)
+        service_ids = [row[0] for row in cursor.fetchall()]
+        if invalidate:
+            invalidate_tags_on_commit(
+                *medspa_tags(*medspa_ids), *(service_tag(service_id) for service_id in service_ids)
+            )
+
+
+def run_due_refreshes(limit=None):
+    """
+    Refresh one batch of due medspas and return how many were refreshed.
+    Entries are claimed in their own short transaction so that writers
+    queueing the same medspa never wait on a running refresh; if the
+    refresh fails they are queued again.
+    """
+    medspa_ids = claim_due(limit)
+    if not medspa_ids:
+        return 0
+    try:
+        refresh_statistics(medspa_ids)
+    except Exception:
+        with transaction.atomic():
+            request_refresh(medspa_ids)
+        raise
+    return len(medspa_ids)
+
+
+def get_medspa_statistics(medspa_ids):
+    """
+    Return {medspa_id: statistics dict} from the precomputed table.
+    Medspas that were never refreshed are computed on the spot.
+    """
+    from ..models import MedspaStatistics
+
+    medspa_ids = set(medspa_ids)
+    fields = (
+        'medspa_id', 'total_services', 'active_categories', 'total_appointments',
+        'completed_appointments', 'total_revenue', 'refreshed_at'
+    )
+    rows = {
+        row['medspa_id']: row
+        for row in MedspaStatistics.objects.filter(medspa_id__in=medspa_ids).values(*fields)
+    }
+    missing = medspa_ids - set(rows)
+    if missing:
+        refresh_statistics(missing, invalidate=False)
+        rows.update(
+            (row['medspa_id'], row)
+            for row in MedspaStatistics.objects.filter(medspa_id__in=missing).values(*fields)
+        )
+    return rows
+
+
+def get_service_utilization(service):
+    """Return the precomputed utilization row of a service."""
+    from ..models import ServiceUtilization
+
+    fields = ('service_id', 'total_bookings', 'completed_bookings', 'revenue', 'refreshed_at')
+    row = ServiceUtilization.objects.filter(
+        service_id=service.pk, medspa_id=service.medspa_id
+    ).values(*fields).first()
+    if row is None:
+        refresh_statistics([service.medspa_id], invalidate=False)
+        row = ServiceUtilization.objects.filter(
+            service_id=service.pk, medspa_id=service.medspa_id
+        ).values(*fields).first()
+    return row
@@ -20,11 +20,21 @@ def validate_future_date(date):
         raise ValidationError("Date must be in the future")
     return date
 
-def validate_business_hours(datetime_obj):
-    """Validate that datetime falls within business hours (9 AM - 5 PM)."""
-    if datetime_obj.hour < 9 or datetime_obj.hour >= 17:
-        raise ValidationError("Appointments must be scheduled between 9 AM and 5 PM")
-    return datetime_obj
+def validate_business_hours(medspa_id, start_time, end_time=None):
+    """Validate that an appointment falls within the medspa's opening hours."""
+    from .schedule import get_schedule
+
+    window = get_schedule(medspa_id).window(timezone.localtime(start_time).date())
+    if window is None:
+        raise ValidationError("The medspa is closed on that day")
+
+    opens, closes = window
+    if start_time < opens or start_time >= closes or (end_time and end_time > closes):
+        raise ValidationError(
+            f"Appointments must be scheduled between "
+            f"{timezone.localtime(opens):%H:%M} and {timezone.localtime(closes):%H:%M}"
+        )
+    return start_time
 
 def validate_service_category(category, service_type):
     """Validate service category and type combinations."""
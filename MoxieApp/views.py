@@ -4,12 +4,15 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.utils import timezone
-from django.db.models import Sum, Count, Q, Avg, F
-from datetime import datetime, time
+from django.db import transaction
+from django.db.models import Count
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 from .models import (
     Medspa,
+    BusinessHours,
+    Closure,
     Service,
     Appointment,
     ServiceCategory,
@@ -17,12 +20,66 @@ from .models import (
 )
 from .serializers import (
     MedspaSerializer,
+    BusinessHoursSerializer,
+    ClosureSerializer,
     ServiceSerializer,
     AppointmentSerializer,
     ServiceCategorySerializer,
     ServiceTypeSerializer
 )
-from .utils.custom_exceptions import ServiceValidationError, AppointmentValidationError
+from .signals import notify_appointment_changed
+from .utils.constants import ANALYTICS_DEFAULTS, AVAILABILITY_DEFAULTS, EXPORT_SETTINGS
+from .utils.custom_exceptions import (
+    AppointmentValidationError,
+    ConcurrentBookingError,
+    ServiceValidationError
+)
+from .utils.helpers import (
+    booking_conflict_guard,
+    get_booking_window,
+    get_appointment_timeseries,
+    get_cached_medspa_statistics,
+    get_bundle_duration,
+    get_range_analytics,
+    get_service_usage,
+    parse_days_parameter,
+    parse_timeseries_parameters,
+    invalidate_service_catalog,
+    snapshot_appointment
+)
+from .utils.availability import (
+    check_slot_open,
+    find_earliest_slots,
+    format_slot_map,
+    format_slots,
+    get_available_slots,
+    get_day_bounds,
+    get_available_slots_range,
+    parse_date_range,
+    parse_medspa_ids,
+    parse_search_parameters,
+    parse_service_ids,
+    parse_slot_parameters,
+    parse_start_time
+)
+from .utils import leaderboard, statistics
+from .utils.capacity import compute_capacity
+from .utils.export import stream_export
+from .utils.response_cache import (
+    CATALOG_TAG,
+    catalog_tags,
+    detail_tags,
+    invalidate_tags_on_commit,
+    medspa_filter_tags,
+    medspa_tags,
+    service_tag
+)
+from .utils.holds import (
+    HoldsUnavailable,
+    check_booking,
+    create_hold,
+    release_hold
+)
 from .utils.decorators import (
     log_action,
     measure_execution_time,
@@ -38,7 +95,23 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class ServiceCategoryViewSet(viewsets.ModelViewSet):
+class CatalogWriteMixin:
+    """Retire cached responses tagged `catalog` after every write."""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate_tags_on_commit(CATALOG_TAG)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_tags_on_commit(CATALOG_TAG)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_tags_on_commit(CATALOG_TAG)
+
+
+class ServiceCategoryViewSet(CatalogWriteMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing service categories.
     """
@@ -48,12 +121,12 @@ class ServiceCategoryViewSet(viewsets.ModelViewSet):
     serializer_class = ServiceCategorySerializer
 
     @handle_exceptions
-    @cache_response(timeout=3600)  # Cache for 1 hour
+    @cache_response(timeout=24 * 60 * 60, tags=catalog_tags, local=True)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
 
-class ServiceTypeViewSet(viewsets.ModelViewSet):
+class ServiceTypeViewSet(CatalogWriteMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing service types.
     """
@@ -62,6 +135,11 @@ class ServiceTypeViewSet(viewsets.ModelViewSet):
     queryset = ServiceType.objects.all()
     serializer_class = ServiceTypeSerializer
 
+    @handle_exceptions
+    @cache_response(timeout=24 * 60 * 60, tags=catalog_tags, local=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @handle_exceptions
     @measure_execution_time
     def get_queryset(self):
@@ -94,34 +172,57 @@ class MedspaViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        medspa = serializer.save()
+        invalidate_tags_on_commit(*medspa_tags(medspa.id))
+
+    def perform_destroy(self, instance):
+        medspa_id = instance.id
+        instance.delete()
+        invalidate_tags_on_commit(*medspa_tags(medspa_id))
+
     @handle_exceptions
-    @cache_response(timeout=300)
+    @cache_response(timeout=60 * 60, tags=detail_tags('medspa', daily=True), local=True, stale_ttl=5 * 60)
     @measure_execution_time
     @log_action("medspa_statistics")
     @action(detail=True)
     def statistics(self, request, pk=None):
         """Get statistics for a specific medspa."""
         medspa = self.get_object()
-        today = timezone.now()
+        return Response(get_cached_medspa_statistics([medspa.pk])[medspa.pk])
 
-        stats = {
-            'total_services': medspa.services.filter(active=True).count(),
-            'total_appointments': medspa.appointments.count(),
-            'appointments_today': medspa.appointments.filter(
-                start_time__date=today.date()
-            ).count(),
-            'revenue': medspa.appointments.filter(
-                status='completed'
-            ).aggregate(
-                total=Sum(F('services__price'))
-            )['total'] or Decimal('0.00'),
-            'active_categories': ServiceCategory.objects.filter(
-                services__medspa=medspa,
-                services__active=True
-            ).distinct().count(),
-        }
+    @handle_exceptions
+    @measure_execution_time
+    @log_action("medspa_batch_statistics")
+    @action(detail=False, url_path='statistics')
+    def batch_statistics(self, request):
+        """
+        Statistics of many medspas at once, e.g. ?ids=1,2,3, keyed by
+        medspa id. Omitting `ids` covers every medspa.
+        """
+        max_count = ANALYTICS_DEFAULTS['statistics_max_medspas']
+        try:
+            medspa_ids = parse_medspa_ids(request.query_params, max_count, name='ids')
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response(stats)
+        queryset = self.get_queryset()
+        if medspa_ids:
+            queryset = queryset.filter(id__in=medspa_ids)
+        medspa_ids = list(queryset.order_by('id').values_list('id', flat=True)[:max_count + 1])
+        if len(medspa_ids) > max_count:
+            return Response(
+                {'error': 'Too many medspas; pass ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stats = get_cached_medspa_statistics(medspa_ids)
+        return Response({
+            str(medspa_id): stats[medspa_id] for medspa_id in medspa_ids
+        })
 
     @handle_exceptions
     @validate_request_data('date')
@@ -129,42 +230,282 @@ class MedspaViewSet(viewsets.ModelViewSet):
     @log_action("medspa_availability")
     @action(detail=True)
     def availability(self, request, pk=None):
-        """Get availability slots for a specific medspa."""
+        """
+        Get availability slots for a specific medspa.
+
+        Pass `date` for a single day, or `start_date` and `end_date` for a
+        compact per-day slot map covering the whole range. When `service_ids`
+        is given the slot length is the combined duration of those services.
+        """
         medspa = self.get_object()
-        date = request.query_params.get('date')
 
         try:
-            target_date = datetime.strptime(date, '%Y-%m-%d').date()
-
-            # Get all booked appointments for the date
-            booked_appointments = medspa.appointments.filter(
-                start_time__date=target_date,
-                status='scheduled'
-            ).values_list('start_time', 'services__duration')
-
-            # Create time slots
-            all_slots = []
-            for hour in range(9, 17):  # 9 AM to 5 PM
-                slot_time = datetime.combine(target_date, time(hour=hour))
-                # Check if slot is available
-                is_available = not any(
-                    booked_start <= slot_time < booked_start + timezone.timedelta(minutes=duration)
-                    for booked_start, duration in booked_appointments
+            duration, granularity = parse_slot_parameters(request.query_params)
+            service_ids = parse_service_ids(request.query_params)
+            if service_ids:
+                duration = get_bundle_duration(medspa.pk, service_ids)
+        except (ValueError, ServiceValidationError) as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if 'start_date' in request.query_params or 'end_date' in request.query_params:
+            try:
+                start_date, end_date = parse_date_range(request.query_params)
+            except ValueError as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                if is_available:
-                    all_slots.append(slot_time)
 
+            slots_by_day = get_available_slots_range(
+                medspa, start_date, end_date,
+                duration=duration, granularity=granularity
+            )
             return Response({
-                'date': date,
-                'available_slots': all_slots
+                'start_date': start_date,
+                'end_date': end_date,
+                'duration': duration,
+                'granularity': granularity,
+                'days': format_slot_map(slots_by_day)
             })
 
+        date = request.query_params.get('date')
+        try:
+            target_date = datetime.strptime(date or '', '%Y-%m-%d').date()
         except ValueError:
             return Response(
                 {'error': 'Invalid date format. Use YYYY-MM-DD'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        available_slots = get_available_slots(
+            medspa, target_date, duration=duration, granularity=granularity
+        )
+
+        return Response({
+            'date': date,
+            'duration': duration,
+            'granularity': granularity,
+            'available_slots': format_slots(available_slots)
+        })
+
+    @handle_exceptions
+    @rate_limit(calls=100, period=3600)
+    @log_action("medspa_earliest_availability")
+    @action(detail=False)
+    def earliest_availability(self, request):
+        """
+        Find the first open slots across a set of medspas, e.g.
+        ?medspa_ids=1,2,3&duration=60&after=2024-11-01T09:00&horizon_days=14&limit=5
+        """
+        try:
+            duration, granularity = parse_slot_parameters(request.query_params)
+            medspa_ids, after, horizon_days, limit = parse_search_parameters(
+                request.query_params
+            )
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        existing_ids = list(
+            self.get_queryset().filter(id__in=medspa_ids).values_list('id', flat=True)
+        )
+        slots = find_earliest_slots(
+            existing_ids, after, duration,
+            granularity=granularity, horizon_days=horizon_days, limit=limit
+        )
+
+        return Response({
+            'after': after,
+            'duration': duration,
+            'horizon_days': horizon_days,
+            'results': [
+                {'medspa': medspa_id, 'start_time': slot}
+                for slot, medspa_id in slots
+            ]
+        })
+
+    @handle_exceptions
+    @measure_execution_time
+    @log_action("medspa_capacity")
+    @action(detail=False)
+    def capacity(self, request):
+        """
+        Availability of many medspas over a long range for capacity
+        planning, e.g. ?medspa_ids=1,2,3&start_date=2024-11-01&end_date=2025-01-29
+
+        `output` selects the shape: `utilization` (default) returns
+        medspa x day matrices of free and bookable slot counts and the
+        percentage of slots taken; `slots` returns the free slot times.
+        Omitting `medspa_ids` covers every medspa.
+        """
+        output = request.query_params.get('output', 'utilization')
+        try:
+            duration, granularity = parse_slot_parameters(request.query_params)
+            start_date, end_date = parse_date_range(
+                request.query_params, max_days=AVAILABILITY_DEFAULTS['capacity_max_days']
+            )
+            medspa_ids = parse_medspa_ids(
+                request.query_params, AVAILABILITY_DEFAULTS['capacity_max_medspas']
+            )
+            if output not in ('utilization', 'slots'):
+                raise ValueError("output must be 'utilization' or 'slots'")
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.get_queryset()
+        if medspa_ids:
+            queryset = queryset.filter(id__in=medspa_ids)
+        medspa_ids = list(queryset.order_by('id').values_list('id', flat=True)[
+            :AVAILABILITY_DEFAULTS['capacity_max_medspas'] + 1
+        ])
+        if len(medspa_ids) > AVAILABILITY_DEFAULTS['capacity_max_medspas']:
+            return Response(
+                {'error': 'Too many medspas; pass medspa_ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        grid = compute_capacity(
+            medspa_ids, start_date, end_date,
+            duration=duration, granularity=granularity
+        )
+        data = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'duration': duration,
+            'granularity': granularity,
+            'dates': grid.dates,
+            'medspa_ids': grid.medspa_ids,
+        }
+        if output == 'slots':
+            data['slots'] = {
+                medspa_id: format_slot_map(slots_by_day)
+                for medspa_id, slots_by_day in grid.free_slots().items()
+            }
+        else:
+            data.update(grid.utilization_report())
+
+        return Response(data)
+
+    @handle_exceptions
+    @measure_execution_time
+    @log_action("medspa_timeseries")
+    @action(detail=True)
+    def timeseries(self, request, pk=None):
+        """
+        Appointment counts and revenue of one medspa per day, week or
+        month, e.g. ?interval=week&start_date=2024-01-01&end_date=2024-06-30
+        """
+        medspa = self.get_object()
+        try:
+            start_date, end_date, interval = parse_timeseries_parameters(request.query_params)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(get_appointment_timeseries(
+            start_date, end_date, interval,
+            medspa_id=medspa.id,
+            status=request.query_params.get('status')
+        ))
+
+    @handle_exceptions
+    @rate_limit(calls=100, period=3600)
+    @log_action("medspa_slot_hold")
+    @action(detail=True, methods=['post', 'delete'])
+    def hold(self, request, pk=None):
+        """
+        Hold a slot for a few minutes so it can be booked without racing
+        other clients. POST `start_time` with `duration` or `service_ids`
+        and pass the returned `hold_token` when creating the appointment.
+        DELETE with `hold_token` releases a hold of this medspa early.
+        """
+        medspa = self.get_object()
+
+        if request.method == 'DELETE':
+            release_hold(
+                request.data.get('hold_token') or request.query_params.get('hold_token'),
+                medspa_id=medspa.pk
+            )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            start_time = parse_start_time(request.data.get('start_time'))
+            duration = parse_slot_parameters(request.data)[0]
+            service_ids = parse_service_ids(request.data)
+            if service_ids:
+                duration = get_bundle_duration(medspa.pk, service_ids)
+            end_time = start_time + timedelta(minutes=duration)
+            check_slot_open(medspa, start_time, end_time)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            hold = create_hold(medspa.pk, start_time, end_time)
+        except HoldsUnavailable as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        return Response({
+            'hold_token': hold.token,
+            'medspa': medspa.pk,
+            'start_time': hold.start_time,
+            'end_time': hold.end_time,
+            'expires_at': hold.expires_at
+        }, status=status.HTTP_201_CREATED)
+
+
+class BusinessHoursViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing the weekly opening hours of medspas.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = BusinessHours.objects.all()
+    serializer_class = BusinessHoursSerializer
+
+    @handle_exceptions
+    @measure_execution_time
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        medspa_id = self.request.query_params.get('medspa_id')
+        if medspa_id:
+            queryset = queryset.filter(medspa_id=medspa_id)
+        return queryset.order_by('medspa_id', 'weekday')
+
+
+class ClosureViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet for managing the days a medspa is closed.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    queryset = Closure.objects.all()
+    serializer_class = ClosureSerializer
+
+    @handle_exceptions
+    @measure_execution_time
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        medspa_id = self.request.query_params.get('medspa_id')
+        if medspa_id:
+            queryset = queryset.filter(medspa_id=medspa_id)
+        return queryset.order_by('medspa_id', 'date')
+
 
 class ServiceViewSet(viewsets.ModelViewSet):
     """
@@ -220,8 +561,30 @@ class ServiceViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        service = serializer.save()
+        statistics.request_refresh([service.medspa_id])
+        invalidate_service_catalog(service.medspa_id)
+        invalidate_tags_on_commit(service_tag(service.id), *medspa_tags(service.medspa_id))
+
+    def perform_update(self, serializer):
+        previous_medspa_id = serializer.instance.medspa_id
+        service = serializer.save()
+        statistics.request_refresh([previous_medspa_id, service.medspa_id])
+        invalidate_service_catalog(previous_medspa_id, service.medspa_id)
+        invalidate_tags_on_commit(
+            service_tag(service.id), *medspa_tags(previous_medspa_id, service.medspa_id)
+        )
+
+    def perform_destroy(self, instance):
+        service_id, medspa_id = instance.id, instance.medspa_id
+        instance.delete()
+        statistics.request_refresh([medspa_id])
+        invalidate_service_catalog(medspa_id)
+        invalidate_tags_on_commit(service_tag(service_id), *medspa_tags(medspa_id))
+
     @handle_exceptions
-    @cache_response(timeout=300)
+    @cache_response(timeout=60 * 60, tags=detail_tags('service'), stale_ttl=5 * 60)
     @measure_execution_time
     @log_action("service_usage_statistics")
     @action(detail=True)
@@ -229,16 +592,35 @@ class ServiceViewSet(viewsets.ModelViewSet):
         """Get usage statistics for a specific service."""
         service = self.get_object()
 
-        completed_appointments = service.appointments.filter(
-            status='completed'
-        )
+        # All time from the precomputed row unless `days` limits it to the
+        # trailing whole days
+        try:
+            days = parse_days_parameter(request.query_params)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if days:
+            today = timezone.now()
+            start = get_day_bounds((today - timedelta(days=days)).date())[0]
+            end = get_day_bounds(today.date())[1]
+            usage = get_service_usage(start, end, service_id=service.id)
+            totals = {
+                'total_appointments': sum(row['count'] for row in usage),
+                'completed_appointments': sum(row['completed_count'] for row in usage),
+                'revenue': sum((row['revenue'] for row in usage), Decimal('0.00')),
+            }
+        else:
+            utilization = statistics.get_service_utilization(service)
+            totals = {
+                'total_appointments': utilization['total_bookings'],
+                'completed_appointments': utilization['completed_bookings'],
+                'revenue': utilization['revenue'],
+            }
 
         stats = {
-            'total_appointments': service.appointments.count(),
-            'completed_appointments': completed_appointments.count(),
-            'revenue': completed_appointments.aggregate(
-                total=Sum('services__price')
-            )['total'] or Decimal('0.00'),
+            **totals,
             'average_duration': service.duration,
             'category': service.category.name,
             'service_type': service.service_type.name,
@@ -292,7 +674,27 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     @validate_request_data('start_time', 'medspa', 'services')
     @require_permissions('can_create_appointment')
     def create(self, request, *args, **kwargs):
-        return super().create(request, *args, **kwargs)
+        # Reject bookings that collide with someone else's slot hold before
+        # validation and the insert reach the database
+        hold_token = request.data.get('hold_token')
+        booking_window = get_booking_window(request.data)
+        if booking_window is not None:
+            check_booking(*booking_window, token=hold_token)
+
+        response = super().create(request, *args, **kwargs)
+        if hold_token:
+            transaction.on_commit(lambda: release_hold(hold_token))
+        return response
+
+    @handle_exceptions
+    @atomic_transaction
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        before = snapshot_appointment(instance)
+        instance.delete()
+        notify_appointment_changed(sender=Appointment, before=before, after=None)
 
     @handle_exceptions
     @atomic_transaction
@@ -308,12 +710,22 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             if new_status not in dict(Appointment.STATUS_CHOICES):
                 raise AppointmentValidationError("Invalid status value")
 
+            before = snapshot_appointment(appointment)
             appointment.status = new_status
-            appointment.save()
+            with booking_conflict_guard():
+                appointment.save()
+
+            notify_appointment_changed(
+                sender=Appointment,
+                before=before,
+                after=before._replace(status=new_status)
+            )
 
             logger.info(f"Updated appointment {appointment.id} status to {new_status}")
             return Response(self.get_serializer(appointment).data)
 
+        except ConcurrentBookingError:
+            raise
         except Exception as e:
             logger.error(f"Error updating appointment status: {str(e)}")
             return Response(
@@ -322,7 +734,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
 
     @handle_exceptions
-    @cache_response(timeout=300)
+    @cache_response(timeout=60 * 60, tags=medspa_filter_tags)
     @measure_execution_time
     @log_action("appointment_calendar")
     @action(detail=False)
@@ -343,17 +755,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(start_time__date__lte=end_date)
 
         calendar_data = queryset.values(
-            'id', 'start_time', 'status', 'medspa__name'
+            'id', 'start_time', 'status', 'medspa__name',
+            'total_duration', 'total_price'
         ).annotate(
-            service_count=Count('services'),
-            total_duration=Sum('services__duration'),
-            total_price=Sum('services__price')
+            service_count=Count('appointmentservice')
         ).order_by('start_time')
 
         return Response(calendar_data)
 
     @handle_exceptions
-    @cache_response(timeout=300)
+    @cache_response(timeout=60 * 60, tags=medspa_filter_tags, stale_ttl=5 * 60)
     @measure_execution_time
     @log_action("appointment_analytics")
     @action(detail=False)
@@ -363,15 +774,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         end_date = timezone.now()
         start_date = end_date - timezone.timedelta(days=days)
 
-        # Get base queryset for the time period
-        queryset = self.get_queryset().filter(
-            start_time__date__range=[start_date.date(), end_date.date()]
-        )
-
-        # Calculate analytics
-        total_appointments = queryset.count()
-        completed_appointments = queryset.filter(status='completed')
-        canceled_appointments = queryset.filter(status='canceled')
+        # Whole local days, narrowed to one day by the `date` filter
+        range_start = get_day_bounds(start_date.date())[0]
+        range_end = get_day_bounds(end_date.date())[1]
+        date_filter = request.query_params.get('date')
+        if date_filter:
+            try:
+                day_start, day_end = get_day_bounds(datetime.strptime(date_filter, '%Y-%m-%d').date())
+                range_start, range_end = max(range_start, day_start), min(range_end, day_end)
+            except ValueError:
+                pass
 
         analytics = {
             'period': {
@@ -379,33 +791,71 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 'end_date': end_date.date(),
                 'days': days
             },
-            'appointments': {
-                'total': total_appointments,
-                'completed': completed_appointments.count(),
-                'canceled': canceled_appointments.count(),
-                'scheduled': queryset.filter(status='scheduled').count()
-            },
-            'revenue': completed_appointments.aggregate(
-                total=Sum('services__price')
-            )['total'] or Decimal('0.00'),
-            'services': {
-                'average_per_appointment': queryset.annotate(
-                    service_count=Count('services')
-                ).aggregate(avg=Avg('service_count'))['avg'] or 0,
-                'most_popular': queryset.values(
-                    'services__name'
-                ).annotate(
-                    count=Count('services__name')
-                ).order_by('-count')[:5]
-            },
-            'categories': {
-                'distribution': completed_appointments.values(
-                    'services__category__name'
-                ).annotate(
-                    count=Count('services__category'),
-                    revenue=Sum('services__price')
-                ).order_by('-count')
-            }
+            **get_range_analytics(
+                range_start, range_end,
+                medspa_id=request.query_params.get('medspa_id'),
+                status=request.query_params.get('status')
+            )
         }
 
+        # Top services from the Redis leaderboards when they cover the window
+        if not date_filter and not request.query_params.get('status'):
+            most_popular = leaderboard.get_most_popular(
+                start_date.date(), end_date.date(),
+                medspa_id=request.query_params.get('medspa_id')
+            )
+            if most_popular is not None:
+                analytics['services']['most_popular'] = most_popular
+
         return Response(analytics)
+
+    @handle_exceptions
+    @measure_execution_time
+    @log_action("appointment_timeseries")
+    @action(detail=False)
+    def timeseries(self, request):
+        """
+        Appointment counts and revenue per day, week or month as parallel
+        arrays for charts, e.g. ?interval=month&start_date=2024-01-01&end_date=2024-12-31
+        Accepts the same `medspa_id` and `status` filters as the list.
+        """
+        try:
+            start_date, end_date, interval = parse_timeseries_parameters(request.query_params)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(get_appointment_timeseries(
+            start_date, end_date, interval,
+            medspa_id=request.query_params.get('medspa_id'),
+            status=request.query_params.get('status')
+        ))
+
+    @handle_exceptions
+    @rate_limit(calls=10, period=3600)
+    @log_action("appointment_export")
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream every matching appointment as CSV or newline-delimited JSON,
+        e.g. ?output=ndjson&start_date=2024-10-01&end_date=2024-12-31
+        Accepts the same `status`, `date` and `medspa_id` filters as the list.
+        """
+        queryset = self.get_queryset()
+        try:
+            if 'start_date' in request.query_params or 'end_date' in request.query_params:
+                start_date, end_date = parse_date_range(
+                    request.query_params, max_days=EXPORT_SETTINGS['max_days']
+                )
+                queryset = queryset.filter(
+                    start_time__gte=get_day_bounds(start_date)[0],
+                    start_time__lt=get_day_bounds(end_date)[1]
+                )
+            return stream_export(queryset, request.query_params.get('output', 'csv'))
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )